@@ -1,9 +1,13 @@
 import sqlalchemy as sa
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 import pandas as pd
+import numpy as np
+import io
+import os
 import time
+import threading
 import psycopg2
+from durations import decode_durations, encode_durations
 
 def retry_db(max_retries=3, delay=10):
     """
@@ -54,120 +58,548 @@ def retry_db(max_retries=3, delay=10):
         return wrapper
     return decorator
 
-def db_connect(credential):
-    '''Подключение к базе данных с проверкой живости соединения.'''
-    engine = sa.create_engine(
-        credential,
-        pool_pre_ping=True,  # перед использованием соединения проверяет, не умерло ли оно
-    )
-    return engine
+# Параметры пула соединений (можно переопределить переменными окружения)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 900))  # раз в 15 минут пересоздаём соединения
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 10 * 60 * 1000))
+
+_engines = {}
+_engine_metrics = {}
+_engines_lock = threading.Lock()
+
+def _track_pool(engine, metrics):
+    '''
+    Счётчики здоровья пула: новые соединения и время на их установку, ошибки подключения,
+    выдачи из пула, инвалидации (в т.ч. по pre_ping)
+    '''
+    @sa.event.listens_for(engine, "do_connect")
+    def on_do_connect(dialect, connection_record, cargs, cparams):
+        started = time.monotonic()
+        try:
+            return dialect.connect(*cargs, **cparams)
+        except Exception as e:
+            metrics["connect_errors"] += 1
+            metrics["last_error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            metrics["connect_seconds"] += time.monotonic() - started
+
+    @sa.event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics["connects"] += 1
+
+    @sa.event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics["checkouts"] += 1
+
+    @sa.event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics["invalidations"] += 1
+        if exception is not None:
+            metrics["last_error"] = f"{type(exception).__name__}: {exception}"
+
+def db_connect(credential, statement_timeout_ms=None):
+    '''
+    Подключение к базе данных. Engine (и его пул соединений) один на процесс
+    для каждой строки подключения: повторные вызовы возвращают уже созданный,
+    поэтому сверка протокола не открывает новых TCP-соединений.
+
+    - pool_pre_ping: перед выдачей соединения проверяет, не умерло ли оно
+    - pool_recycle: соединения старше DB_POOL_RECYCLE секунд пересоздаются
+    - statement_timeout: запросы дольше statement_timeout_ms (по умолчанию DB_STATEMENT_TIMEOUT_MS)
+      обрываются сервером; 0 — без ограничения
+    '''
+    if statement_timeout_ms is None:
+        statement_timeout_ms = DB_STATEMENT_TIMEOUT_MS
+    key = (credential, statement_timeout_ms)
+
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is not None:
+            return engine
+
+        connect_args = {}
+        if credential.startswith("postgresql"):
+            connect_args["options"] = f"-c statement_timeout={int(statement_timeout_ms)}"
+
+        engine = sa.create_engine(
+            credential,
+            pool_pre_ping=True,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            connect_args=connect_args,
+        )
+        metrics = {"connects": 0, "connect_errors": 0, "connect_seconds": 0.0, "checkouts": 0,
+                   "invalidations": 0, "last_error": None, "created_at": datetime.now()}
+        _track_pool(engine, metrics)
+        _engines[key] = engine
+        _engine_metrics[key] = metrics
+        return engine
+
+def engine_metrics():
+    '''
+    Состояние всех engine процесса: адрес БД (без пароля), счётчики пула и pool.status().
+    checkouts / connects — сколько раз соединение переиспользовалось вместо нового подключения.
+    '''
+    with _engines_lock:
+        return [
+            {
+                "url": engine.url.render_as_string(hide_password=True),
+                "statement_timeout_ms": key[1],
+                "pool": engine.pool.status(),
+                **_engine_metrics[key],
+            }
+            for key, engine in _engines.items()
+        ]
+
+def dispose_engines():
+    '''Закрывает пулы всех engine процесса (например, в конце скрипта)'''
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+
+def _reset_engines_after_fork():
+    # соединения родителя нельзя использовать в дочернем процессе — пул начинается заново
+    global _engines_lock
+    _engines_lock = threading.Lock()
+    for engine in _engines.values():
+        engine.dispose(close=False)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_engines_after_fork)
+
+def read_sql(query, engine, params=None):
+    '''
+    SELECT в DataFrame. Граница чтения: столбцы-длительности (finish_time, mean_time, ...)
+    сразу переводятся из time/interval в целые секунды (см. durations).
+    '''
+    return decode_durations(pd.read_sql_query(query, con=engine, params=params))
 
 @retry_db()
 def get_table(engine, name_table, columns='*'):
     '''Считать таблицу из БД'''
     query = f"SELECT {columns} FROM {name_table};"
-    return pd.read_sql_query(query, con=engine)
+    return read_sql(query, engine)
 
 @retry_db()
-def execute_request(engine, sql_request):
+def execute_request(engine, sql_request, params=None):
     """
     Универсальная функция:
     - для SELECT-запросов возвращает pandas.DataFrame
     - для остальных запросов просто выполняет их и возвращает None
+    Значения передавайте через params (:name в тексте запроса), а не подстановкой в строку.
     """
     sql_str = str(sql_request).strip()
-    is_select = sql_str.lower().startswith("select")
+    is_select = sql_str.lower().startswith(("select", "with"))
 
     if is_select:
         # чтение данных
-        return pd.read_sql_query(sql_str, con=engine)
+        query = sa.text(sql_str) if params else sql_str
+        return read_sql(query, engine, params)
     else:
         # любые DDL/DML-операции
         with engine.connect() as conn:
-            conn.execute(sa.text(sql_request))
+            conn.execute(sa.text(sql_str), params or {})
             conn.commit()
         return None
 
+def _raw_connection(conn):
+    '''DBAPI-соединение (psycopg2) той же транзакции, что и у Session/Connection SQLAlchemy'''
+    if hasattr(conn, 'get_bind'):  # Session
+        conn = conn.connection()
+    return conn.connection.dbapi_connection
+
+# Столбцы деталей протокола, которые читает сверка одного протокола
+PROTOCOL_RUN_COLUMNS = [
+    'name_point', 'date_event', 'name_runner', 'link_runner', 'user_id',
+    'position', 'finish_time', 'age_category', 'status_runner'
+]
+PROTOCOL_VOL_COLUMNS = [
+    'name_point', 'date_event', 'name_runner', 'link_runner', 'user_id', 'vol_role'
+]
+
+def _protocol_details_sql():
+    # бегуны и волонтёры одним запросом: UNION ALL по общему набору столбцов,
+    # недостающие столбцы — NULL, первый столбец говорит, из какой таблицы строка
+    columns = list(dict.fromkeys(PROTOCOL_RUN_COLUMNS + PROTOCOL_VOL_COLUMNS))
+    run = ', '.join(col if col in PROTOCOL_RUN_COLUMNS else f'NULL AS {col}' for col in columns)
+    vol = ', '.join(col if col in PROTOCOL_VOL_COLUMNS else 'NULL' for col in columns)
+    return f"""
+        SELECT 'run' AS part, {run} FROM details_protocol
+        WHERE name_point = $1 AND date_event = $2
+        UNION ALL
+        SELECT 'vol', {vol} FROM details_vol
+        WHERE name_point = $1 AND date_event = $2"""
+
+# Частые запросы сверки одного протокола. На каждом соединении пула они готовятся
+# один раз (PREPARE), дальше выполняются через EXECUTE — без повторного разбора и планирования.
+# Типы параметров ($1, $2, ...) сервер выводит из столбцов, с которыми они сравниваются.
+PREPARED_STATEMENTS = {
+    "protocol_hash": """
+        SELECT protocol_hash FROM list_all_events
+        WHERE name_point = $1 AND date_event = $2""",
+    "protocol_details": _protocol_details_sql(),
+    "protocol_checked": """
+        UPDATE list_all_events
+        SET last_check_at = now(), protocol_hash = COALESCE($3, protocol_hash)
+        WHERE name_point = $1 AND date_event = $2""",
+    "table_updated": """
+        INSERT INTO update_table (table_name, update_date) VALUES ($1, $2)""",
+}
+
+def execute_prepared(conn, calls):
+    """
+    Выполняет запросы из PREPARED_STATEMENTS одной отправкой на сервер:
+    недостающие на этом соединении PREPARE и все EXECUTE из calls склеиваются в один текст.
+    Какие запросы уже подготовлены, хранится в info соединения пула
+    (при пересоздании соединения словарь новый — запросы готовятся заново).
+    psycopg2 возвращает результат только последнего запроса текста,
+    поэтому в одной отправке читающий запрос может быть только последним.
+
+    :param conn: Connection SQLAlchemy (транзакцией управляет вызывающий)
+    :param calls: список (имя запроса, кортеж параметров)
+    :return: (имена столбцов, строки) результата последнего запроса; для запросов без результата — ([], [])
+    """
+    fairy = conn.connection
+    prepared = fairy.info.setdefault("prepared_statements", set())
+    missing = [name for name in dict.fromkeys(name for name, _ in calls) if name not in prepared]
+
+    parts = [f"PREPARE {name} AS {PREPARED_STATEMENTS[name]}" for name in missing]
+    params = []
+    for name, args in calls:
+        parts.append(f"EXECUTE {name}({', '.join(['%s'] * len(args))})")
+        params.extend(_db_value(arg) for arg in args)
+
+    try:
+        with fairy.dbapi_connection.cursor() as cursor:
+            cursor.execute(";\n".join(parts), params)
+            if cursor.description is None:
+                result = [], []
+            else:
+                result = [column.name for column in cursor.description], cursor.fetchall()
+    except Exception:
+        # состояние PREPARE на сервере после ошибки неизвестно — соединение в пул не возвращаем
+        conn.invalidate()
+        raise
+    prepared.update(missing)
+    return result
+
+@retry_db()
+def get_protocol_details(engine, name_point, date_event):
+    """
+    Текущие бегуны и волонтёры одного протокола одним подготовленным запросом
+    (один round trip; для многих протоколов — get_by_keys).
+    :return: (df бегунов со столбцами PROTOCOL_RUN_COLUMNS, df волонтёров со столбцами PROTOCOL_VOL_COLUMNS)
+    """
+    with engine.connect() as conn:
+        columns, rows = execute_prepared(conn, [("protocol_details", (name_point, date_event))])
+
+    columns = columns[1:]
+    result_run = pd.DataFrame([row[1:] for row in rows if row[0] == 'run'], columns=columns)
+    result_vol = pd.DataFrame([row[1:] for row in rows if row[0] == 'vol'], columns=columns)
+    return (
+        decode_durations(result_run[PROTOCOL_RUN_COLUMNS]),
+        decode_durations(result_vol[PROTOCOL_VOL_COLUMNS]),
+    )
+
+def _copy_frame(df):
+    '''
+    Готовим df к выгрузке в CSV для COPY:
+    длительности в секундах пишем как hh:mm:ss (граница записи в time/interval),
+    float-столбцы, в которых только целые значения (Int с пропусками после merge), пишем как целые,
+    чтобы '5.0' не ломал загрузку в integer-колонку.
+    '''
+    df = encode_durations(df).copy()
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_float_dtype(series.dtype):
+            values = series.dropna()
+            if (values == np.floor(values)).all():
+                df[col] = series.astype('Int64')
+    return df
+
+def copy_df(conn, table_name, df, columns=None):
+    """
+    Массовая запись df в таблицу через COPY FROM STDIN (CSV) внутри транзакции вызывающего.
+
+    :param conn: Session или Connection SQLAlchemy (commit делает вызывающий)
+    :param table_name: имя таблицы
+    :param df: DataFrame со строками для вставки
+    :param columns: какие столбцы писать (по умолчанию — все столбцы df)
+    :return: количество записанных строк
+    """
+    if df is None or df.empty:
+        return 0
+
+    columns = list(df.columns if columns is None else columns)
+    buffer = io.StringIO()
+    _copy_frame(df[columns]).to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+
+    request = (
+        f"COPY {table_name} ({', '.join(columns)}) "
+        f"FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    )
+    with _raw_connection(conn).cursor() as cursor:
+        cursor.copy_expert(request, buffer)
+    return len(df)
+
+def insert_new_rows(conn, table_name, df, key_columns, columns=None):
+    """
+    Добавляет в таблицу только строки с новыми ключами:
+    COPY во временную таблицу и INSERT ... SELECT ... ON CONFLICT (ключ) DO NOTHING.
+    Существующие ключи таблицы в Python не читаются.
+
+    :param conn: Session или Connection SQLAlchemy внутри транзакции
+    :param key_columns: столбцы уникального ключа; уникальный индекс по ним создаётся миграцией (db_migrations)
+    :return: количество реально добавленных строк
+    """
+    if df is None or df.empty:
+        return 0
+
+    columns = list(df.columns if columns is None else columns)
+    temp_table = f"tmp_{table_name}"
+
+    conn.execute(sa.text(f"DROP TABLE IF EXISTS {temp_table};"))
+    conn.execute(sa.text(
+        f"CREATE TEMP TABLE {temp_table} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP;"
+    ))
+    copy_df(conn, temp_table, df, columns)
+
+    column_list = ', '.join(columns)
+    result = conn.execute(sa.text(f"""
+        INSERT INTO {table_name} ({column_list})
+        SELECT {column_list} FROM {temp_table}
+        ON CONFLICT ({', '.join(key_columns)}) DO NOTHING;
+    """))
+    conn.execute(sa.text(f"DROP TABLE {temp_table};"))
+    return result.rowcount
+
 @retry_db()
 def append_df(engine, table_name, df):
     """
-    Добавляет df в таблицу.
-    to_sql уже внутри использует connection pool → ретрай через декоратор работает.
+    Добавляет df в таблицу (COPY, одна транзакция).
+    Соединение берётся из пула engine → ретрай через декоратор работает.
     """
     if df is None or df.empty:
         return
 
-    df.to_sql(table_name, engine, if_exists='append', index=False)
+    with engine.begin() as conn:
+        copy_df(conn, table_name, df)
 
 def info_table_update(engine, table_name, upd_time):
     '''Функция записи информации об обновлении данных в определенной таблице БД (логер)'''
-    Session = sessionmaker(bind=engine)
-    session = Session()
-
-    insert_query = sa.text(f"""
-        INSERT INTO update_table (table_name, update_date)
-        VALUES ('{table_name}', '{upd_time}');
-        """)
-    session.execute(insert_query)
-    session.commit()
-    session.close()
-
-
-def create_condition(condition, type):
-    # формируем части условий для WHERE
-    where_conditions = []
-    for cond in condition:
-        key = list(cond.keys())[0]
-        value = cond[key]
-        where_conditions.append(f"{key}='{value}'")
-        # if isinstance(value, str):
-        #     # Если значение является строкой, добавляем одинарные кавычки вокруг значения
-        #     where_conditions.append(f"{key}='{value}'")
-        # else:
-        #     # Для чисел и прочих типов используем значение напрямую
-        #     where_conditions.append(f"{key}={value}")
-    # Формируем общий запрос с условием WHERE
-    where_clause = f" {type} ".join(where_conditions)
-    return where_clause
+    with engine.begin() as conn:
+        execute_prepared(conn, [("table_updated", (table_name, upd_time))])
+
+
+def _is_array_value(value):
+    return isinstance(value, (list, tuple, set, frozenset, pd.Series, pd.Index, np.ndarray))
+
+def build_where(filters, column_types=None, prefix='w'):
+    """
+    Условие WHERE из фильтров с параметрами вместо подстановки значений в текст запроса
+    (апострофы в названиях парков не ломают SQL, а запросы одной формы
+    Postgres и драйвер видят как один и тот же текст).
+
+    - скаляр          → column = :w0
+    - список/Series   → column = ANY(:w0)  (форма запроса не зависит от длины списка)
+    - None            → column IS NULL
+
+    :param filters: словарь {колонка: значение} или список словарей вида [{'колонка': значение}, ...]
+    :param column_types: {колонка: тип Postgres} — для явного CAST массива, например {'date_event': 'timestamp'}
+    :param prefix: префикс имён параметров (чтобы несколько условий не пересекались)
+    :return: (sql без слова WHERE, словарь параметров); для пустых фильтров — ('TRUE', {})
+    """
+    if isinstance(filters, (list, tuple)):
+        merged = {}
+        for item in filters:
+            merged.update(item)
+        filters = merged
+    column_types = column_types or {}
+
+    conditions = []
+    params = {}
+    for i, (column, value) in enumerate(filters.items()):
+        name = f'{prefix}{i}'
+        if _is_array_value(value):
+            values = [_db_value(v) for v in pd.unique(pd.Series(list(value), dtype=object))]
+            array = f'CAST(:{name} AS {column_types[column]}[])' if column in column_types else f':{name}'
+            conditions.append(f'{column} = ANY({array})')
+            params[name] = values
+        elif value is None:
+            conditions.append(f'{column} IS NULL')
+        else:
+            conditions.append(f'{column} = :{name}')
+            params[name] = _db_value(value)
+
+    return ' AND '.join(conditions) or 'TRUE', params
+
+def select_query(name_table, filters=None, columns='*', column_types=None, order_by=None, limit=None):
+    """
+    SELECT по таблице с параметризованными фильтрами (см. build_where) и LIMIT как параметром.
+    :return: (sa.text, params) — для read_sql / execute_request
+    """
+    where, params = build_where(filters or {}, column_types)
+    sql = f"SELECT {columns} FROM {name_table} WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = int(limit)
+    return sa.text(sql), params
+
+def _db_value(value):
+    '''Приводим значение из DataFrame к типу, который понимает драйвер (NaN/NA/NaT → None)'''
+    if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _unnest_keys(keys_df, key_types, nullable_keys=()):
+    '''
+    Общая часть запросов по набору ключей: unnest(...) от массивов-параметров,
+    условие соединения с таблицей t и сами параметры.
+    '''
+    columns = list(key_types)
+    keys = keys_df[columns].drop_duplicates()
+
+    params = {
+        f'k{i}': [_db_value(v) for v in keys[col].tolist()]
+        for i, col in enumerate(columns)
+    }
+    unnest_args = ', '.join(f'CAST(:k{i} AS {key_types[col]}[])' for i, col in enumerate(columns))
+    conditions = ' AND '.join(
+        f't.{col} IS NOT DISTINCT FROM k.{col}' if col in nullable_keys else f't.{col} = k.{col}'
+        for col in columns
+    )
+    return f"unnest({unnest_args})", columns, conditions, params
+
+def delete_by_keys(session, name_table, keys_df, key_types, nullable_keys=()):
+    """
+    Удаляет строки таблицы по набору ключей ОДНИМ запросом:
+    DELETE ... USING unnest(:массивы ключей) с привязанными параметрами.
+
+    :param session: Session или Connection, внутри транзакции которой выполняется удаление
+    :param name_table: имя таблицы
+    :param keys_df: DataFrame с колонками-ключами (лишние колонки игнорируются)
+    :param key_types: словарь {колонка: тип Postgres}, например {'position': 'integer'}
+    :param nullable_keys: колонки, которые сравниваются через IS NOT DISTINCT FROM (NULL = NULL)
+    :return: количество удалённых строк
+    """
+    if keys_df is None or len(keys_df) == 0:
+        return 0
+
+    unnest, columns, conditions, params = _unnest_keys(keys_df, key_types, nullable_keys)
+    request = sa.text(f"""
+        DELETE FROM {name_table} t
+        USING {unnest} AS k({', '.join(columns)})
+        WHERE {conditions};
+    """)
+    return session.execute(request, params).rowcount
+
+@retry_db()
+def get_by_keys(engine, name_table, keys_df, key_types, columns='t.*'):
+    """
+    Считывает строки таблицы по набору ключей ОДНИМ запросом
+    (JOIN с unnest(:массивы ключей)) вместо отдельного SELECT на каждый ключ.
+    Строки возвращаются в порядке ключей в keys_df.
+
+    :param engine: объект подключения к базе данных
+    :param name_table: имя таблицы
+    :param keys_df: DataFrame с колонками-ключами (лишние колонки игнорируются)
+    :param key_types: словарь {колонка: тип Postgres}, например {'date_event': 'timestamp'}
+    :param columns: список столбцов для SELECT (по умолчанию все столбцы таблицы)
+    :return: таблица pandas.DataFrame с результатом выборки
+    """
+    if keys_df is None or len(keys_df) == 0:
+        return read_sql(sa.text(f"SELECT {columns} FROM {name_table} t WHERE false;"), engine)
+
+    unnest, key_columns, conditions, params = _unnest_keys(keys_df, key_types)
+    query = sa.text(f"""
+        SELECT {columns}
+        FROM {name_table} t
+        JOIN {unnest} WITH ORDINALITY AS k({', '.join(key_columns)}, key_order)
+          ON {conditions}
+        ORDER BY k.key_order;
+    """)
+    return read_sql(query, engine, params)
 
 @retry_db()
 def get_inf_with_condition(engine, name_table, condition):
     """
-        Функция считывает данные из PostgreSQL с заданными условиями.
+        Функция считывает данные из PostgreSQL с заданными условиями (через параметры запроса).
 
         :param engine: объект подключения к базе данных
         :param name_table:return: строка с именем таблицы
-        :param condition: список словарей вида {'column_name': 'value'}
+        :param condition: список словарей вида {'column_name': 'value'} или один словарь;
+                          значение-список превращается в column = ANY(:array)
         :return: таблица pandas.DataFrame с результатом выборки
         """
-    where_conditions = create_condition(condition, 'AND')
-    query = f"SELECT * FROM {name_table} WHERE {where_conditions};"
-    return pd.read_sql_query(query, con=engine)
+    query, params = select_query(name_table, condition)
+    return read_sql(query, engine, params)
 
 @retry_db()
 def update_view(engine, view_name):
     '''Обновление материализованной view'''
     with engine.connect() as conn:
+        # обновление view может идти дольше обычного statement_timeout
+        conn.execute(sa.text("SET LOCAL statement_timeout = 0;"))
         conn.execute(sa.text(f"REFRESH MATERIALIZED VIEW {view_name};"))
         conn.commit()
 
 @retry_db()
-def mark_protocol_checked(engine, name_point, date_event):
+def mark_protocol_checked(engine, name_point, date_event, protocol_hash=None):
     """
     Обновляет дату/время последней проверки протокола.
     Вызывать только после успешного завершения сравнения
     или после успешной записи изменений в БД.
+    Если передан protocol_hash — заодно сохраняет отпечаток сверенного протокола.
+    Выполняется подготовленным запросом protocol_checked (см. execute_prepared).
+    """
+    with engine.begin() as conn:
+        execute_prepared(conn, [("protocol_checked", (name_point, date_event, protocol_hash))])
+
+@retry_db()
+def mark_protocols_checked(engine, checked_protocols):
+    """
+    Пакетный вариант mark_protocol_checked: один executemany на пачку протоколов.
+
+    :param checked_protocols: список словарей name_point, date_event и (необязательно) protocol_hash
     """
+    if not checked_protocols:
+        return
+
     query = sa.text("""
         UPDATE list_all_events
-        SET last_check_at = now()
+        SET last_check_at = now(), protocol_hash = COALESCE(:protocol_hash, protocol_hash)
         WHERE name_point = :name_point
           AND date_event = :date_event;
     """)
+    with engine.begin() as conn:
+        conn.execute(query, [
+            {
+                "name_point": item["name_point"],
+                "date_event": item["date_event"],
+                "protocol_hash": item.get("protocol_hash")
+            }
+            for item in checked_protocols
+        ])
 
+@retry_db()
+def get_protocol_hash(engine, name_point, date_event):
+    """
+    Возвращает сохранённый отпечаток протокола из list_all_events
+    (None, если протокола нет или отпечаток ещё не считался).
+    Колонка list_all_events.protocol_hash создаётся миграцией (db_migrations).
+    """
     with engine.connect() as conn:
-        conn.execute(query, {
-            "name_point": name_point,
-            "date_event": date_event
-        })
-        conn.commit()
\ No newline at end of file
+        _, rows = execute_prepared(conn, [("protocol_hash", (name_point, date_event))])
+    return rows[0][0] if rows else None
@@ -268,7 +268,7 @@ def main():
 
     # чтобы подтянуть DB_handler с уровнем выше
     sys.path.append(str(project_root))
-    from DB_handler import db_connect  # type: ignore
+    from DB_handler import db_connect, copy_df  # type: ignore
 
     config = configparser.ConfigParser()
     read_files = config.read(config_path, encoding="utf-8")
@@ -465,22 +465,10 @@ def main():
                         )
 
                         # 2) протоколы
-                        if not df_protocol.empty:
-                            df_protocol.to_sql(
-                                "parkrun_details_protocol",
-                                con=conn,
-                                if_exists="append",
-                                index=False,
-                            )
+                        copy_df(conn, "parkrun_details_protocol", df_protocol)
 
                         # 3) волонтёрский summary
-                        if not df_vol_summary.empty:
-                            df_vol_summary.to_sql(
-                                "parkrun_vol_summary",
-                                con=conn,
-                                if_exists="append",
-                                index=False,
-                            )
+                        copy_df(conn, "parkrun_vol_summary", df_vol_summary)
 
                         # 4) last_updated
                         conn.execute(
@@ -22,14 +22,16 @@ credential = f'postgresql://{db_user}:{db_pass}@{db_host}/{db_name}'
 engine = sa.create_engine(credential)
 result = pd.read_sql(f"SELECT * FROM list_all_events", con=engine)
 
-all_protocol, all_protocol_vol = pd.DataFrame(), pd.DataFrame()
+raw_runs, raw_vols = [], []
 
 count = len(result)
 for _, row in tqdm(result.iterrows(), total=count):
-    # Две строчки ниже расчитаны на первичный сбор данных через юпитер блокнот на случай, если скрипт падает, чтобы он продолжил заполнять df, который уже начал
-    #if ((all_protocol['date_event'].isin([row['date_event']])) & (all_protocol['name_point'].isin([row['name_point']]))).any():
-    #    continue
     link = row['link_event']
-    final_df_run, final_df_vol = pp.main_parse(link)
-    all_protocol = pd.concat([all_protocol, final_df_run], ignore_index=True)
-    all_protocol_vol = pd.concat([all_protocol_vol, final_df_vol], ignore_index=True)
\ No newline at end of file
+    # Только парсим страницу, а векторные преобразования делаем один раз на весь набор
+    df_run, df_vol, date_event, name_point = pp.parse_protocol(link)
+    raw_runs.append(df_run.assign(date_event=date_event, name_point=name_point))
+    if isinstance(df_vol, pd.DataFrame):
+        raw_vols.append(df_vol.assign(date_event=date_event, name_point=name_point))
+
+all_protocol = pp.processing_run(pd.concat(raw_runs, ignore_index=True)) if raw_runs else pd.DataFrame()
+all_protocol_vol = pp.processing_vol(pd.concat(raw_vols, ignore_index=True)) if raw_vols else pd.DataFrame()
@@ -0,0 +1,100 @@
+"""
+Общий словарь категорий для столбцов протоколов с повторяющимися строками
+(парк, возрастная группа, статус участника, роль волонтёра).
+
+Вместо миллионов одинаковых Python-строк столбец хранится как pandas.Categorical:
+коды + один список значений. Список значений (словарь) общий для всех кадров
+и сохраняется в SQLite-базе CATEGORY_DIR/categories.sqlite3: новые значения только
+дописываются в конец, код значения не меняется. Поэтому кадры с сайта и из БД,
+разобранные в разных процессах и запусках, получают одинаковый dtype
+и merge в find_dif_protocol идёт по целочисленным кодам.
+"""
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+CATEGORY_DIR = Path(os.environ.get("CATEGORY_DIR", BASE_DIR / ".categories"))
+STATE_DB = CATEGORY_DIR / "categories.sqlite3"
+
+CATEGORY_COLUMNS = ('name_point', 'age_category', 'status_runner', 'vol_role')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    dictionary TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (dictionary, code),
+    UNIQUE (dictionary, value)
+)
+"""
+
+_dictionaries = {}
+_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    CATEGORY_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(STATE_DB, timeout=60, isolation_level=None)
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def get_categories(dictionary, values=()):
+    """
+    Значения словаря в порядке кодов. Отсутствующие values дописываются в конец
+    (в SQLite под BEGIN IMMEDIATE, чтобы параллельные процессы не выдали разные коды).
+    """
+    with _lock:
+        known = _dictionaries.get(dictionary)
+        if known is not None:
+            known_set = set(known)
+            if all(value in known_set for value in values):
+                return known
+
+        conn = _connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            stored = [row[0] for row in conn.execute(
+                "SELECT value FROM categories WHERE dictionary = ? ORDER BY code", (dictionary,)
+            )]
+            stored_set = set(stored)
+            new_values = [value for value in dict.fromkeys(values) if value not in stored_set]
+            conn.executemany(
+                "INSERT INTO categories (dictionary, code, value) VALUES (?, ?, ?)",
+                [(dictionary, len(stored) + i, value) for i, value in enumerate(new_values)]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        _dictionaries[dictionary] = stored + new_values
+        return _dictionaries[dictionary]
+
+
+def categorize(df, columns=CATEGORY_COLUMNS):
+    """
+    Переводит строковые столбцы df в category с общим словарём.
+    Уже категориальные столбцы переводятся на актуальный словарь (коды выравниваются).
+    """
+    columns = [col for col in columns if col in df.columns]
+    if not columns:
+        return df
+
+    df = df.copy()
+    for col in columns:
+        series = df[col]
+        values = series.dropna().astype(str).unique().tolist()
+        categories = get_categories(col, values)
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            df[col] = series.cat.set_categories(categories)
+        else:
+            df[col] = pd.Categorical(series.where(series.isna(), series.astype(str)), categories=categories)
+    return df
@@ -3,13 +3,12 @@ from datetime import date
 import sqlalchemy as sa
 import pandas as pd
 import configparser
-import requests
 from pathlib import Path
 import re
 from bs4 import BeautifulSoup
-import time
 from io import StringIO
 import DB_handler as db
+from http_fetch import fetch_html
 
 BASE_DIR = Path(__file__).resolve().parent
 CONFIG_PATH = BASE_DIR / "5_verst.ini"
@@ -55,45 +54,13 @@ MONTH_ORDER = [
     "July", "August", "September", "October", "November", "December"
 ]
 
-def _fetch_html(url: str, tries: int = 3, pause: float = 2.0) -> str:
-    headers = {
-        "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                       "AppleWebKit/537.36 (KHTML, like Gecko) "
-                       "Chrome/127.0.0 Safari/537.36"),
-        "Accept-Language": "ru,en;q=0.9",
-        "Referer": "https://5verst.ru/",
-    }
-    for i in range(tries):
-        try:
-            r = requests.get(url, headers=headers, timeout=20)
-            if r.status_code == 200:
-                if not r.encoding or r.encoding.lower() == "iso-8859-1":
-                    r.encoding = r.apparent_encoding
-                return r.text
-            if r.status_code in (403, 429):
-                time.sleep(pause * (i + 1))
-                continue
-            r.raise_for_status()
-        except Exception:
-            time.sleep(pause * (i + 1))
-
-    try:
-        import cloudscraper
-        scraper = cloudscraper.create_scraper()
-        r = scraper.get(url, timeout=30)
-        if r.status_code == 200:
-            return r.text
-        raise RuntimeError(f"cloudscraper status={r.status_code}")
-    except Exception as e:
-        raise RuntimeError(f"Не удалось получить HTML: {e}")
-
 def update_date_load():
     current_datetime = datetime.now()
     print(f'Запуск функции update_date_load() в {current_datetime}')
 
     # 1️⃣ Скачиваем страницу с нужными заголовками (или через cloudscraper)
     site = 'https://5verst.ru/results/latest/'
-    html = _fetch_html(site)  # <-- новая функция, как в других скриптах
+    html = fetch_html(site)  # общий слой загрузки, как в других скриптах
 
     # 2️⃣ Парсим таблицу не напрямую по ссылке, а из HTML
     last_event = pd.read_html(StringIO(html), flavor="lxml")[0]
@@ -166,10 +133,10 @@ def _fmt_time(hhmm: str) -> str:
 def extract_schedule(url: str):
     """
     Парсит страницу парка и извлекает расписание стартов.
-    Теперь использует _fetch_html() вместо requests.get()
-    — с заголовками и защитой от 403.
+    Использует общий http_fetch.fetch_html()
+    — с ретраями и бюджетом запросов к сайту.
     """
-    html = _fetch_html(url)  # ✅ защищённая загрузка HTML
+    html = fetch_html(url)  # ✅ защищённая загрузка HTML
     soup = BeautifulSoup(html, 'lxml')
 
     blocks = soup.find_all('div', {'class': 'knd-block-info__col'})
@@ -0,0 +1,87 @@
+"""
+Разовые изменения схемы БД (миграции).
+
+DDL не выполняется в рабочих скриптах: ALTER TABLE / CREATE INDEX берут тяжёлые блокировки
+и сканируют таблицы, а в транзакции пакета ещё и откатываются вместе с ним.
+Поэтому такие изменения лежат здесь и применяются один раз при выкладке:
+
+    python db_migrations.py
+
+Применённые миграции записываются в schema_migrations, повторный запуск ничего не делает.
+Новую миграцию добавляйте в конец MIGRATIONS, уже применённые не меняйте.
+"""
+import configparser
+from pathlib import Path
+
+from sqlalchemy import text
+
+from DB_handler import db_connect
+
+CONFIG_PATH = Path(__file__).resolve().parent.parent / "5_verst.ini"
+
+# (имя миграции, SQL) — в порядке применения
+MIGRATIONS = [
+    (
+        "s95_list_all_events_unique_key",
+        # ключ ON CONFLICT в insert_new_rows (s95_summary_crawler.save_summary_batch)
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS s95_list_all_events_name_point_date_event_key
+            ON s95_list_all_events (name_point, date_event);
+        """,
+    ),
+    (
+        "list_all_events_protocol_hash",
+        # отпечаток сверенного протокола (update_data_functions.protocol_fingerprint)
+        """
+        ALTER TABLE list_all_events ADD COLUMN IF NOT EXISTS protocol_hash text;
+        """,
+    ),
+]
+
+_CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        name text PRIMARY KEY,
+        applied_at timestamptz NOT NULL DEFAULT now()
+    );
+"""
+
+
+def get_credential(config_path=CONFIG_PATH):
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    db_host = config['five_verst_stats']['host']
+    db_user = config['five_verst_stats']['username']
+    db_pass = config['five_verst_stats']['password']
+    db_name = config['five_verst_stats']['dbname']
+    return f'postgresql://{db_user}:{db_pass}@{db_host}/{db_name}'
+
+
+def apply_migrations(engine):
+    """
+    Применяет ещё не применённые миграции, каждую в своей транзакции
+    (вместе с записью в schema_migrations).
+    :return: список имён применённых сейчас миграций
+    """
+    with engine.begin() as conn:
+        conn.execute(text(_CREATE_MIGRATIONS_TABLE))
+        applied = set(conn.execute(text("SELECT name FROM schema_migrations")).scalars())
+
+    done = []
+    for name, sql in MIGRATIONS:
+        if name in applied:
+            continue
+        with engine.begin() as conn:
+            # DDL миграции может идти дольше обычного statement_timeout
+            conn.execute(text("SET LOCAL statement_timeout = 0"))
+            conn.execute(text(sql))
+            conn.execute(text("INSERT INTO schema_migrations (name) VALUES (:name)"), {"name": name})
+        print(f"Применена миграция: {name}")
+        done.append(name)
+    return done
+
+
+if __name__ == "__main__":
+    applied_now = apply_migrations(db_connect(get_credential()))
+    if not applied_now:
+        print("Схема БД актуальна, миграций для применения нет.")
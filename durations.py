@@ -0,0 +1,107 @@
+"""
+Времена из протоколов (5 вёрст и s95): финиш, темп, среднее и лучшие времена.
+
+Внутри DataFrame длительность хранится как целые секунды в DURATION_DTYPE (Int32):
+без Python-объектов datetime.time, поэтому кадры компактны, а merge и сравнение
+идут по числам. Строки с сайта переводятся в секунды одним str.extract
+по скомпилированному регулярному выражению и целочисленной арифметикой.
+
+В time/interval значения превращаются только на границе с БД (DB_handler):
+decode_durations — после чтения, encode_durations — перед COPY.
+Какие столбцы считаются длительностями, определяет DURATION_COLUMNS.
+"""
+import re
+from datetime import time, timedelta
+
+import pandas as pd
+
+DURATION_DTYPE = 'Int32'
+DURATION_COLUMNS = ('finish_time', 'pace', 'mean_time', 'best_time_woman', 'best_time_man')
+
+HMS_RE = re.compile(r'^\s*(\d{1,2}):(\d{1,2}):(\d{1,2})\s*$')
+# часы необязательны: '20:07' читается как mm:ss
+SHORT_HMS_RE = re.compile(r'^\s*(?:(\d{1,2}):)?(\d{1,2}):(\d{1,2})\s*$')
+# "Иван Иванов (20:07)" -> имя и время в последних скобках; скобок может не быть
+NAME_TIME_RE = re.compile(r'^\s*(?P<name>.*?)\s*(?:\((?P<time>[^()]*)\)[^()]*)?$', re.DOTALL)
+
+
+def parse_time_seconds(series, allow_short=False):
+    '''
+    Строки вида hh:mm:ss (при allow_short=True — ещё и mm:ss) → целые секунды (Int32).
+    Строки другого формата и значения вне диапазона времени суток → <NA>.
+    '''
+    pattern = SHORT_HMS_RE if allow_short else HMS_RE
+    parts = series.astype('string').str.extract(pattern).apply(pd.to_numeric, errors='coerce')
+    hours, minutes, seconds = parts[0].fillna(0) if allow_short else parts[0], parts[1], parts[2]
+    valid = (hours < 24) & (minutes < 60) & (seconds < 60)
+    total = (hours * 3600 + minutes * 60 + seconds).where(valid)
+    return total.astype(DURATION_DTYPE)
+
+
+def time_to_seconds(series):
+    '''
+    Значения из БД (datetime.time, timedelta/interval или строки hh:mm:ss) → целые секунды (Int32).
+    Объекты переводятся через словарь уникальных значений, пропуски → <NA>.
+    '''
+    if pd.api.types.is_timedelta64_dtype(series.dtype):
+        return series.dt.total_seconds().round().astype(DURATION_DTYPE)
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.astype(DURATION_DTYPE)
+
+    lookup = {}
+    for value in series.dropna().unique():
+        if isinstance(value, time):
+            lookup[value] = value.hour * 3600 + value.minute * 60 + value.second
+        elif isinstance(value, timedelta):
+            lookup[value] = round(value.total_seconds())
+    if lookup:
+        seconds = series.map(lookup, na_action='ignore')
+        return pd.to_numeric(seconds, errors='coerce').astype(DURATION_DTYPE)
+    return parse_time_seconds(series)
+
+
+def format_seconds(series):
+    '''Целые секунды → строки hh:mm:ss (так их принимает COPY и в time, и в interval), <NA> → <NA>'''
+    seconds = series.astype('Int64')
+    parts = (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+    hours, minutes, secs = (part.astype('string').str.zfill(2) for part in parts)
+    return hours + ':' + minutes + ':' + secs
+
+
+def split_name_time(series):
+    '''
+    Столбец вида "Имя (mm:ss)" → (имя: string, время: Int32 секунд).
+    Если скобок со временем нет — время <NA>, пустое имя → <NA>.
+    '''
+    parts = series.astype('string').str.extract(NAME_TIME_RE)
+    name = parts['name'].replace('', pd.NA)
+    return name, parse_time_seconds(parts['time'], allow_short=True)
+
+
+def decode_durations(df):
+    '''Граница чтения из БД: столбцы-длительности (DURATION_COLUMNS) → Int32 секунд'''
+    columns = [col for col in DURATION_COLUMNS if col in df.columns]
+    if not columns:
+        return df
+    df = df.copy()
+    for col in columns:
+        df[col] = time_to_seconds(df[col])
+    return df
+
+
+def _is_seconds(series):
+    '''Секунды числом (в том числе object-столбец из целых, например после row.to_frame().T)'''
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return True
+    return series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) in ('integer', 'floating')
+
+
+def encode_durations(df):
+    '''Граница записи в БД: столбцы-длительности в секундах → строки hh:mm:ss для COPY'''
+    columns = [col for col in DURATION_COLUMNS if col in df.columns and _is_seconds(df[col])]
+    if not columns:
+        return df
+    df = df.copy()
+    for col in columns:
+        df[col] = format_seconds(pd.to_numeric(df[col]))
+    return df
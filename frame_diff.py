@@ -0,0 +1,102 @@
+"""
+Сравнение двух таблиц как мультимножеств строк через 64-битные хэши.
+
+Каждая строка нормализуется (числа → float64, даты → datetime64[ns], остальное —
+строки с отдельным маркером пропуска) и хэшируется pd.util.hash_pandas_object.
+Дальше сравниваются только массивы хэшей (сортировка + searchsorted в NumPy),
+без merge по всем столбцам с object-значениями.
+
+Дубликаты учитываются: если на сайте строка встречается дважды, а в БД один раз,
+добавить нужно ровно одну копию (merge с indicator её бы не увидел).
+"""
+import numpy as np
+import pandas as pd
+
+# отдельное значение для пропуска: None, NaN, <NA> и NaT считаются одинаковыми,
+# но не равными строке 'None' или пустой строке
+NA_TOKEN = '\x00<NA>'
+
+
+def _column_kind(series_list):
+    '''Как нормализовать столбец: по первому кадру, где в нём есть значения'''
+    for series in series_list:
+        if series.notna().any():
+            if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(series.dtype):
+                return 'text'
+            if pd.api.types.is_numeric_dtype(series.dtype):
+                return 'number'
+            if pd.api.types.is_datetime64_any_dtype(series.dtype):
+                return 'datetime'
+            return 'text'
+    return 'text'
+
+
+def _normalize(series, kind):
+    if kind == 'number':
+        return pd.to_numeric(series, errors='coerce').astype('float64')
+    if kind == 'datetime':
+        return pd.to_datetime(series, errors='coerce').astype('datetime64[ns]')
+    text = series.astype(object)
+    return text.where(series.notna(), NA_TOKEN).astype(str)
+
+
+def row_hashes(frames, columns):
+    '''
+    Хэши строк нескольких кадров по общим столбцам, нормализованных одинаково.
+    :return: список np.ndarray uint64 — по одному на кадр
+    '''
+    normalized = [pd.DataFrame(index=df.index) for df in frames]
+    for col in columns:
+        kind = _column_kind([df[col] for df in frames])
+        for df, norm in zip(frames, normalized):
+            norm[col] = _normalize(df[col], kind)
+    return [pd.util.hash_pandas_object(norm, index=False).to_numpy() for norm in normalized]
+
+
+def _occurrence(hashes):
+    '''Номер вхождения каждого хэша среди равных ему (0 для первой копии, 1 для второй, ...)'''
+    order = np.argsort(hashes, kind='stable')
+    sorted_hashes = hashes[order]
+    positions = np.arange(len(hashes))
+    is_first = np.ones(len(hashes), dtype=bool)
+    is_first[1:] = sorted_hashes[1:] != sorted_hashes[:-1]
+    group_start = np.maximum.accumulate(np.where(is_first, positions, 0))
+    occurrence = np.empty(len(hashes), dtype=np.int64)
+    occurrence[order] = positions - group_start
+    return occurrence
+
+
+def _extra_rows(hashes, other_hashes):
+    '''Маска строк, которых нет в other (с учётом кратности)'''
+    other_sorted = np.sort(other_hashes)
+    available = (
+        np.searchsorted(other_sorted, hashes, side='right')
+        - np.searchsorted(other_sorted, hashes, side='left')
+    )
+    return _occurrence(hashes) >= available
+
+
+def diff_rows(actual_df, not_actual_df, columns, key_columns=None):
+    '''
+    Разница двух таблиц по столбцам columns как мультимножеств строк.
+
+    :param key_columns: ключ, по которому удаления применяются в БД (delete_by_keys).
+        Удаление по ключу снимает ВСЕ строки с этим ключом, поэтому строки actual_df
+        с удаляемыми ключами тоже попадают в добавление — иначе одинаковые
+        или совпадающие по ключу строки пропали бы из БД.
+    :return: (строки not_actual_df, которых нет в actual_df; строки actual_df, которых нет в not_actual_df)
+    '''
+    actual_df = actual_df.reindex(columns=columns)
+    not_actual_df = not_actual_df.reindex(columns=columns)
+    actual_hashes, not_actual_hashes = row_hashes([actual_df, not_actual_df], columns)
+
+    delete_mask = _extra_rows(not_actual_hashes, actual_hashes)
+    add_mask = _extra_rows(actual_hashes, not_actual_hashes)
+
+    if key_columns and delete_mask.any():
+        actual_keys, not_actual_keys = row_hashes([actual_df, not_actual_df], list(key_columns))
+        add_mask |= np.isin(actual_keys, not_actual_keys[delete_mask])
+
+    for_delete = not_actual_df[delete_mask].reset_index(drop=True)
+    to_add = actual_df[add_mask].reset_index(drop=True)
+    return for_delete, to_add
@@ -0,0 +1,311 @@
+"""
+Единый слой загрузки страниц 5 вёрст.
+
+Все скраперы (последние забеги, протоколы, списки протоколов парка,
+расписание стартов, добавление локации) ходят на сайт через этот модуль:
+- один пул соединений на хост (cloudscraper-сессия с HTTPAdapter);
+- бюджет вежливости на хост: не больше N одновременных запросов,
+  а частоту стартов задаёт адаптивный ограничитель rate_limiter
+  (ускоряется на быстрых ответах, резко замедляется на 403/429/таймаутах,
+  но никогда не чаще одного запроса в min_interval секунд);
+- одна политика ретраев/бэкоффа для таймаутов, обрывов и 5xx;
+- условные запросы по дисковому кэшу page_cache (ETag/Last-Modified).
+
+Асинхронный интерфейс (AsyncFetcher.fetch / fetch_many) позволяет
+перекрывать ожидание ответов сайта в пределах бюджета хоста,
+синхронный fetch_html оставлен для последовательных скриптов.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from urllib.parse import urlparse
+
+import cloudscraper
+import requests
+from requests.adapters import HTTPAdapter
+
+import page_cache
+import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+UA_HDRS = {
+    "Accept-Language": "ru,en;q=0.9",
+    "Referer": "https://5verst.ru/",
+}
+
+RETRY_HTTP_CODES = {500, 502, 503, 504}
+BLOCK_HTTP_CODES = {403, 429}
+
+
+class FetchError(RuntimeError):
+    """Страницу не удалось получить после всех попыток."""
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Политика повторов: экспоненциальный бэкофф с мягким джиттером."""
+    retries: int = 4
+    timeout: float = 30.0
+    base_delay: float = 5.0
+    backoff_factor: float = 2.0
+    max_delay: float = 300.0
+    jitter_factor: float = 0.1
+
+    def delay(self, attempt: int) -> float:
+        base = min(self.base_delay * (self.backoff_factor ** (attempt - 1)), self.max_delay)
+        k = random.uniform(1.0 - self.jitter_factor, 1.0 + self.jitter_factor)
+        return base * k
+
+
+@dataclass(frozen=True)
+class HostBudget:
+    """
+    Бюджет вежливости для одного хоста.
+    interval — стартовый интервал между запросами (если нет сохранённого состояния),
+    min_interval / max_interval — границы, в которых его двигает ограничитель.
+    """
+    max_concurrency: int = 1
+    min_interval: float = 1.0
+    interval: float = 2.0
+    max_interval: float = 60.0
+
+
+DEFAULT_POLICY = RetryPolicy()
+DEFAULT_BUDGET = HostBudget()
+
+HOST_BUDGETS = {
+    "5verst.ru": HostBudget(max_concurrency=2, min_interval=5.0, interval=10.0, max_interval=120.0),
+}
+
+
+@dataclass(frozen=True)
+class Page:
+    """Загруженная страница и её состояние в дисковом кэше."""
+    url: str
+    html: str
+    body_hash: str
+    unchanged: bool = False  # тело совпадает с последним успешно обработанным
+
+    @classmethod
+    def from_entry(cls, entry: page_cache.CacheEntry, body: str) -> "Page":
+        return cls(
+            url=entry.url,
+            html=body,
+            body_hash=entry.body_hash,
+            unchanged=entry.processed_hash == entry.body_hash,
+        )
+
+    def mark_processed(self):
+        """Вызывать после успешной сверки страницы с БД: в следующий раз unchanged=True."""
+        page_cache.mark_processed(self.url, self.body_hash)
+
+
+class _HostState:
+    """Пул соединений и счётчики бюджета для одного хоста."""
+
+    def __init__(self, host: str, budget: HostBudget):
+        self.budget = budget
+        self.slots = threading.BoundedSemaphore(budget.max_concurrency)
+        self.limiter = rate_limiter.get_limiter(
+            host,
+            interval=budget.interval,
+            min_interval=budget.min_interval,
+            max_interval=budget.max_interval,
+        )
+        self.session = self._build_session(budget.max_concurrency)
+
+    @staticmethod
+    def _build_session(pool_size):
+        session = cloudscraper.create_scraper(
+            browser={
+                "browser": "chrome",
+                "platform": "windows",
+                "mobile": False
+            }
+        )
+        session.headers.update(UA_HDRS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def wait_turn(self):
+        """Ждём своей очереди (токен ограничителя хоста)."""
+        self.limiter.acquire()
+
+
+class AsyncFetcher:
+    """
+    Клиент с пулом соединений и бюджетом на каждый хост.
+
+    Блокирующий сетевой вызов выполняется в потоке, поэтому бюджет
+    (семафор и интервал) общий для синхронных и асинхронных вызовов
+    и не привязан к конкретному event loop.
+    """
+
+    def __init__(self, policy: RetryPolicy = DEFAULT_POLICY, budgets: Optional[dict] = None):
+        self.policy = policy
+        self.budgets = dict(HOST_BUDGETS if budgets is None else budgets)
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def _host(self, url: str) -> _HostState:
+        host = urlparse(url).netloc.lower()
+        with self._hosts_lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = _HostState(host, self.budgets.get(host, DEFAULT_BUDGET))
+                self._hosts[host] = state
+            return state
+
+    def _request(self, state: _HostState, url: str, headers: Optional[dict] = None) -> requests.Response:
+        with state.slots:
+            state.wait_turn()
+            return state.session.get(url, headers=headers, timeout=self.policy.timeout, allow_redirects=True)
+
+    def fetch_page_sync(self, url: str, allow_missing: bool = False, use_cache: bool = True) -> Optional[Page]:
+        """
+        Загрузка страницы с ретраями и условным запросом по дисковому кэшу.
+
+        :param allow_missing: при 404 вернуть None вместо исключения
+        :param use_cache: отправлять If-None-Match/If-Modified-Since и сохранять ответ в page_cache
+        :return: Page с HTML и хэшем тела
+        """
+        state = self._host(url)
+        policy = self.policy
+        entry = page_cache.get_entry(url) if use_cache else None
+        last_exc = None
+
+        for attempt in range(1, policy.retries + 1):
+            try:
+                logger.info(f"Запрос к {url}, попытка {attempt}/{policy.retries}")
+                started = time.monotonic()
+                r = self._request(state, url, page_cache.conditional_headers(entry))
+                latency = time.monotonic() - started
+
+                if r.status_code in RETRY_HTTP_CODES or r.status_code in BLOCK_HTTP_CODES:
+                    state.limiter.on_throttle(f"HTTP {r.status_code}")
+                else:
+                    state.limiter.on_success(latency)
+
+                if r.status_code == 304 and entry is not None:
+                    body = page_cache.get_body(entry)
+                    if body is not None:
+                        logger.info(f"{url} не изменилась (304), берём из кэша")
+                        return Page.from_entry(page_cache.touch(entry), body)
+                    # тело пропало с диска — повторяем безусловным запросом
+                    entry = None
+                    continue
+
+                if r.status_code == 404 and allow_missing:
+                    return None
+
+                if r.status_code in RETRY_HTTP_CODES or r.status_code in BLOCK_HTTP_CODES:
+                    last_exc = FetchError(f"HTTP {r.status_code} для {url}")
+                else:
+                    r.raise_for_status()
+                    if not r.encoding or r.encoding.lower() == "iso-8859-1":
+                        r.encoding = r.apparent_encoding
+                    body = r.text
+                    if not use_cache:
+                        return Page(url=url, html=body, body_hash=page_cache.body_hash(body))
+                    new_entry = page_cache.store(
+                        url, body,
+                        etag=r.headers.get("ETag"),
+                        last_modified=r.headers.get("Last-Modified"),
+                    )
+                    return Page.from_entry(new_entry, body)
+
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                # сеть тупит или обрыв соединения → замедляемся и повторяем
+                state.limiter.on_throttle(type(e).__name__)
+                last_exc = e
+
+            except requests.exceptions.HTTPError as e:
+                # остальные HTTP ошибки не лечатся ретраями
+                logger.error(f"HTTP ошибка при запросе {url}: {e}")
+                raise FetchError(f"Не удалось получить HTML: {e}") from e
+
+            except Exception as e:
+                logger.exception(f"Неожиданная ошибка при запросе {url}: {e}")
+                raise FetchError(f"Не удалось получить HTML: {e}") from e
+
+            if attempt < policy.retries:
+                delay = policy.delay(attempt)
+                logger.warning(f"{last_exc}. Повтор через {delay:.1f} сек...")
+                time.sleep(delay)
+
+        logger.error(f"Не удалось получить {url} после {policy.retries} попыток: {last_exc}")
+        raise FetchError(f"Не удалось получить HTML: {last_exc}")
+
+    def fetch_sync(self, url: str, allow_missing: bool = False) -> Optional[str]:
+        """Загрузка страницы, возвращает только HTML (None при 404 и allow_missing)."""
+        page = self.fetch_page_sync(url, allow_missing=allow_missing)
+        return page.html if page is not None else None
+
+    async def fetch(self, url: str, allow_missing: bool = False) -> Optional[str]:
+        return await asyncio.to_thread(self.fetch_sync, url, allow_missing)
+
+    async def fetch_page(self, url: str, allow_missing: bool = False) -> Optional[Page]:
+        return await asyncio.to_thread(self.fetch_page_sync, url, allow_missing)
+
+    async def fetch_many(self, urls: Iterable[str], allow_missing: bool = False) -> list:
+        """
+        Параллельная загрузка списка страниц в пределах бюджета хостов.
+        Порядок результатов совпадает с порядком urls; вместо неудачной
+        страницы в списке лежит исключение.
+        """
+        urls = list(urls)
+        if not urls:
+            return []
+        tasks = [self.fetch(url, allow_missing=allow_missing) for url in urls]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def fetch_many_pages(self, urls: Iterable[str], allow_missing: bool = False) -> list:
+        """То же, что fetch_many, но с Page вместо HTML (нужен признак unchanged)."""
+        urls = list(urls)
+        if not urls:
+            return []
+        tasks = [self.fetch_page(url, allow_missing=allow_missing) for url in urls]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        with self._hosts_lock:
+            for state in self._hosts.values():
+                try:
+                    state.session.close()
+                except Exception:
+                    pass
+            self._hosts.clear()
+
+
+_default_fetcher = AsyncFetcher()
+
+
+def get_fetcher() -> AsyncFetcher:
+    return _default_fetcher
+
+
+def fetch_html(url: str, allow_missing: bool = False) -> Optional[str]:
+    """Синхронная загрузка одной страницы через общий клиент."""
+    return _default_fetcher.fetch_sync(url, allow_missing=allow_missing)
+
+
+def fetch_page(url: str, allow_missing: bool = False) -> Optional[Page]:
+    """Синхронная загрузка страницы с признаком «не изменилась с последней обработки»."""
+    return _default_fetcher.fetch_page_sync(url, allow_missing=allow_missing)
+
+
+def fetch_many(urls: Iterable[str], allow_missing: bool = False) -> list:
+    """Синхронная обёртка над AsyncFetcher.fetch_many для последовательных скриптов."""
+    return asyncio.run(_default_fetcher.fetch_many(urls, allow_missing=allow_missing))
+
+
+def fetch_pages(urls: Iterable[str], allow_missing: bool = False) -> list:
+    """Синхронная обёртка над AsyncFetcher.fetch_many_pages."""
+    return asyncio.run(_default_fetcher.fetch_many_pages(urls, allow_missing=allow_missing))
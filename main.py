@@ -91,7 +91,8 @@ if __name__ == "__main__":
                     limit = int(input("\nСколько протоколов проверить по самой старой дате last_check_at?: "))
                     update_recent_by_count.find_dif_details_protocol(
                         count_last_protocol=0,
-                        oldest_first_limit=limit
+                        oldest_first_limit=limit,
+                        pipelined=True
                     )
                     break
                 except ValueError:
@@ -0,0 +1,174 @@
+"""
+Дисковый кэш HTML-страниц 5 вёрст.
+
+Для каждой ссылки храним метаданные (ETag, Last-Modified, время загрузки,
+хэш тела и хэш последнего успешно обработанного тела) в meta/<sha256(url)>.json,
+а само тело — в bodies/<sha256(body)>.html, то есть одинаковые страницы
+лежат на диске один раз.
+
+http_fetch по этим метаданным отправляет условный запрос
+(If-None-Match / If-Modified-Since) и на 304 отдаёт тело из кэша.
+Тела, на которые больше не ссылается ни одна мета, удаляет prune().
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+BASE_DIR = Path(__file__).resolve().parent
+CACHE_DIR = Path(os.environ.get("PAGE_CACHE_DIR", BASE_DIR / ".page_cache"))
+
+_lock = threading.Lock()
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    body_hash: str
+    fetched_at: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    processed_hash: Optional[str] = None
+
+
+def body_hash(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def _meta_path(url: str) -> Path:
+    return CACHE_DIR / "meta" / f"{_url_key(url)}.json"
+
+
+def _body_path(digest: str) -> Path:
+    return CACHE_DIR / "bodies" / f"{digest}.html"
+
+
+def _atomic_write(path: Path, data: str):
+    """Пишем во временный файл и подменяем, чтобы параллельные загрузки не читали обрывки."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def get_entry(url: str) -> Optional[CacheEntry]:
+    path = _meta_path(url)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return CacheEntry(**json.load(f))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def get_body(entry: CacheEntry) -> Optional[str]:
+    try:
+        return _body_path(entry.body_hash).read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+
+def conditional_headers(entry: Optional[CacheEntry]) -> dict:
+    """Заголовки условного запроса по сохранённым метаданным."""
+    headers = {}
+    if entry is None:
+        return headers
+    if entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+    return headers
+
+
+def store(url: str, body: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> CacheEntry:
+    """Сохраняет тело и метаданные страницы. Отметка об обработке переносится из старой записи."""
+    digest = body_hash(body)
+    body_path = _body_path(digest)
+    if body_path.exists():
+        # свежий mtime защищает уже лежащее тело от параллельного prune, пока не записана мета
+        try:
+            os.utime(body_path)
+        except OSError:
+            _atomic_write(body_path, body)
+    else:
+        _atomic_write(body_path, body)
+
+    with _lock:
+        previous = get_entry(url)
+        entry = CacheEntry(
+            url=url,
+            body_hash=digest,
+            fetched_at=datetime.now().isoformat(timespec="seconds"),
+            etag=etag,
+            last_modified=last_modified,
+            processed_hash=previous.processed_hash if previous else None,
+        )
+        _atomic_write(_meta_path(url), json.dumps(asdict(entry), ensure_ascii=False))
+    return entry
+
+
+def touch(entry: CacheEntry) -> CacheEntry:
+    """Страница не изменилась (304) — обновляем только время загрузки."""
+    with _lock:
+        entry.fetched_at = datetime.now().isoformat(timespec="seconds")
+        _atomic_write(_meta_path(entry.url), json.dumps(asdict(entry), ensure_ascii=False))
+    return entry
+
+
+def mark_processed(url: str, digest: str):
+    """
+    Фиксирует, что тело с хэшем digest успешно разобрано и сверено с БД.
+    Вызывать только после успешного завершения сверки/записи.
+    """
+    with _lock:
+        entry = get_entry(url)
+        if entry is None:
+            return
+        entry.processed_hash = digest
+        _atomic_write(_meta_path(url), json.dumps(asdict(entry), ensure_ascii=False))
+
+
+def prune(grace_seconds: int = 3600) -> int:
+    """
+    Удаляет тела, на которые не ссылается ни одна мета (страница сменила содержимое).
+    Тела общие для разных ссылок, поэтому удалять старое тело прямо в store нельзя —
+    смотрим сразу на все метаданные. Файлы моложе grace_seconds не трогаем:
+    их мета может ещё записываться параллельной загрузкой.
+    :return: сколько файлов удалено
+    """
+    referenced = set()
+    for meta in (CACHE_DIR / "meta").glob("*.json"):
+        try:
+            with open(meta, encoding="utf-8") as f:
+                referenced.add(json.load(f)["body_hash"])
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+
+    removed = 0
+    cutoff = datetime.now().timestamp() - grace_seconds
+    for body in (CACHE_DIR / "bodies").glob("*.html"):
+        if body.stem in referenced:
+            continue
+        try:
+            if body.stat().st_mtime < cutoff:
+                body.unlink()
+                removed += 1
+        except OSError:
+            continue
+    return removed
@@ -1,34 +1,27 @@
 import pandas as pd
-import requests
 import link_handler
 from bs4 import BeautifulSoup
+from http_fetch import fetch_html, FetchError
+from durations import parse_time_seconds
 
 
-def last_event_parse():
-    """Парсим страницу с последними пробежками всех парков."""
-    url = "https://5verst.ru/results/latest/"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                      "AppleWebKit/537.36 (KHTML, like Gecko) "
-                      "Chrome/127.0.0.1 Safari/537.36",
-        "Accept-Language": "ru,en;q=0.9",
-        "Referer": "https://5verst.ru/",
-    }
-
-    try:
-        # Можно чуть увеличить таймаут, но без фанатизма
-        resp = requests.get(url, headers=headers, timeout=30)
-        resp.raise_for_status()
-    except requests.exceptions.Timeout:
-        print(f"⏱️ Таймаут при обращении к {url}. "
-              f"Сайт не ответил за отведённое время.")
-        return None
-    except requests.exceptions.RequestException as e:
-        # Сюда попадают все сетевые ошибки: ConnectionError, HTTPError и т.п.
-        print(f"❌ Ошибка при обращении к {url}: {e}")
-        return None
+LATEST_URL = "https://5verst.ru/results/latest/"
+
+
+def last_event_parse(html=None):
+    """Парсим страницу с последними пробежками всех парков.
+    html можно передать заранее скачанным (http_fetch.fetch_page)."""
+    url = LATEST_URL
+
+    if html is None:
+        try:
+            html = fetch_html(url)
+        except FetchError as e:
+            # Сюда попадают все сетевые ошибки после исчерпания ретраев
+            print(f"❌ Ошибка при обращении к {url}: {e}")
+            return None
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    soup = BeautifulSoup(html, "html.parser")
 
     table_last_event = soup.find(
         "table",
@@ -125,8 +118,7 @@ def transform_df_last_event(df):
     ]]
 
     for col in ['mean_time', 'best_time_woman', 'best_time_man']:
-        df_copy[col] = df_copy[col].replace('', pd.NA).fillna('00:00:00')
-        df_copy[col] = pd.to_datetime(df_copy[col], format='%H:%M:%S', errors='coerce').dt.time
+        df_copy[col] = parse_time_seconds(df_copy[col].replace('', pd.NA).fillna('00:00:00'))
 
     for col in ['index_event', 'count_runners', 'count_vol']:
         df_copy[col] = pd.to_numeric(df_copy[col], errors='coerce').astype('Int64')
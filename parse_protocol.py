@@ -1,206 +1,145 @@
 import pandas as pd
-import requests, re
-from bs4 import BeautifulSoup
-import time
+import numpy as np
+import re
 import logging
-import cloudscraper
-import random
-from io import StringIO
-
-UA_HDRS = {
-    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                   "AppleWebKit/537.36 (KHTML, like Gecko) "
-                   "Chrome/127.0.0 Safari/537.36"),
-    "Accept-Language": "ru,en;q=0.9",
-    "Referer": "https://5verst.ru/",
-}
+import lxml.html
+from http_fetch import fetch_html
+from durations import parse_time_seconds
+from categories import categorize
 
 logger = logging.getLogger(__name__)
 
-RETRY_HTTP_CODES = {500, 502, 503, 504}
+RUNNER_TABLE_CLASS = 'sortable n-last results-table results-table_with-sticky-head min-w-full leading-normal'
+VOL_TABLE_CLASS = 'sortable n-last results-table min-w-full leading-normal'
+HEADER_DIV_CLASS = 'page-header page-results-header'
 
-scraper = cloudscraper.create_scraper(
-    browser={
-        "browser": "chrome",
-        "platform": "windows",
-        "mobile": False
-    }
-)
+RUNNER_COLUMNS = ['position', 'Участник', 'Возрастной рейтинг', 'finish_time', 'name_runner', 'link_runner']
+VOL_COLUMNS = ['Участник', 'vol_role', 'name_runner', 'link_runner']
 
-def _sleep_with_jitter(base_sleep: float, jitter_factor: float = 0.1):
+
+def _class_is(element, class_name):
+    """Точное совпадение атрибута class (как у BeautifulSoup с многоклассовой строкой)"""
+    return ' '.join(element.get('class', '').split()) == class_name
+
+def _table_columns(table, columns):
     """
-    Пауза с мягким джиттером.
-    base_sleep – базовая задержка в секундах
-    jitter_factor – доля разброса (0.1 = ±10%)
+    Разбираем таблицу протокола сразу в столбцы: {колонка: список значений}.
+    В каждой строке — тексты ячеек td, а если есть ссылка, то ещё её текст и href.
     """
-    low = 1.0 - jitter_factor
-    high = 1.0 + jitter_factor
-    k = random.uniform(low, high)
-    sleep_for = base_sleep * k
-    logger.info(
-        f"Задержка перед повтором: {sleep_for:.1f} сек "
-        f"(база {base_sleep:.1f}, джиттер {k:.2f})"
-    )
-    time.sleep(sleep_for)
-
-
-def _fetch_html(
-    url: str,
-    retries: int = 6,
-    timeout: int = 50,
-    backoff_factor: int = 2,
-):
-    last_exc = None
-
-    for attempt in range(1, retries + 1):
-        try:
-            logger.info(
-                f"Запрос к {url}, попытка {attempt}/{retries}, timeout={timeout}s"
-            )
-            r = scraper.get(url, timeout=timeout)
-            r.raise_for_status()
-            return r.text
-
-        except requests.exceptions.ReadTimeout as e:
-            # сеть тупит → повторяем
-            last_exc = e
-            if attempt == retries:
-                logger.error(f"Таймаут на {url} после {retries} попыток.")
-                break
-
-            base_sleep = timeout * (backoff_factor ** (attempt - 1))
-            logger.warning(
-                f"Таймаут при запросе {url}: {e}. "
-                f"Базовая задержка перед повтором {base_sleep} сек..."
-            )
-            _sleep_with_jitter(base_sleep)
-            # и идём на следующую попытку
-
-        except requests.exceptions.ConnectionError as e:
-            # обрыв соединения → повторяем
-            last_exc = e
-            if attempt == retries:
-                logger.error(f"Ошибка соединения на {url} после {retries} попыток.")
-                break
-
-            base_sleep = timeout * (backoff_factor ** (attempt - 1))
-            logger.warning(
-                f"Ошибка соединения {url}: {e}. "
-                f"Базовая задержка перед повтором {base_sleep} сек..."
-            )
-            _sleep_with_jitter(base_sleep)
-
-        except requests.exceptions.HTTPError as e:
-            status = e.response.status_code
-            last_exc = e
-
-            if status in RETRY_HTTP_CODES:
-                # временные проблемы у сервера → пробуем ещё
-                if attempt == retries:
-                    logger.error(f"HTTP {status} на {url} после {retries} попыток.")
-                    break
-
-                base_sleep = timeout * (backoff_factor ** (attempt - 1))
-                logger.warning(
-                    f"HTTP {status} при запросе {url}. "
-                    f"Базовая задержка перед повтором {base_sleep} сек..."
-                )
-                _sleep_with_jitter(base_sleep)
-                continue
-
-            # остальные HTTP ошибки не лечатся ретраями
-            logger.exception(f"HTTP ошибка при запросе {url}: {e}")
-            break
-
-        except Exception as e:
-            last_exc = e
-            logger.exception(f"Неожиданная ошибка при запросе {url}: {e}")
-            break
-
-    raise RuntimeError(f"Не удалось получить HTML: {last_exc}")
-
-def _is_valid_protocol_page(soup) -> bool:
+    data = {col: [] for col in columns}
+    if table is None:
+        return data
+
+    for row in table.iter('tr'):
+        cells = [td.text_content().strip() for td in row.iter('td')]
+        if not cells:
+            continue
+        find_link = row.find('.//a')
+        if find_link is not None:
+            cells += [find_link.text_content(), find_link.get('href')]
+        if len(cells) > len(columns):
+            raise ValueError(f"Неожиданное число колонок в таблице протокола: {len(cells)} > {len(columns)}")
+        cells += [None] * (len(columns) - len(cells))
+        for col, value in zip(columns, cells):
+            data[col].append(value)
+
+    return data
+
+def scan_protocol_page(html):
     """
-    Проверяем, что страница действительно похожа на страницу протокола:
-    - есть div.page-header.page-results-header
-    - внутри есть h1 с текстом 'Протокол 5 вёрст'
+    Один проход по дереву страницы протокола: находим заголовок,
+    таблицу бегунов и таблицу волонтёров.
+    Возвращает (текст h1 или None, столбцы бегунов или None, столбцы волонтёров или None).
     """
-    header_div = soup.find('div', class_='page-header page-results-header')
-    if not header_div:
-        return False
-
-    h1 = header_div.find('h1')
-    if not h1:
-        return False
-
-    text = h1.get_text(' ', strip=True)
-    if 'Протокол 5 вёрст' not in text:
-        return False
-
-    return True
-
-def identification_park_date(link, soup):
+    try:
+        root = lxml.html.document_fromstring(html)
+    except ValueError:
+        # строка с объявлением кодировки — отдаём lxml байты
+        root = lxml.html.document_fromstring(html.encode('utf-8'))
+
+    header_text = None
+    runner_table = None
+    vol_table = None
+
+    for element in root.iter('div', 'table'):
+        if element.tag == 'div':
+            if header_text is None and _class_is(element, HEADER_DIV_CLASS):
+                h1 = element.find('.//h1')
+                if h1 is not None:
+                    header_text = ' '.join(t.strip() for t in h1.itertext() if t.strip())
+                else:
+                    header_text = ''
+        elif runner_table is None and _class_is(element, RUNNER_TABLE_CLASS):
+            runner_table = element
+        elif vol_table is None and _class_is(element, VOL_TABLE_CLASS):
+            vol_table = element
+
+    runner_columns = _table_columns(runner_table, RUNNER_COLUMNS) if runner_table is not None else None
+    vol_columns = _table_columns(vol_table, VOL_COLUMNS) if vol_table is not None else None
+
+    return header_text, runner_columns, vol_columns
+
+def identification_park_date(link, header_text):
     """Определяем название парка и дату пробежки"""
     # дата забега из ссылки вида .../results/29.11.2025/
     date_event = link.split('/')[5]
 
-    header_div = soup.find('div', class_='page-header page-results-header')
-    if not header_div:
+    if header_text is None:
         raise ValueError(f"Не найден блок заголовка протокола на странице {link}")
 
-    h1 = header_div.find('h1')
-    if not h1:
+    if not header_text:
         raise ValueError(f"Не найден заголовок h1 протокола на странице {link}")
 
-    text = h1.get_text(' ', strip=True)
-
-    if 'Протокол 5 вёрст' not in text:
+    if 'Протокол 5 вёрст' not in header_text:
         raise ValueError(
-            f"Неожиданный текст заголовка протокола на {link}: {text!r}"
+            f"Неожиданный текст заголовка протокола на {link}: {header_text!r}"
         )
 
     # text примерно: "Протокол 5 вёрст <парка> (<город>) за 29.11.2025"
-    middle = text.split('Протокол 5 вёрст', 1)[1]
+    middle = header_text.split('Протокол 5 вёрст', 1)[1]
     name_point = middle.split('(')[0].strip()
 
     return date_event, name_point
 
-def slice_before_parenthesis(value):
-    '''Отделяем возрастную группу от мусора'''
-    if isinstance(value, str):  # Проверка, является ли значение строкой
-        # Используем регулярное выражение для удаления пробела перед "("
-        return re.split(r'\s*\(', value)[0].strip()  # Убираем пробелы в начале и конце
-    return value  # Возвращаем None или другое значение без изменений
+AGE_TAIL_RE = re.compile(r'\s*\(.*', re.DOTALL)
 
-def extract_user_id(link):
-    '''Достаем id участника из ссылки'''
-    try:
-        return link.split('userstats/')[1]
-    except:  # IndexError:
-        return None
 
-def check_status_runner(new_df_run):
-    '''Дополняем df столбцом о статусе участника'''
+def slice_age_category(series):
+    '''Отделяем возрастную группу от мусора в скобках (весь столбец сразу)'''
+    return series.str.replace(AGE_TAIL_RE, '', regex=True).str.strip()
 
-    def determine_status(row):
-        if row['name_runner'] == 'НЕИЗВЕСТНЫЙ':
-            return 'unknown_runner'
-        elif pd.isna(row['user_id']):
-            return 'unregistered_runner'
-        else:
-            return 'active_runner'
+def extract_user_ids(series):
+    '''Достаем id участника из столбца ссылок (None, если ссылка не на userstats)'''
+    user_ids = series.str.split('userstats/', n=2, regex=False).str[1]
+    return user_ids.astype(series.dtype).where(user_ids.notna(), None)
 
-    new_df_run['status_runner'] = new_df_run.apply(determine_status, axis=1)
+def check_status_runner(new_df_run):
+    '''Дополняем df столбцом о статусе участника'''
+    new_df_run['status_runner'] = np.select(
+        [new_df_run['name_runner'] == 'НЕИЗВЕСТНЫЙ', new_df_run['user_id'].isna()],
+        ['unknown_runner', 'unregistered_runner'],
+        default='active_runner'
+    )
 
     return new_df_run
 
-def processing_vol(df_vol, date_event, name_point):
+def _with_point_and_date(df, date_event, name_point):
+    '''
+    Проставляем парк и дату. Если date_event/name_point не переданы,
+    берём их из одноимённых столбцов — так можно обработать сразу
+    несколько протоколов одним вызовом (например, в бэкфилле adhocs).
+    '''
+    if date_event is not None:
+        df['date_event'] = date_event
+    df['date_event'] = pd.to_datetime(df['date_event'], format='%d.%m.%Y')
+    if name_point is not None:
+        df['name_point'] = name_point
+    return df
+
+def processing_vol(df_vol, date_event=None, name_point=None):
     '''Формируем финальный формат df волонтёров для БД'''
-    df_vol_copy = df_vol.copy()
-    df_vol_copy['date_event'] = date_event
-    df_vol_copy['date_event'] = pd.to_datetime(df_vol_copy['date_event'], format='%d.%m.%Y')
-    df_vol_copy['name_point'] = name_point
-    df_vol_copy['user_id'] = df_vol_copy['link_runner'].apply(extract_user_id)
+    df_vol_copy = _with_point_and_date(df_vol.copy(), date_event, name_point)
+    df_vol_copy['user_id'] = extract_user_ids(df_vol_copy['link_runner'])
     df_vol_copy = df_vol_copy.drop(columns=['Участник'])
 
     new_column_order = ['name_point',
@@ -211,46 +150,20 @@ def processing_vol(df_vol, date_event, name_point):
                         'vol_role']
     df_vol_copy = df_vol_copy.reindex(columns=new_column_order)
 
-    return df_vol_copy
+    return categorize(df_vol_copy)
 
-def parse_vol(soup):
-    """Парсинг волонтеров, возврат DataFrame"""
-    table_vol = soup.find(
-        'table',
-        {'class': 'sortable n-last results-table min-w-full leading-normal'}
-    )
-    if not table_vol:
-        return pd.DataFrame()
-
-    rows = table_vol.find_all('tr')
-    data = []
-    for row in rows:
-        cols = row.find_all('td')
-        if not cols:
-            continue
-        cols = [col.text.strip() for col in cols]
-        find_link = row.find('a')
-        if find_link:
-            name_runner, link_runner = find_link.text, find_link.get('href')
-            cols += [name_runner, link_runner]
-        data.append(cols)
-
-    columns = ['Участник', 'vol_role', 'name_runner', 'link_runner']
-    return pd.DataFrame(data, columns=columns)
-
-def processing_run(df_run_link, date_event, name_point):
-    '''Формируем финальный формат df пробежки для БД'''
+def processing_run(df_run_link, date_event=None, name_point=None):
+    '''Формируем финальный формат df пробежки для БД (векторно, без построчных apply)'''
     df_run_copy = df_run_link.copy()
     # Вычленение возрастной группы из мусорной строки и удаление ненужного столбца
-    df_run_copy['age_category'] = df_run_copy['Возрастной рейтинг'].apply(slice_before_parenthesis)
+    df_run_copy['age_category'] = slice_age_category(df_run_copy['Возрастной рейтинг'])
     df_run_copy.drop(columns=['Возрастной рейтинг'], inplace=True)
 
     # Добавление даты события и наименования точки
-    df_run_copy['date_event'] = pd.to_datetime(date_event, format='%d.%m.%Y')
-    df_run_copy['name_point'] = name_point
+    df_run_copy = _with_point_and_date(df_run_copy, date_event, name_point)
 
     # Извлечение user_id из ссылки
-    df_run_copy['user_id'] = df_run_copy['link_runner'].apply(extract_user_id)
+    df_run_copy['user_id'] = extract_user_ids(df_run_copy['link_runner'])
 
     # Заполнение пустых полей в случае неизвестного участника
     mask = df_run_copy['Участник'] == 'НЕИЗВЕСТНЫЙ'
@@ -265,60 +178,36 @@ def processing_run(df_run_link, date_event, name_point):
         'position', 'finish_time', 'age_category', 'status_runner'
     ])
 
-    df_run_copy['finish_time'] = df_run_copy['finish_time'].replace('', pd.NA).fillna('00:00:00')
-    df_run_copy['finish_time'] = pd.to_datetime(df_run_copy['finish_time'], format='%H:%M:%S', errors='coerce').dt.time
+    finish_time = df_run_copy['finish_time'].replace('', pd.NA).fillna('00:00:00')
+    df_run_copy['finish_time'] = parse_time_seconds(finish_time)
 
     df_run_copy['position'] = pd.to_numeric(df_run_copy['position'], errors='coerce').astype('Int64')
 
-    return df_run_copy
-
-def parse_runner(soup):
-    """Парсинг таблицы с бегунами и возврат сырого DataFrame"""
-    table_runner = soup.find(
-        'table',
-        {'class': 'sortable n-last results-table results-table_with-sticky-head min-w-full leading-normal'}
-    )
-    if not table_runner:
-        return pd.DataFrame()  # защита
-
-    rows = table_runner.find_all('tr')
-    data = []
-    for row in rows:
-        cols = row.find_all('td')
-        if not cols:
-            continue
-        cols = [col.text.strip() for col in cols]
-        find_link = row.find('a')
-        if find_link:
-            name_runner, link_runner = find_link.text, find_link.get('href')
-            cols += [name_runner, link_runner]
-        data.append(cols)
+    # парк, возрастная группа и статус повторяются на каждой строке — храним кодами общего словаря
+    return categorize(df_run_copy)
 
-    columns = ['position', 'Участник', 'Возрастной рейтинг', 'finish_time', 'name_runner', 'link_runner']
-    return pd.DataFrame(data, columns=columns)
+def parse_protocol(link, html=None):
+    """Возвращает сырые 2 DF со страницы с протоколом и дату с именем локации.
+    Если html уже скачан (например, пачкой через http_fetch.fetch_many), повторно не качаем.
+    Страница разбирается за один проход lxml; если таблицы волонтёров нет, вместо df_vol — False."""
+    if html is None:
+        html = fetch_html(link)
 
-def parse_protocol(link):
-    """Возвращает сырые 2 DF со страницы с протоколом и дату с именем локации"""
-    html = _fetch_html(link)
-    soup = BeautifulSoup(html, 'lxml')
+    header_text, runner_columns, vol_columns = scan_protocol_page(html)
 
-    # таблицы можно при желании оставить через read_html, если нужно что-то общее
-    parse_site = pd.read_html(StringIO(html), flavor="lxml")
+    date_event, name_point = identification_park_date(link, header_text)
 
-    date_event, name_point = identification_park_date(link, soup)
+    if runner_columns is None:
+        raise ValueError(f"Не найдена таблица бегунов на странице протокола {link}")
 
-    if len(parse_site) == 1:
-        df_run = parse_runner(soup)
-        df_vol = False
-    else:
-        df_run = parse_runner(soup)
-        df_vol = parse_vol(soup)
+    df_run = pd.DataFrame(runner_columns, columns=RUNNER_COLUMNS)
+    df_vol = pd.DataFrame(vol_columns, columns=VOL_COLUMNS) if vol_columns is not None else False
 
     return df_run, df_vol, date_event, name_point
 
-def main_parse(link):
+def main_parse(link, html=None):
     '''Главная функция, которая собирает по частям итоговый протокол'''
-    df_run_link, df_vol_link, date_event, name_point = parse_protocol(link)
+    df_run_link, df_vol_link, date_event, name_point = parse_protocol(link, html)
     final_df_run = processing_run(df_run_link, date_event, name_point)
     if isinstance(df_vol_link, pd.DataFrame):  # Проверяем тип данных в таблице с волонтёрами
         final_df_vol = processing_vol(df_vol_link, date_event, name_point)
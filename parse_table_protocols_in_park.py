@@ -1,54 +1,13 @@
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
-import time
-from typing import Optional
+from http_fetch import fetch_html
+from durations import parse_time_seconds
 
-UA_HDRS = {
-    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                   "AppleWebKit/537.36 (KHTML, like Gecko) "
-                   "Chrome/127.0.0 Safari/537.36"),
-    "Accept-Language": "ru,en;q=0.9",
-    "Referer": "https://5verst.ru/",
-}
-
-def _fetch_html(url: str, tries: int = 3, pause: float = 2.0) -> Optional[str]:
-    # 1) обычный requests
-    for i in range(tries):
-        try:
-            r = requests.get(url, headers=UA_HDRS, timeout=20, allow_redirects=True)
-            if r.status_code == 200:
-                if not r.encoding or r.encoding.lower() == "iso-8859-1":
-                    r.encoding = r.apparent_encoding
-                return r.text
-            # 404 — страницы нет, ретраи/обходы не помогут
-            if r.status_code == 404:
-                return None
-            # 403/429 — защита/лимиты: подождать и попробовать снова
-            if r.status_code in (403, 429):
-                time.sleep(pause * (i + 1))
-                continue
-            # (по желанию) 5xx можно тоже ретраить, но пока оставим как "ошибка"
-            r.raise_for_status()
-        except Exception:
-            time.sleep(pause * (i + 1))
-    # 2) fallback: cloudscraper
-    try:
-        import cloudscraper
-        scraper = cloudscraper.create_scraper()
-        r = scraper.get(url, timeout=30)
-        if r.status_code == 200:
-            return r.text
-        if r.status_code == 404:
-            return None
-        raise RuntimeError(f"cloudscraper status={r.status_code}")
-    except Exception as e:
-        raise RuntimeError(f"Не удалось получить HTML: {e}")
-
-def list_protocols_in_park(link):
-    """Парсим страницу с последними пробежками по парку"""
-    # Получаем HTML с нужными заголовками (или через cloudscraper, если нужно)
-    html = _fetch_html(link)
+def list_protocols_in_park(link, html=None):
+    """Парсим страницу с последними пробежками по парку.
+    html можно передать заранее скачанным (пачкой через http_fetch.fetch_many)."""
+    if html is None:
+        html = fetch_html(link, allow_missing=True)
 
     if html is None:
         # 404 Not Found — пропускаем, чтобы не валить полный прогон
@@ -129,8 +88,7 @@ def transform_df_list_protocol(list_protocol):
     df_copy['index_event'] = df_copy['index_event'].replace('', 0).astype(int)
     df_copy['date_event'] = pd.to_datetime(df_copy['date_event'], format='%d.%m.%Y', errors='coerce')
     for col in ['mean_time', 'best_time_woman', 'best_time_man']:
-        df_copy[col] = df_copy[col].replace('', pd.NA).fillna('00:00:00')
-        df_copy[col] = pd.to_datetime(df_copy[col], format='%H:%M:%S', errors='coerce').dt.time
+        df_copy[col] = parse_time_seconds(df_copy[col].replace('', pd.NA).fillna('00:00:00'))
 
     for col in ['index_event', 'count_runners', 'count_vol']:
         df_copy[col] = pd.to_numeric(df_copy[col], errors='coerce').astype('Int64')
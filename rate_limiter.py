@@ -0,0 +1,225 @@
+"""
+Адаптивный ограничитель частоты запросов (token bucket + AIMD).
+
+Один ограничитель на хост (или на «единицу работы» скрипта, например
+s95.ru/details_protocol). Токены пополняются со скоростью rate запросов/сек,
+ёмкость корзины — burst. Скорость подстраивается по ответам сайта:
+- быстрый успешный ответ → rate растёт на постоянный шаг (additive increase);
+- 403/429, таймаут, признаки бана → rate делится (multiplicative decrease),
+  при необходимости ещё и включается cooldown — пауза для всех запросов.
+
+Скорость ограничена снизу и сверху через max_interval / min_interval
+(min_interval — жёсткий предел вежливости, быстрее него не ходим).
+
+Состояние (скорость, токены, cooldown) хранится в общей SQLite-базе
+RATE_LIMIT_DIR/limits.sqlite3 и меняется только внутри транзакции
+BEGIN IMMEDIATE. Поэтому все процессы на машине, работающие с одним
+именем ограничителя, делят один бюджет и один cooldown, а следующий запуск
+стартует с достигнутого темпа, а не с худшего случая.
+"""
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+RATE_LIMIT_DIR = Path(os.environ.get("RATE_LIMIT_DIR", BASE_DIR / ".rate_limits"))
+STATE_DB = RATE_LIMIT_DIR / "limits.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS limits (
+    name TEXT PRIMARY KEY,
+    rate REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    cooldown_until REAL NOT NULL DEFAULT 0
+)
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    RATE_LIMIT_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(STATE_DB, timeout=60, isolation_level=None)
+    conn.execute(_SCHEMA)
+    return conn
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket с AIMD-подстройкой скорости.
+
+    :param name: имя ограничителя (хост или хост/задача), по нему хранится состояние
+    :param interval: стартовый интервал между запросами, если сохранённого состояния нет
+    :param min_interval: самый короткий допустимый интервал (потолок скорости)
+    :param max_interval: самый длинный интервал после серии банов (пол скорости)
+    :param burst: сколько запросов можно сделать подряд без ожидания
+    :param increase_steps: за сколько быстрых успехов скорость проходит путь от пола до потолка
+    :param decrease_factor: во сколько раз режется скорость при сигнале перегрузки
+    :param slow_latency: ответ дольше этого (сек) считается «медленным» — скорость не растёт
+    :param jitter_factor: разброс паузы, чтобы запросы не шли по метроному
+    :param persist: хранить состояние в общей SQLite-базе (между запусками и процессами);
+                    при False состояние живёт только в памяти процесса
+    """
+
+    def __init__(
+        self,
+        name: str,
+        interval: float,
+        min_interval: float,
+        max_interval: float,
+        burst: int = 1,
+        increase_steps: int = 20,
+        decrease_factor: float = 0.5,
+        slow_latency: float = 10.0,
+        jitter_factor: float = 0.1,
+        persist: bool = True,
+    ):
+        self.name = name
+        self.start_rate = 1.0 / interval
+        self.min_rate = 1.0 / max_interval
+        self.max_rate = 1.0 / min_interval
+        self.burst = burst
+        self.increase = (self.max_rate - self.min_rate) / max(increase_steps, 1)
+        self.decrease_factor = decrease_factor
+        self.slow_latency = slow_latency
+        self.jitter_factor = jitter_factor
+        self.persist = persist
+
+        self._lock = threading.Lock()
+        self._memory_state = None
+        self.rate = self._clamp(self.start_rate)
+        with self._state():
+            pass
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.rate
+
+    def _clamp(self, rate: float) -> float:
+        return min(max(rate, self.min_rate), self.max_rate)
+
+    def _initial_state(self) -> dict:
+        return {"rate": self.start_rate, "tokens": 1.0, "updated_at": time.time(), "cooldown_until": 0.0}
+
+    @contextmanager
+    def _state(self):
+        """
+        Состояние ограничителя для чтения-изменения-записи.
+        В режиме persist — строка SQLite под BEGIN IMMEDIATE (эксклюзивно между процессами).
+        """
+        with self._lock:
+            if not self.persist:
+                if self._memory_state is None:
+                    self._memory_state = self._initial_state()
+                state = self._memory_state
+                state["rate"] = self._clamp(state["rate"])
+                yield state
+                self.rate = state["rate"]
+                return
+
+            conn = _connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT rate, tokens, updated_at, cooldown_until FROM limits WHERE name = ?",
+                    (self.name,),
+                ).fetchone()
+                if row is None:
+                    state = self._initial_state()
+                else:
+                    state = dict(zip(("rate", "tokens", "updated_at", "cooldown_until"), row))
+                state["rate"] = self._clamp(state["rate"])
+
+                yield state
+
+                conn.execute(
+                    """
+                    INSERT INTO limits (name, rate, tokens, updated_at, cooldown_until)
+                    VALUES (:name, :rate, :tokens, :updated_at, :cooldown_until)
+                    ON CONFLICT(name) DO UPDATE SET
+                        rate = excluded.rate,
+                        tokens = excluded.tokens,
+                        updated_at = excluded.updated_at,
+                        cooldown_until = excluded.cooldown_until
+                    """,
+                    {"name": self.name, **state},
+                )
+                conn.execute("COMMIT")
+                self.rate = state["rate"]
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+    def _refill(self, state: dict, now: float):
+        elapsed = max(now - state["updated_at"], 0.0)
+        state["tokens"] = min(self.burst, state["tokens"] + elapsed * state["rate"])
+        state["updated_at"] = now
+
+    def acquire(self) -> float:
+        """
+        Берём токен на один запрос; если корзина пуста или действует cooldown — ждём.
+        Токен резервируется сразу, поэтому параллельные потоки и процессы
+        встают в очередь, а не просыпаются одновременно.
+        :return: сколько секунд прождали
+        """
+        with self._state() as state:
+            now = time.time()
+            self._refill(state, now)
+            state["tokens"] -= 1.0
+            token_wait = -state["tokens"] / state["rate"] if state["tokens"] < 0 else 0.0
+            cooldown_wait = max(state["cooldown_until"] - now, 0.0)
+
+        wait = max(token_wait, cooldown_wait)
+        if wait > 0:
+            wait *= random.uniform(1.0, 1.0 + self.jitter_factor)
+            time.sleep(wait)
+        return wait
+
+    def on_success(self, latency: float = 0.0):
+        """Успешный ответ: если он быстрый — чуть ускоряемся."""
+        if latency >= self.slow_latency:
+            return
+        with self._state() as state:
+            state["rate"] = self._clamp(state["rate"] + self.increase)
+
+    def on_throttle(self, reason: str = "", cooldown: float = 0.0):
+        """
+        403/429, таймаут или признаки бана: скорость делим, накопленные токены сгорают.
+        Если передан cooldown (сек) — все процессы с этим ограничителем ждут его окончания.
+        """
+        with self._state() as state:
+            now = time.time()
+            self._refill(state, now)
+            state["rate"] = self._clamp(state["rate"] * self.decrease_factor)
+            state["tokens"] = min(state["tokens"], 0.0)
+            if cooldown:
+                state["cooldown_until"] = max(state["cooldown_until"], now + cooldown)
+        logger.warning(f"{self.name}: замедляемся до 1 запроса в {self.interval:.1f}s ({reason})")
+
+    def cooldown_remaining(self) -> float:
+        """Сколько секунд осталось до конца общего cooldown (0, если его нет)."""
+        with self._state() as state:
+            return max(state["cooldown_until"] - time.time(), 0.0)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str, **kwargs) -> AdaptiveRateLimiter:
+    """Общий ограничитель на имя внутри процесса (параметры берутся при первом создании)."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(name, **kwargs)
+            _limiters[name] = limiter
+        return limiter
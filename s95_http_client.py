@@ -5,6 +5,8 @@ from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from rate_limiter import get_limiter
+
 
 class S95HttpError(Exception):
     pass
@@ -28,14 +30,30 @@ class S95HttpClient:
         max_delay=5.0,
         cooldown_seconds=1800,
         max_retries=2,
+        max_interval=300.0,
+        limiter_name="s95.ru",
     ):
+        """
+        Паузу между запросами задаёт адаптивный ограничитель (rate_limiter):
+        стартует с max_delay, на быстрых успешных ответах ускоряется до min_delay,
+        на 403/429/таймаутах/подозрительном HTML замедляется вплоть до max_interval.
+        Темп и cooldown хранятся в общей SQLite-базе ограничителя, поэтому
+        все s95-скрипты на машине (users, details, summary) делят один бюджет:
+        бан, пойманный одним процессом, ставит на паузу и остальные.
+        """
         self.connect_timeout = connect_timeout
         self.read_timeout = read_timeout
         self.min_delay = min_delay
         self.max_delay = max_delay
         self.cooldown_seconds = cooldown_seconds
         self.max_retries = max_retries
-        self.cooldown_until = 0
+        self.limiter = get_limiter(
+            limiter_name,
+            interval=max_delay,
+            min_interval=min_delay,
+            max_interval=max_interval,
+            slow_latency=read_timeout / 2,
+        )
 
         self.base_headers = base_headers or {
             "User-Agent": (
@@ -84,20 +102,24 @@ class S95HttpClient:
         print(f"[{ts}] {message}", flush=True)
 
     def _sleep_between_requests(self, reason="между запросами"):
-        sec = random.uniform(self.min_delay, self.max_delay)
-        self.log(f"Сон {sec:.1f}s ({reason})")
-        time.sleep(sec)
+        sec = self.limiter.acquire()
+        if sec > 0:
+            self.log(f"Сон {sec:.1f}s ({reason}), темп: 1 запрос в {self.limiter.interval:.1f}s")
+
+    @property
+    def cooldown_until(self) -> float:
+        """Окончание общего (межпроцессного) cooldown, unix time."""
+        return time.time() + self.limiter.cooldown_remaining()
 
     def _wait_cooldown_if_needed(self):
-        now = time.time()
-        if now < self.cooldown_until:
-            sleep_for = int(self.cooldown_until - now)
-            self.log(f"Cooldown активен, ждём {sleep_for}s")
+        sleep_for = self.limiter.cooldown_remaining()
+        if sleep_for > 0:
+            self.log(f"Cooldown активен, ждём {int(sleep_for)}s")
             time.sleep(sleep_for)
 
     def _set_cooldown(self, seconds=None, reason="ban-like signal"):
         seconds = seconds or self.cooldown_seconds
-        self.cooldown_until = max(self.cooldown_until, time.time() + seconds)
+        self.limiter.on_throttle(reason, cooldown=seconds)
         self.log(f"Установлен cooldown {seconds}s ({reason})")
 
     def _looks_like_ban_page(self, response: requests.Response) -> bool:
@@ -132,10 +154,12 @@ class S95HttpClient:
 
         for attempt in range(1, self.max_retries + 1):
             try:
+                started = time.monotonic()
                 response = self.session.get(
                     url,
                     timeout=(self.connect_timeout, self.read_timeout),
                 )
+                latency = time.monotonic() - started
 
                 if response.status_code in (403, 429):
                     self._set_cooldown(reason=f"http {response.status_code}")
@@ -147,6 +171,8 @@ class S95HttpClient:
                     self._set_cooldown(reason="suspicious html")
                     raise S95BanDetected(f"Suspicious HTML for {url}")
 
+                self.limiter.on_success(latency)
+
                 if sleep_after:
                     self._sleep_between_requests("после успешного запроса")
 
@@ -157,6 +183,7 @@ class S95HttpClient:
 
             except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError) as e:
                 last_error = e
+                self.limiter.on_throttle(type(e).__name__)
                 self.log(f"Сетевая ошибка attempt={attempt}/{self.max_retries} для {url}: {e}")
                 if attempt < self.max_retries:
                     time.sleep(random.uniform(5, 15))
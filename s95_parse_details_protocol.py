@@ -5,7 +5,10 @@ import configparser
 import pandas as pd
 from tqdm import tqdm
 from urllib.parse import urlparse, urljoin
-from sqlalchemy import create_engine
+from DB_handler import copy_df, db_connect
+from durations import parse_time_seconds
+from s95_runner_queue import enqueue_runners, ensure_runner_queue
+from rate_limiter import get_limiter
 from sqlalchemy.exc import SQLAlchemyError
 from pathlib import Path
 from s95_http_client import S95HttpClient, S95BanDetected, S95TemporaryError, S95HttpError
@@ -145,9 +148,7 @@ def parse_protocol(page, name_point, date_event, client):
     # Приведение типов
     df_runner['position'] = pd.to_numeric(df_runner.get('position'), errors='coerce').astype('Int64')
     for col in ['finish_time', 'pace']:
-        df_runner[col] = df_runner[col].replace('', pd.NA)
-        df_runner[col] = pd.to_datetime(df_runner[col], format='%H:%M:%S', errors='coerce')
-        df_runner[col] = df_runner[col].dt.time
+        df_runner[col] = parse_time_seconds(df_runner[col], allow_short=True)
 
     df_runner['user_id'] = df_runner['user_id'].astype('string')
     df_vol['user_id'] = df_vol['user_id'].astype('string')
@@ -158,10 +159,6 @@ def log(msg: str):
     ts = time.strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{ts}] {msg}", flush=True)
 
-def sleep_range(a: float, b: float, reason: str):
-    sec = random.uniform(a, b)
-    log(f"Сон {sec:.0f}s ({reason})")
-    time.sleep(sec)
 # =========================
 # Основной скрипт
 # =========================
@@ -180,13 +177,12 @@ if __name__ == "__main__":
     db_name = config['five_verst_stats']['dbname']
 
     credential = f'postgresql://{db_user}:{db_pass}@{db_host}/{db_name}'
-    engine = create_engine(
-        credential,
-        pool_pre_ping=True,  # проверяет соединение перед использованием
-        pool_recycle=900,  # раз в 15 минут пересоздает соединения
-        pool_size=5,
-        max_overflow=10,
-    )
+    engine = db_connect(credential)
+
+    # очередь нужна enqueue_runners в транзакции вставки протокола — создаём её до цикла,
+    # не дожидаясь первого запуска s95_parse_users
+    if ensure_runner_queue(engine):
+        print("Создана очередь s95_runner_queue и наполнена из загруженных протоколов.")
 
     client = S95HttpClient(
         connect_timeout=10,
@@ -226,8 +222,18 @@ if __name__ == "__main__":
     events = pd.read_sql(query, engine)
 
     # ====== SLOW MODE (как ты хочешь) ======
-    MIN_SLEEP_BETWEEN_EVENTS = 120  # минимум 2 минуты между событиями
-    MAX_SLEEP_BETWEEN_EVENTS = 300  # максимум 5 минут между событиями
+    # Темп между событиями адаптивный: стартуем с 2 минут (или с темпа прошлого запуска),
+    # на успехах ускоряемся до MIN_INTERVAL_BETWEEN_EVENTS, на банах замедляемся до MAX_INTERVAL_BETWEEN_EVENTS
+    START_INTERVAL_BETWEEN_EVENTS = 120
+    MIN_INTERVAL_BETWEEN_EVENTS = 30
+    MAX_INTERVAL_BETWEEN_EVENTS = 600
+    event_limiter = get_limiter(
+        "s95.ru/details_protocol",
+        interval=START_INTERVAL_BETWEEN_EVENTS,
+        min_interval=MIN_INTERVAL_BETWEEN_EVENTS,
+        max_interval=MAX_INTERVAL_BETWEEN_EVENTS,
+        jitter_factor=0.5,
+    )
 
     SESSION_RESET_MIN = 8
     SESSION_RESET_MAX = 15
@@ -245,6 +251,10 @@ if __name__ == "__main__":
     for i, row in tqdm(events.iterrows(), total=len(events), desc="Обработка протоколов"):
         success = False
 
+        waited = event_limiter.acquire()
+        if waited > 0:
+            log(f"Сон {waited:.0f}s (темп между событиями: 1 в {event_limiter.interval:.0f}s)")
+
         try:
             df_runner, df_vol = parse_protocol(
                 row['link_event'],
@@ -254,16 +264,17 @@ if __name__ == "__main__":
             )
 
             with engine.begin() as conn:
-                if not df_runner.empty:
-                    df_runner.to_sql('s95_details_protocol', conn, if_exists='append', index=False)
-                if not df_vol.empty:
-                    df_vol.to_sql('s95_details_vol', conn, if_exists='append', index=False)
+                copy_df(conn, 's95_details_protocol', df_runner)
+                copy_df(conn, 's95_details_vol', df_vol)
+                # новые участники сразу попадают в очередь s95_parse_users
+                enqueue_runners(conn, df_runner, df_vol)
 
-            sleep_range(MIN_SLEEP_BETWEEN_EVENTS, MAX_SLEEP_BETWEEN_EVENTS, "после успеха")
+            event_limiter.on_success()
             success = True
 
         except S95BanDetected as e:
             ban_strikes += 1
+            event_limiter.on_throttle("ban")
             log(f"BAN #{ban_strikes}: {e}")
             if ban_strikes >= BAN_STRIKES_LIMIT:
                 log("Достигнут лимит банов — завершаю скрипт.")
@@ -272,31 +283,25 @@ if __name__ == "__main__":
 
         except S95TemporaryError as e:
             log(f"Временная сетевая ошибка для {row['link_event']}: {e}")
+            event_limiter.on_throttle("network")
             time.sleep(TEMP_ERROR_SLEEP)
 
         except S95HttpError as e:
             log(f"HTTP ошибка для {row['link_event']}: {e}")
 
         except SQLAlchemyError as e:
-            print(f"DB ошибка для {row['link_event']}: {e}. Пересоздаю engine и жду 60s.")
+            print(f"DB ошибка для {row['link_event']}: {e}. Сбрасываю пул соединений и жду 60s.")
             try:
                 engine.dispose()
             except Exception:
                 pass
-            engine = create_engine(
-                credential,
-                pool_pre_ping=True,
-                pool_recycle=900,
-                pool_size=5,
-                max_overflow=10,
-            )
+            engine = db_connect(credential)
             time.sleep(60)
 
         except Exception as e:
             print(f"Неожиданная ошибка {row['link_event']}: {e}")
 
         if not success:
-            sleep_range(MIN_SLEEP_BETWEEN_EVENTS, MAX_SLEEP_BETWEEN_EVENTS, "после неуспеха")
             log(f"Пропускаем протокол после неуспешной обработки: {row['link_event']}")
             continue
 
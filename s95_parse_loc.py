@@ -316,10 +316,12 @@ def get_locations_missing_deep(engine, limit=0):
         ORDER BY name_point
     """
 
+    params = {}
     if limit and limit > 0:
-        query += f" LIMIT {limit}"
+        query += " LIMIT :limit"
+        params["limit"] = int(limit)
 
-    return pd.read_sql(query, engine)
+    return pd.read_sql(text(query), engine, params=params)
 # --------------------- Основной запуск ---------------------
 
 if __name__ == "__main__":
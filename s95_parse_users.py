@@ -3,16 +3,20 @@ import time
 import random
 import argparse
 import configparser
-from typing import Optional, Dict, Any
+from typing import Optional
 
-import pandas as pd
 from tqdm import tqdm
 from bs4 import BeautifulSoup
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from DB_handler import db_connect
 from sqlalchemy.exc import SQLAlchemyError
 from pathlib import Path
 
 from s95_http_client import S95HttpClient, S95BanDetected, S95TemporaryError, S95HttpError
+from s95_runner_queue import (
+    ensure_runner_queue, rebuild_runner_queue, pending_count,
+    lease_runners, complete_runner, release_runners, fail_runner, worker_name
+)
 from telegram_notifier import send_telegram_notification, escape_markdown
 
 
@@ -64,24 +68,24 @@ def safe_tg_send(message: str):
         log(f"Не удалось отправить уведомление в Telegram: {e}")
 
 
-def get_available_count(engine) -> int:
-    query = """
-        WITH combined_ids AS (
-            SELECT user_id::text AS s95_id
-            FROM s95_details_protocol
-            WHERE user_id IS NOT NULL
-            UNION
-            SELECT user_id::text AS s95_id
-            FROM s95_details_vol
-            WHERE user_id IS NOT NULL
-        )
-        SELECT COUNT(*) AS cnt
-        FROM combined_ids c
-        LEFT JOIN s95_runners r ON r.s95_id = c.s95_id
-        WHERE r.s95_id IS NULL
+def return_to_queue(engine, s95_id: str, owner: str, item_failed: bool = False):
+    """
+    Возвращает участника в очередь после неуспеха:
+    - item_failed=True — ошибка самого участника: попытка засчитывается, повтор откладывается;
+    - иначе (бан, сетевая/DB ошибка) — аренда снимается без штрафа.
     """
-    df = pd.read_sql(query, engine)
-    return int(df.iloc[0]["cnt"])
+    try:
+        if item_failed:
+            fail_runner(engine, s95_id, owner)
+        else:
+            release_runners(engine, [s95_id], owner)
+    except Exception as e:
+        log(f"Не удалось вернуть {s95_id} в очередь (аренда истечёт сама): {e}")
+
+
+def get_available_count(engine) -> int:
+    """Сколько участников ждёт обработки в очереди s95_runner_queue."""
+    return pending_count(engine)
 
 
 def resolve_limit(available_count: int, cli_limit: Optional[int]) -> int:
@@ -108,36 +112,6 @@ def resolve_limit(available_count: int, cli_limit: Optional[int]) -> int:
 
     return min(requested, available_count)
 
-def get_random_runner(engine) -> Optional[Dict[str, Any]]:
-    """
-    Каждый раз берём одного случайного участника, которого ещё нет в s95_runners.
-    Это снижает шанс пересечения при параллельном запуске на сервере и локально.
-    """
-    query = """
-        WITH combined_ids AS (
-            SELECT user_id::text AS s95_id
-            FROM s95_details_protocol
-            WHERE user_id IS NOT NULL
-            UNION
-            SELECT user_id::text AS s95_id
-            FROM s95_details_vol
-            WHERE user_id IS NOT NULL
-        )
-        SELECT
-            c.s95_id,
-            'https://s95.ru/athletes/' || c.s95_id AS link_s95_runner
-        FROM combined_ids c
-        LEFT JOIN s95_runners r ON r.s95_id = c.s95_id
-        WHERE r.s95_id IS NULL
-        ORDER BY random()
-        LIMIT 1
-    """
-    df = pd.read_sql(query, engine)
-    if df.empty:
-        return None
-    return df.iloc[0].to_dict()
-
-
 def insert_runner(conn, s95_id: str, link_s95_runner: str, s95_barcode: Optional[str], planning: Optional[str]) -> bool:
     """
     Вставка участника с защитой от гонки.
@@ -235,6 +209,11 @@ if __name__ == "__main__":
         default=None,
         help="Сколько записей обработать. 0 = все доступные."
     )
+    parser.add_argument(
+        "--rebuild-queue",
+        action="store_true",
+        help="Досеять очередь s95_runner_queue полным сканом протоколов."
+    )
     args = parser.parse_args()
 
     CURRENT_DIR = Path(__file__).resolve().parent
@@ -250,13 +229,7 @@ if __name__ == "__main__":
     db_name = config['five_verst_stats']['dbname']
 
     credential = f'postgresql://{db_user}:{db_pass}@{db_host}/{db_name}'
-    engine = create_engine(
-        credential,
-        pool_pre_ping=True,
-        pool_recycle=900,
-        pool_size=5,
-        max_overflow=10,
-    )
+    engine = db_connect(credential)
 
     client = S95HttpClient(
         connect_timeout=10,
@@ -272,6 +245,11 @@ if __name__ == "__main__":
     started_at = time.time()
     started_at_text = time.strftime("%Y-%m-%d %H:%M:%S")
 
+    if ensure_runner_queue(engine):
+        print("Создана очередь s95_runner_queue и наполнена из загруженных протоколов.")
+    elif args.rebuild_queue:
+        print(f"Досеяно в очередь: {rebuild_runner_queue(engine)}")
+
     total_available = get_available_count(engine)
     print(f"Доступно новых участников для парсинга: {total_available}")
 
@@ -301,6 +279,13 @@ if __name__ == "__main__":
     ban_strikes = 0
     TEMP_ERROR_SLEEP = 150
 
+    # Участников берём из очереди пачками в аренду (FOR UPDATE SKIP LOCKED)
+    LEASE_BATCH = 10
+    LEASE_SECONDS = 2 * 60 * 60
+    owner = worker_name()
+    leased = []
+    current_id = None  # участник в работе: вне leased, но ещё не завершён и не возвращён в очередь
+
     attempt_count = 0
     success_count = 0
     already_inserted_count = 0
@@ -314,14 +299,23 @@ if __name__ == "__main__":
 
     try:
         while attempt_count < selected_count:
-            row = get_random_runner(engine)
+            if not leased:
+                leased = lease_runners(
+                    engine,
+                    min(LEASE_BATCH, selected_count - attempt_count),
+                    owner,
+                    LEASE_SECONDS
+                )
 
-            if row is None:
+            if not leased:
                 log("Доступных участников для обработки больше не осталось.")
                 break
 
+            row = leased.pop(0)
+
             success = False
             s95_id = row['s95_id']
+            current_id = s95_id
             link_s95_runner = row['link_s95_runner']
 
             log(f"Выбран участник: {s95_id} | {link_s95_runner}")
@@ -341,6 +335,8 @@ if __name__ == "__main__":
                         s95_barcode=s95_barcode,
                         planning=planning
                     )
+                    complete_runner(conn, s95_id)
+                current_id = None
 
                 if inserted:
                     success = True
@@ -362,6 +358,10 @@ if __name__ == "__main__":
 
                 log(f"BAN #{ban_strikes} для {link_s95_runner}: {e}")
 
+                # бан — не вина участника: возвращаем без штрафа
+                return_to_queue(engine, s95_id, owner)
+                current_id = None
+
                 if ban_strikes >= BAN_STRIKES_LIMIT:
                     log("Достигнут лимит банов — завершаю скрипт.")
 
@@ -381,6 +381,9 @@ if __name__ == "__main__":
 
                 log(f"Временная сетевая ошибка для {link_s95_runner}: {e}")
 
+                return_to_queue(engine, s95_id, owner)
+                current_id = None
+
                 time.sleep(TEMP_ERROR_SLEEP)
 
                 if not is_last_iteration:
@@ -393,6 +396,9 @@ if __name__ == "__main__":
 
                 log(f"HTTP ошибка для {link_s95_runner}: {e}")
 
+                return_to_queue(engine, s95_id, owner, item_failed=True)
+                current_id = None
+
                 if not is_last_iteration:
                     sleep_range(MIN_SLEEP_BETWEEN_USERS, MAX_SLEEP_BETWEEN_USERS, "после неуспеха")
 
@@ -401,7 +407,7 @@ if __name__ == "__main__":
 
                 db_error_count += 1
 
-                log(f"DB ошибка для {link_s95_runner}: {e}. Пересоздаю engine и жду 60s.")
+                log(f"DB ошибка для {link_s95_runner}: {e}. Сбрасываю пул соединений и жду 60s.")
 
                 try:
 
@@ -411,22 +417,13 @@ if __name__ == "__main__":
 
                     pass
 
-                engine = create_engine(
-
-                    credential,
-
-                    pool_pre_ping=True,
-
-                    pool_recycle=900,
-
-                    pool_size=5,
-
-                    max_overflow=10,
-
-                )
+                engine = db_connect(credential)
 
                 time.sleep(60)
 
+                return_to_queue(engine, s95_id, owner)
+                current_id = None
+
                 if not is_last_iteration:
                     sleep_range(MIN_SLEEP_BETWEEN_USERS, MAX_SLEEP_BETWEEN_USERS, "после DB ошибки")
 
@@ -437,6 +434,9 @@ if __name__ == "__main__":
 
                 log(f"Неожиданная ошибка для {link_s95_runner}: {e}")
 
+                return_to_queue(engine, s95_id, owner, item_failed=True)
+                current_id = None
+
                 if not is_last_iteration:
                     sleep_range(MIN_SLEEP_BETWEEN_USERS, MAX_SLEEP_BETWEEN_USERS, "после неуспеха")
 
@@ -467,6 +467,15 @@ if __name__ == "__main__":
         raise
     finally:
         progress_bar.close()
+        # невыполненные аренды (и участника, на котором остановились) возвращаем в очередь,
+        # чтобы их сразу могли взять другие
+        unfinished = [item['s95_id'] for item in leased]
+        if current_id is not None:
+            unfinished.append(current_id)
+        try:
+            release_runners(engine, unfinished, owner)
+        except Exception as e:
+            log(f"Не удалось вернуть аренды в очередь: {e}")
 
     elapsed_seconds = time.time() - started_at
 
@@ -0,0 +1,179 @@
+"""
+Очередь участников s95 на обогащение (s95_runners).
+
+Вместо полного UNION по s95_details_protocol / s95_details_vol с анти-join
+к s95_runners на каждого участника храним готовую очередь s95_runner_queue:
+- пополняется при вставке протоколов (enqueue_runners в той же транзакции);
+- воркеры берут пачку через FOR UPDATE SKIP LOCKED и ставят аренду (leased_until),
+  поэтому параллельные запуски (сервер + ноутбук) не пересекаются;
+- после записи в s95_runners строка удаляется из очереди (complete_runner);
+- если воркер упал, аренда истекает и участник снова доступен;
+- при бане или сетевой/DB ошибке аренда снимается без штрафа (release_runners),
+  попытки (attempts) считаются только за ошибки самого участника (fail_runner),
+  после MAX_ATTEMPTS таких ошибок участник больше не выдаётся.
+"""
+import os
+import socket
+from typing import Iterable, List, Dict, Any
+
+import pandas as pd
+from sqlalchemy import text
+
+QUEUE_TABLE = "s95_runner_queue"
+LINK_PREFIX = "https://s95.ru/athletes/"
+MAX_ATTEMPTS = 5
+FAIL_BACKOFF_SECONDS = 6 * 60 * 60  # повтор после ошибки участника: 6 ч, 12 ч, 18 ч, ...
+
+_CREATE_QUEUE = f"""
+    CREATE TABLE IF NOT EXISTS {QUEUE_TABLE} (
+        s95_id text PRIMARY KEY,
+        link_s95_runner text NOT NULL,
+        enqueued_at timestamptz NOT NULL DEFAULT now(),
+        leased_until timestamptz,
+        lease_owner text,
+        attempts integer NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS {QUEUE_TABLE}_pending_idx
+        ON {QUEUE_TABLE} (enqueued_at, s95_id);
+"""
+
+_SEED_QUEUE = f"""
+    INSERT INTO {QUEUE_TABLE} (s95_id, link_s95_runner)
+    SELECT c.s95_id, '{LINK_PREFIX}' || c.s95_id
+    FROM (
+        SELECT user_id::text AS s95_id
+        FROM s95_details_protocol
+        WHERE user_id IS NOT NULL
+        UNION
+        SELECT user_id::text AS s95_id
+        FROM s95_details_vol
+        WHERE user_id IS NOT NULL
+    ) c
+    WHERE NOT EXISTS (SELECT 1 FROM s95_runners r WHERE r.s95_id = c.s95_id)
+    ON CONFLICT (s95_id) DO NOTHING
+"""
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def ensure_runner_queue(engine) -> bool:
+    """
+    Создаёт таблицу очереди, если её ещё нет, и один раз наполняет её
+    из уже загруженных протоколов.
+    :return: True, если очередь была создана сейчас
+    """
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": QUEUE_TABLE}).scalar()
+        if exists:
+            return False
+        conn.execute(text(_CREATE_QUEUE))
+        conn.execute(text(_SEED_QUEUE))
+    return True
+
+
+def rebuild_runner_queue(engine) -> int:
+    """Досеивает очередь полным сканом протоколов (ручное восстановление). Возвращает число добавленных."""
+    with engine.begin() as conn:
+        conn.execute(text(_CREATE_QUEUE))
+        return conn.execute(text(_SEED_QUEUE)).rowcount
+
+
+def enqueue_runners(conn, *frames: pd.DataFrame) -> int:
+    """
+    Добавляет в очередь участников (столбец user_id) из только что вставленных
+    протоколов — тех, кого ещё нет в s95_runners. Вызывать в транзакции вставки протокола.
+    """
+    user_ids = [uid for df in frames if df is not None and 'user_id' in df for uid in df['user_id']]
+    ids = pd.Series(user_ids, dtype="object").dropna().astype(str)
+    ids = ids[ids != ""].unique().tolist()
+    if not ids:
+        return 0
+
+    query = text(f"""
+        INSERT INTO {QUEUE_TABLE} (s95_id, link_s95_runner)
+        SELECT k.s95_id, '{LINK_PREFIX}' || k.s95_id
+        FROM unnest(CAST(:ids AS text[])) AS k(s95_id)
+        WHERE NOT EXISTS (SELECT 1 FROM s95_runners r WHERE r.s95_id = k.s95_id)
+        ON CONFLICT (s95_id) DO NOTHING
+    """)
+    return conn.execute(query, {"ids": ids}).rowcount
+
+
+def pending_count(engine) -> int:
+    """Сколько участников ждут обработки (без исчерпавших попытки)."""
+    query = text(f"SELECT COUNT(*) FROM {QUEUE_TABLE} WHERE attempts < :max_attempts")
+    with engine.connect() as conn:
+        return int(conn.execute(query, {"max_attempts": MAX_ATTEMPTS}).scalar())
+
+
+def lease_runners(engine, limit: int, owner: str, lease_seconds: int = 7200) -> List[Dict[str, Any]]:
+    """
+    Берёт в аренду до limit участников. Заблокированные другими воркерами строки
+    пропускаются (SKIP LOCKED), просроченные аренды забираются повторно.
+    Сама аренда попытку не засчитывает (см. fail_runner).
+    """
+    query = text(f"""
+        WITH picked AS (
+            SELECT s95_id
+            FROM {QUEUE_TABLE}
+            WHERE (leased_until IS NULL OR leased_until < now())
+              AND attempts < :max_attempts
+            ORDER BY enqueued_at, s95_id
+            LIMIT :limit
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE {QUEUE_TABLE} q
+        SET leased_until = now() + make_interval(secs => :lease_seconds),
+            lease_owner = :owner
+        FROM picked
+        WHERE q.s95_id = picked.s95_id
+        RETURNING q.s95_id, q.link_s95_runner
+    """)
+    with engine.begin() as conn:
+        rows = conn.execute(query, {
+            "limit": limit,
+            "owner": owner,
+            "lease_seconds": lease_seconds,
+            "max_attempts": MAX_ATTEMPTS,
+        }).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def complete_runner(conn, s95_id: str):
+    """Участник записан в s95_runners — убираем из очереди (в той же транзакции)."""
+    conn.execute(text(f"DELETE FROM {QUEUE_TABLE} WHERE s95_id = :s95_id"), {"s95_id": s95_id})
+
+
+def release_runners(engine, s95_ids: Iterable[str], owner: str):
+    """
+    Возвращает аренды в очередь сразу, не дожидаясь истечения: невыполненные при остановке,
+    а также после бана или сетевой/DB ошибки — не по вине участника, попытка не засчитывается.
+    """
+    ids = list(s95_ids)
+    if not ids:
+        return
+    query = text(f"""
+        UPDATE {QUEUE_TABLE}
+        SET leased_until = NULL, lease_owner = NULL
+        WHERE s95_id = ANY(CAST(:ids AS text[])) AND lease_owner = :owner
+    """)
+    with engine.begin() as conn:
+        conn.execute(query, {"ids": ids, "owner": owner})
+
+
+def fail_runner(engine, s95_id: str, owner: str, backoff_seconds: int = FAIL_BACKOFF_SECONDS):
+    """
+    Ошибка самого участника (HTTP-ошибка его страницы, не разобралась страница):
+    засчитываем попытку и откладываем повтор, с каждой попыткой дальше.
+    """
+    query = text(f"""
+        UPDATE {QUEUE_TABLE}
+        SET attempts = attempts + 1,
+            lease_owner = NULL,
+            leased_until = now() + make_interval(secs => :backoff_seconds * (attempts + 1))
+        WHERE s95_id = :s95_id AND lease_owner = :owner
+    """)
+    with engine.begin() as conn:
+        conn.execute(query, {"s95_id": s95_id, "owner": owner, "backoff_seconds": backoff_seconds})
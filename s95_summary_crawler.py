@@ -0,0 +1,377 @@
+"""
+Сбор сводных протоколов s95 (s95_list_all_events) по страницам локаций.
+
+Модуль импортируется без побочных эффектов: подключение к БД, HTTP-клиент
+и ограничитель создаются внутри run(). Прогон идёт конвейером:
+- фоновый поток по очереди качает страницы локаций (темп задаёт ограничитель
+  s95.ru/summary_protocol и общий бюджет S95HttpClient);
+- главный поток разбирает HTML, векторно раскладывает first_man / first_woman
+  на имя и время (durations.split_name_time) и копит кадры;
+- каждые batch_size локаций пишутся одной транзакцией: новые строки через
+  INSERT ... ON CONFLICT DO NOTHING, у локаций отмечается last_summary_checked_at.
+
+Прогресс хранится в самой БД: локации, проверенные за последние fresh_hours часов,
+пропускаются, поэтому прерванный прогон при повторном запуске продолжается
+с того места, где остановился.
+
+Запуск:
+    python s95_summary_crawler.py --limit 10
+    python s95_summary_crawler.py --location "Парк Горького" --location "Сокольники"
+"""
+import argparse
+import configparser
+import queue
+import random
+import threading
+import time
+import traceback
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pandas as pd
+from bs4 import BeautifulSoup
+from sqlalchemy import text
+
+from DB_handler import insert_new_rows, db_connect
+from durations import split_name_time
+from rate_limiter import get_limiter
+from s95_http_client import S95HttpClient, S95BanDetected, S95TemporaryError, S95HttpError
+
+CONFIG_PATH = Path(__file__).resolve().parent.parent / "5_verst.ini"
+
+EVENTS_TABLE = 's95_list_all_events'
+EVENTS_KEY = ['name_point', 'date_event']
+
+# Темп между локациями адаптивный: стартуем с 90 секунд (или с темпа прошлого запуска),
+# на успехах ускоряемся до MIN_INTERVAL_BETWEEN_LOCATIONS, на банах замедляемся до MAX_INTERVAL_BETWEEN_LOCATIONS
+START_INTERVAL_BETWEEN_LOCATIONS = 90
+MIN_INTERVAL_BETWEEN_LOCATIONS = 30
+MAX_INTERVAL_BETWEEN_LOCATIONS = 600
+
+SESSION_RESET_MIN = 4
+SESSION_RESET_MAX = 8
+
+# Словарь для переименования колонок, учитываем разные языки
+RENAME_COLUMNS = {
+    '#': 'index_event',
+    'Дата': 'date_event', 'Datum': 'date_event',
+    'Участники': 'count_runners', 'Sportisti': 'count_runners',
+    'Волонтёры': 'count_vol', 'Volonteri': 'count_vol',
+    'Первый': 'first_man', 'Prvi čovek': 'first_man',
+    'Первая': 'first_woman', 'Prva žena': 'first_woman',
+}
+
+def log(msg: str):
+    ts = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{ts}] {msg}", flush=True)
+
+
+def get_credential(config_path=CONFIG_PATH):
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    db_host = config['five_verst_stats']['host']
+    db_user = config['five_verst_stats']['username']
+    db_pass = config['five_verst_stats']['password']
+    db_name = config['five_verst_stats']['dbname']
+
+    return f'postgresql://{db_user}:{db_pass}@{db_host}/{db_name}'
+
+
+def make_client():
+    return S95HttpClient(
+        connect_timeout=10,
+        read_timeout=45,
+        min_delay=18.0,
+        max_delay=37.5,
+        cooldown_seconds=1200,
+        max_retries=2,
+    )
+
+
+def make_location_limiter():
+    return get_limiter(
+        "s95.ru/summary_protocol",
+        interval=START_INTERVAL_BETWEEN_LOCATIONS,
+        min_interval=MIN_INTERVAL_BETWEEN_LOCATIONS,
+        max_interval=MAX_INTERVAL_BETWEEN_LOCATIONS,
+        jitter_factor=0.5,
+    )
+
+
+def parse_location_page(page, html):
+    """Разбирает страницу локации и приводит данные к нужным типам"""
+    parsed = urlparse(page)
+    base_url = f"{parsed.scheme}://{parsed.netloc}"
+    soup = BeautifulSoup(html, "html.parser")
+
+    table_all_events = soup.find('div', {'class': 'row row-cols-1'})
+    if table_all_events is None:
+        raise ValueError(f"Не найден блок с таблицей событий: {page}")
+    rows = table_all_events.find_all('tr')
+
+    columns = [col.text.strip() for col in rows[0].find_all(['td', 'th'])]
+    columns.append('link_event')
+
+    data = []
+    for row in rows[1:]:
+        cols = [col.text.strip() for col in row.find_all('td')]
+
+        date_cell = row.find('td', class_='date')
+        if date_cell and date_cell.find('a'):
+            cols.append(base_url + date_cell.find('a')['href'])
+        else:
+            cols.append(None)
+        data.append(cols)
+
+    df = pd.DataFrame(data, columns=columns)
+    df = df.rename(columns={k: v for k, v in RENAME_COLUMNS.items() if k in df.columns})
+
+    for col, time_col in (('first_man', 'best_time_man'), ('first_woman', 'best_time_woman')):
+        source = df[col] if col in df.columns else pd.Series(pd.NA, index=df.index, dtype='string')
+        df[col], seconds = split_name_time(source)
+        # победитель без времени (или без победителя) хранится как 00:00:00
+        df[time_col] = seconds.fillna(0)
+
+    for col in ['index_event', 'count_runners', 'count_vol']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+
+    if 'date_event' in df.columns:
+        df['date_event'] = pd.to_datetime(df['date_event'], format='%d.%m.%Y', errors='coerce')
+
+    df['link_event'] = df['link_event'].astype('string')
+
+    return df
+
+
+def list_protocol_location(page, client):
+    """Скачивает и разбирает страницу локации"""
+    html = client.get_text(page, allow_ban_html_check=True, sleep_before=True)
+    return parse_location_page(page, html)
+
+
+def get_locations(engine, limit=0, locations=None, fresh_hours=12):
+    """
+    Локации к проверке: сначала никогда не проверявшиеся, затем самые давние.
+    Проверенные за последние fresh_hours часов пропускаются (продолжение прерванного прогона).
+
+    :param limit: сколько локаций взять, 0 — все
+    :param locations: список name_point, если нужно проверить только их
+    :param fresh_hours: None — не пропускать недавно проверенные
+    """
+    conditions = ["link_point IS NOT NULL", "is_pause IS NOT true"]
+    params = {}
+    if locations:
+        conditions.append("name_point = ANY(CAST(:locations AS text[]))")
+        params["locations"] = list(locations)
+    if fresh_hours is not None:
+        conditions.append(
+            "(last_summary_checked_at IS NULL "
+            "OR last_summary_checked_at < NOW() - CAST(:fresh_hours AS float) * interval '1 hour')"
+        )
+        params["fresh_hours"] = fresh_hours
+
+    query = f"""
+        SELECT name_point, link_point, last_summary_checked_at
+        FROM s95_location
+        WHERE {' AND '.join(conditions)}
+        ORDER BY last_summary_checked_at NULLS FIRST, name_point
+    """
+    if limit:
+        query += " LIMIT :limit"
+        params["limit"] = int(limit)
+
+    with engine.connect() as conn:
+        return pd.read_sql(text(query), conn, params=params)
+
+
+def save_summary_batch(conn, frames, link_points):
+    """
+    В одной транзакции:
+    1. добавляет только новые строки в s95_list_all_events
+       (INSERT ... ON CONFLICT (name_point, date_event) DO NOTHING — ключи таблицы целиком не читаем)
+    2. обновляет last_summary_checked_at у всех локаций пачки, даже если новых записей нет
+    Возвращает количество добавленных строк.
+    """
+    added_rows = 0
+    frames = [df for df in frames if not df.empty]
+    if frames:
+        df_events = pd.concat(frames, ignore_index=True).drop_duplicates(subset=EVENTS_KEY)
+        added_rows = insert_new_rows(conn, EVENTS_TABLE, df_events, EVENTS_KEY)
+
+    conn.execute(
+        text("""
+            UPDATE s95_location
+            SET last_summary_checked_at = NOW()
+            WHERE link_point = ANY(CAST(:link_points AS text[]))
+        """),
+        {"link_points": list(link_points)}
+    )
+    return added_rows
+
+
+def iter_location_pages(locations_df, client, limiter, stop, prefetch=2):
+    """
+    Стадия «скачать»: фоновый поток по очереди качает страницы локаций с темпом limiter,
+    главный поток тем временем разбирает и пишет уже скачанные.
+    Впереди разбора лежит не больше prefetch страниц.
+
+    :return: генератор (row, html, error); после бана поток останавливается
+    """
+    pages = queue.Queue(maxsize=prefetch)
+    done = object()
+
+    def fetch_all():
+        processed = 0
+        next_reset_at = random.randint(SESSION_RESET_MIN, SESSION_RESET_MAX)
+        try:
+            for row in locations_df.to_dict('records'):
+                if stop.is_set():
+                    break
+
+                waited = limiter.acquire()
+                if waited > 0:
+                    log(f"😴 Пауза {waited:.0f} секунд перед локацией (темп: 1 в {limiter.interval:.0f}s)")
+                if stop.is_set():
+                    break
+
+                try:
+                    html = client.get_text(row['link_point'], allow_ban_html_check=True, sleep_before=True)
+                except Exception as e:
+                    pages.put((row, None, e))
+                    if isinstance(e, S95BanDetected):
+                        break
+                    continue
+
+                pages.put((row, html, None))
+
+                # reset session через случайное число локаций
+                processed += 1
+                if processed >= next_reset_at:
+                    log(f"🔄 Reset session после {processed} локаций")
+                    client.reset_session()
+                    time.sleep(random.uniform(10, 30))
+                    processed = 0
+                    next_reset_at = random.randint(SESSION_RESET_MIN, SESSION_RESET_MAX)
+        finally:
+            pages.put(done)
+
+    fetcher = threading.Thread(target=fetch_all, name="s95-summary-fetch", daemon=True)
+    fetcher.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        # освобождаем место в очереди, чтобы поток мог дописать и завершиться
+        while fetcher.is_alive():
+            try:
+                pages.get(timeout=1)
+            except queue.Empty:
+                pass
+
+
+def run(limit=0, locations=None, fresh_hours=12, batch_size=5, engine=None, client=None):
+    """
+    Проверяет сводные протоколы локаций s95 и добавляет новые забеги.
+
+    :param limit: сколько локаций проверить, 0 — все
+    :param locations: список name_point, если нужно проверить только их
+    :param fresh_hours: пропускать локации, проверенные за последние N часов (None — не пропускать)
+    :param batch_size: сколько локаций писать в БД одной транзакцией
+    :return: dict со счётчиками checked, added, errors и признаком banned
+    """
+    engine = engine or db_connect(get_credential())
+    client = client or make_client()
+    limiter = make_location_limiter()
+
+    locations_df = get_locations(engine, limit=limit, locations=locations, fresh_hours=fresh_hours)
+    log(f"Найдено локаций для обработки: {len(locations_df)}")
+
+    stats = {"checked": 0, "added": 0, "errors": 0, "banned": False}
+    frames = []
+    link_points = []
+
+    def flush():
+        if not link_points:
+            return
+        with engine.begin() as conn:
+            added_rows = save_summary_batch(conn, frames, link_points)
+        log(f"💾 Записана пачка из {len(link_points)} локаций, добавлено новых: {added_rows}")
+        stats["checked"] += len(link_points)
+        stats["added"] += added_rows
+        frames.clear()
+        link_points.clear()
+
+    stop = threading.Event()
+    try:
+        for row, html, error in iter_location_pages(locations_df, client, limiter, stop):
+            name_point = row['name_point']
+            link_point = row['link_point']
+
+            if isinstance(error, S95BanDetected):
+                limiter.on_throttle("ban")
+                stats["banned"] = True
+                log(f"🚫 BAN сигнал при обработке локации: {name_point} ({link_point}): {error}. Останавливаем прогон.")
+                break
+
+            try:
+                if error is not None:
+                    raise error
+                df_events = parse_location_page(link_point, html)
+                df_events['name_point'] = name_point
+            except (S95TemporaryError, S95HttpError) as e:
+                stats["errors"] += 1
+                log(f"⚠️ Ошибка загрузки локации {name_point} ({link_point}): {e}. Пропускаем.")
+                continue
+            except Exception as e:
+                stats["errors"] += 1
+                log(f"💥 Ошибка разбора локации {name_point} ({link_point}): {type(e).__name__}: {e}")
+                traceback.print_exc()
+                continue
+
+            limiter.on_success()
+            log(f"✅ {name_point}: {len(df_events)} событий")
+            frames.append(df_events)
+            link_points.append(link_point)
+            if len(link_points) >= batch_size:
+                flush()
+    finally:
+        stop.set()
+
+    # остаток пачки пишем только на обычном выходе: после ошибки записи буферы не очищены,
+    # и повтор той же пачки из finally подменил бы исходное исключение своим
+    flush()
+
+    log(f"🏁 Проверено локаций: {stats['checked']}, добавлено событий: {stats['added']}, ошибок: {stats['errors']}")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сбор сводных протоколов локаций s95")
+    parser.add_argument("--limit", type=int, default=0, help="Сколько локаций проверить. 0 = все.")
+    parser.add_argument("--location", action="append", dest="locations",
+                        help="name_point локации (можно указать несколько раз)")
+    parser.add_argument("--fresh-hours", type=float, default=12,
+                        help="Пропускать локации, проверенные за последние N часов.")
+    parser.add_argument("--all", action="store_true",
+                        help="Проверять и недавно проверенные локации.")
+    parser.add_argument("--batch-size", type=int, default=5,
+                        help="Сколько локаций записывать в БД одной транзакцией.")
+    args = parser.parse_args(argv)
+
+    stats = run(
+        limit=args.limit,
+        locations=args.locations,
+        fresh_hours=None if args.all else args.fresh_hours,
+        batch_size=args.batch_size,
+    )
+    return 2 if stats["banned"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
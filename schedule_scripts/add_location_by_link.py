@@ -13,7 +13,7 @@ from geopy.distance import geodesic
 import sqlalchemy as sa
 
 import link_handler
-from parse_table_protocols_in_park import _fetch_html
+from http_fetch import fetch_html
 from DB_handler import db_connect, info_table_update, update_view
 
 def load_credential(ini_path: str = "5_verst.ini") -> str:
@@ -250,7 +250,7 @@ def parse_location_data(input_link: str) -> dict:
         raise ValueError("Не удалось распознать ссылку парка (ожидаю https://5verst.ru/<slug>/...).")
 
     # 2) Качаем главную страницу и вытаскиваем name_point
-    html_main = _fetch_html(main_link)
+    html_main = fetch_html(main_link, allow_missing=True)
     if html_main is None:
         raise RuntimeError(f"Не удалось получить главную страницу парка: {main_link}")
 
@@ -260,7 +260,7 @@ def parse_location_data(input_link: str) -> dict:
 
     # 3) Качаем course/ (если страницы нет -> берем главную для координат)
     course_link = link_handler.link_about_event(main_link)
-    html_course = _fetch_html(course_link)  # может вернуть None при 404
+    html_course = fetch_html(course_link, allow_missing=True)  # может вернуть None при 404
     html_for_coords = html_course if html_course else html_main
     url_used = course_link if html_course else main_link
 
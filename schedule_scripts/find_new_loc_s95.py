@@ -4,7 +4,7 @@ from bs4 import BeautifulSoup
 from urllib.parse import urlparse, parse_qs, unquote
 import configparser
 from pathlib import Path
-from sqlalchemy import create_engine
+from DB_handler import append_df, db_connect
 
 # --------------------- База данных ---------------------
 CURRENT_DIR = Path(__file__).resolve().parent
@@ -24,7 +24,7 @@ credential = f'postgresql://{db_user}:{db_pass}@{db_host}/{db_name}'
 def get_existing_links(table_name, db_url):
     """Забирает существующие link_point из БД"""
     try:
-        engine = create_engine(db_url)
+        engine = db_connect(db_url)
         query = f"SELECT link_point FROM {table_name}"
         existing_links = pd.read_sql(query, engine)
         return set(existing_links['link_point'].tolist())
@@ -35,9 +35,9 @@ def get_existing_links(table_name, db_url):
 def save_to_postgresql_append(df, table_name, db_url):
     """Сохраняет DataFrame в PostgreSQL в режиме append"""
     try:
-        engine = create_engine(db_url)
+        engine = db_connect(db_url)
         df_to_save = df[['name_point', 'full_name_point', 'latitude', 'longitude', 'link_point']]
-        df_to_save.to_sql(table_name, engine, if_exists='append', index=False)
+        append_df(engine, table_name, df_to_save)
         print(f"\n[INFO] Данные успешно добавлены в таблицу {table_name}")
     except Exception as e:
         print(f"\n[ERROR] Ошибка при записи в БД: {e}")
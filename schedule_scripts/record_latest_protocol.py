@@ -12,7 +12,19 @@ def record_latest_protocol():
     print(f'{started_at}: Запуск скрипта проверки наличия новых протоколов')
 
     try:
-        new_data, for_find_dif, now_db_last_protocols = udf.check_new_protocols(credential)
+        latest_page = udf.fetch_latest_page()
+        if latest_page.unchanged:
+            print("ℹ️ Страница последних забегов не менялась с прошлой успешной проверки.")
+
+            message = (
+                f"*__⚪ record\\_latest\\_protocol__*\n\n"
+                f"*Время запуска:* {escape_markdown(started_at.strftime('%Y-%m-%d %H:%M:%S'))}\n"
+                f"Страница последних забегов не менялась с прошлой проверки\\."
+            )
+            send_telegram_notification(message)
+            return
+
+        new_data, for_find_dif, now_db_last_protocols = udf.check_new_protocols(credential, latest_page.html)
     except Exception as e:
         print(f"❌ Ошибка в check_new_protocols: {e}")
 
@@ -70,6 +82,10 @@ def record_latest_protocol():
     total_updated = updated_stats["updated"]
     total_errors = updated_stats["errors"]
 
+    # Всё сверено и записано → при следующем запуске неизменённую страницу не разбираем
+    if total_errors == 0:
+        latest_page.mark_processed()
+
     if total_errors > 0:
         status_emoji = "🟠"
     elif total_new > 0 or total_updated > 0:
@@ -1,6 +1,7 @@
-from update_data_functions import get_list_all_protocol, find_dif_list_protocol
+from update_data_functions import get_list_all_protocol, find_dif_list_protocol, mark_pages_processed
 from .update_data_main import func_update_protocols, credential
 from telegram_notifier import send_telegram_notification, escape_markdown
+import page_cache
 from datetime import datetime
 
 def update_protocols():
@@ -9,13 +10,14 @@ def update_protocols():
     print(f'{started_at}: Запуск скрипта полной проверки протоколов')
 
     try:
-        list_site_protocols, now_table = get_list_all_protocol(credential)
+        list_site_protocols, now_table, parsed_pages = get_list_all_protocol(credential)
         different_list_of_protocols = find_dif_list_protocol(list_site_protocols, now_table)
 
         diff_count = len(different_list_of_protocols)
 
         if not different_list_of_protocols.empty:
             stats = func_update_protocols(different_list_of_protocols)
+            mark_pages_processed(parsed_pages, stats["failed_points"])
 
             if stats["errors"] > 0:
                 status_emoji = "🟠"
@@ -54,6 +56,7 @@ def update_protocols():
                 )
         else:
             print('Протоколов для обновления не найдено')
+            mark_pages_processed(parsed_pages)
             message = (
                 f"*__⚪ update\\_all\\_protocols__*\n\n"
                 f"*Время запуска:* {escape_markdown(started_at.strftime('%Y-%m-%d %H:%M:%S'))}\n"
@@ -62,6 +65,7 @@ def update_protocols():
             )
 
         send_telegram_notification(message)
+        print(f'Удалено неиспользуемых тел из кэша страниц: {page_cache.prune()}')
         print('_' * 20)
 
     except Exception as e:
@@ -2,8 +2,6 @@ import configparser
 from update_data_functions import create_list_for_compare
 from update_protocols import refresh_protocol_materialized_views
 from pathlib import Path
-import time
-import random
 
 CURRENT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = CURRENT_DIR.parent
@@ -36,10 +34,9 @@ def func_update_protocols(different_list_of_protocols):
     no_changes = 0
     errors = 0
     updated_protocols = []
+    failed_points = set()
 
-    total = len(different_list_of_protocols)
-
-    for idx, (_, row) in enumerate(different_list_of_protocols.iterrows(), start=1):
+    for _, row in different_list_of_protocols.iterrows():
         try:
             result = compare_and_update_single_protocol(
                 credential,
@@ -57,14 +54,9 @@ def func_update_protocols(different_list_of_protocols):
 
         except Exception as e:
             errors += 1
+            failed_points.add(row["name_point"])
             print(f'Ошибка при обработке {row["name_point"]} / {row["date_event"]}: {e}')
 
-        # Пауза между запросами к сайту, кроме последнего протокола
-        if idx < total:
-            delay = random.uniform(10, 20)
-            print(f'Пауза {delay:.1f} сек перед следующим протоколом...')
-            time.sleep(delay)
-
     if updated > 0:
         print('Обновляем materialized view после пачки изменений...')
         refresh_protocol_materialized_views(credential)
@@ -80,6 +72,7 @@ def func_update_protocols(different_list_of_protocols):
         "errors": errors,
         "total": len(different_list_of_protocols),
         "updated_protocols": updated_protocols,
+        "failed_points": failed_points,
     }
 
 def list_point_update():
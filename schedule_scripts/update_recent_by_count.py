@@ -1,12 +1,66 @@
-import time
-import random
-from update_data_functions import get_link_protocols_for_update, compare_and_update_single_protocol
+from update_data_functions import (
+    get_link_protocols_for_update,
+    compare_and_update_single_protocol,
+    iter_fetched_protocols,
+    compare_and_update_protocols_batch
+)
 from update_protocols import refresh_protocol_materialized_views
+from DB_handler import engine_metrics
 from .update_data_main import credential
 from telegram_notifier import send_telegram_notification, escape_markdown
 from datetime import datetime
 
-def find_dif_details_protocol(count_last_protocol=3, name_point=None, oldest_first_limit=None):
+def run_pipeline(list_protocols, batch_size=20, max_in_flight=8, parse_workers=None):
+    """
+    Конвейерная сверка протоколов: скачивание (в пределах бюджета хоста в http_fetch),
+    разбор в пуле процессов, сравнение с БД и запись пачками по batch_size.
+    Пока главный поток сравнивает и пишет пачку, следующие протоколы уже качаются и разбираются.
+
+    :return: список dict с name_point, date_event, status ("updated" / "no_changes" / "error")
+    """
+    results = []
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        try:
+            results.extend(compare_and_update_protocols_batch(credential, batch))
+        except Exception as e:
+            # ошибка пачки (чтение БД, сравнение) не должна обрывать конвейер:
+            # уже записанные пачки ещё нужно довести до обновления view и отчёта
+            print(f'Ошибка при обработке пачки из {len(batch)} протоколов: {e}')
+            results.extend(
+                {"name_point": row["name_point"], "date_event": row["date_event"], "status": "error"}
+                for row, _, _ in batch
+            )
+        batch.clear()
+
+    rows = list_protocols.to_dict('records')
+    for row, future in iter_fetched_protocols(rows, max_in_flight=max_in_flight, parse_workers=parse_workers):
+        try:
+            page, parsed = future.result()
+        except Exception as e:
+            print(f'Ошибка при обработке протокола {row["name_point"]} / {row["date_event"]}: {e}')
+            results.append({"name_point": row["name_point"], "date_event": row["date_event"], "status": "error"})
+            continue
+
+        batch.append((row, page, parsed))
+        if len(batch) >= batch_size:
+            flush()
+
+    flush()
+    return results
+
+def find_dif_details_protocol(
+    count_last_protocol=3,
+    name_point=None,
+    oldest_first_limit=None,
+    pipelined=False,
+    batch_size=20,
+    max_in_flight=8,
+    parse_workers=None
+):
     """
     Итерационно сверяет детали по протоколам.
     Каждый протокол:
@@ -15,9 +69,17 @@ def find_dif_details_protocol(count_last_protocol=3, name_point=None, oldest_fir
     - сразу при необходимости обновляется
     - после успешного завершения фиксируется last_check_at
 
+    В режиме pipelined=True протоколы идут через конвейер run_pipeline:
+    скачивание, разбор и работа с БД перекрываются, а пауза между запросами
+    к сайту задаётся бюджетом хоста в http_fetch.
+
     :param count_last_protocol: количество последних дат стартов для проверки
     :param name_point: список парков
     :param oldest_first_limit: если задан, выбрать N самых давно не проверявшихся протоколов
+    :param pipelined: конвейерный режим
+    :param batch_size: размер пачки для сравнения и записи в БД (конвейерный режим)
+    :param max_in_flight: сколько протоколов одновременно качается/разбирается (конвейерный режим)
+    :param parse_workers: число процессов для разбора (конвейерный режим)
     """
     if name_point is None:
         name_point = []
@@ -36,42 +98,49 @@ def find_dif_details_protocol(count_last_protocol=3, name_point=None, oldest_fir
     errors = 0
     updated_protocols = []
 
-    total = len(list_protocols)
-
-    for idx, (_, row) in enumerate(list_protocols.iterrows(), start=1):
-        try:
-            result = compare_and_update_single_protocol(
-                credential,
-                row,
-                update_summary_row=False
-            )
-
+    if pipelined:
+        for result in run_pipeline(list_protocols, batch_size, max_in_flight, parse_workers):
             if result["status"] == "updated":
                 updated += 1
                 updated_protocols.append(
-                    f"{row['name_point']} — {row['date_event'].strftime('%Y-%m-%d')}"
+                    f"{result['name_point']} — {result['date_event'].strftime('%Y-%m-%d')}"
                 )
+            elif result["status"] == "error":
+                errors += 1
             else:
                 no_changes += 1
+    else:
+        for _, row in list_protocols.iterrows():
+            try:
+                result = compare_and_update_single_protocol(
+                    credential,
+                    row,
+                    update_summary_row=False
+                )
 
-        except Exception as e:
-            errors += 1
-            print(f'Ошибка при обработке протокола {row["name_point"]} / {row["date_event"]}: {e}')
+                if result["status"] == "updated":
+                    updated += 1
+                    updated_protocols.append(
+                        f"{row['name_point']} — {row['date_event'].strftime('%Y-%m-%d')}"
+                    )
+                else:
+                    no_changes += 1
 
-        # Пауза между запросами к сайту, кроме последнего протокола
-        if idx < total:
-            delay = random.uniform(10, 20)
-            print(f'Пауза {delay:.1f} сек перед следующим протоколом...')
-            time.sleep(delay)
+            except Exception as e:
+                errors += 1
+                print(f'Ошибка при обработке протокола {row["name_point"]} / {row["date_event"]}: {e}')
 
     if updated > 0:
         print('Обновляем materialized view после пачки изменений...')
         refresh_protocol_materialized_views(credential)
+    pool = engine_metrics()
     print(f'''
 Проверка завершена:
 - обновлено протоколов: {updated}
 - без изменений: {no_changes}
 - с ошибками: {errors}
+- подключений к БД: {sum(m["connects"] for m in pool)} (выдач из пула: {sum(m["checkouts"] for m in pool)}, \
+ошибок подключения: {sum(m["connect_errors"] for m in pool)})
 ''')
     if oldest_first_limit is not None:
         mode_text = f"oldest_first_limit={oldest_first_limit}"
@@ -136,7 +205,8 @@ if __name__ == "__main__":
             find_dif_details_protocol(
                 count_last_protocol=count or 0,
                 name_point=parks,
-                oldest_first_limit=oldest_first_limit
+                oldest_first_limit=oldest_first_limit,
+                pipelined=True
             )
         elif count is not None and parks is not None:
             find_dif_details_protocol(count, parks)
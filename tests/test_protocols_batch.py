@@ -0,0 +1,74 @@
+"""Пакетная запись протоколов: откат транзакции и повтор по одному протоколу."""
+import sys
+
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+
+import update_data_functions as udf
+import update_protocols
+
+
+class FakePage:
+    def __init__(self):
+        self.processed = False
+
+    def mark_processed(self):
+        self.processed = True
+
+
+def site_protocol(name_point, date_event):
+    run = pd.DataFrame([{
+        'name_point': name_point, 'date_event': pd.Timestamp(date_event), 'name_runner': 'Иван',
+        'link_runner': None, 'user_id': '1', 'position': 1, 'finish_time': 1200,
+        'age_category': 'М30-34', 'status_runner': None,
+    }], columns=udf.RUN_COLUMNS)
+    return run, None, f'hash-{name_point}'
+
+
+def test_update_data_protocols_releases_connection_on_error(monkeypatch, tmp_path):
+    engine = sa.create_engine(f'sqlite:///{tmp_path / "db.sqlite"}', poolclass=sa.pool.QueuePool)
+    monkeypatch.setattr(update_protocols.db, 'db_connect', lambda credential: engine)
+
+    def failing_delete(session, *args, **kwargs):
+        session.execute(sa.text('SELECT 1'))
+        raise RuntimeError('ошибка удаления')
+
+    monkeypatch.setattr(update_protocols.db, 'delete_by_keys', failing_delete)
+
+    with pytest.raises(RuntimeError):
+        update_protocols.update_data_protocols('sqlite://', None, None, None, None)
+    # транзакция откатана, соединение вернулось в пул, хотя исключение ещё живо
+    assert engine.pool.checkedout() == 0
+
+
+def test_batch_failure_retries_each_protocol(monkeypatch):
+    committed = []
+
+    def fake_update(credential, for_removal_runner, for_removal_vol, to_add_runner, to_add_vol,
+                    different_list_of_protocols=None, checked_protocol=None):
+        # повторы не должны идти внутри обработчика ошибки пакетной записи
+        assert sys.exc_info()[0] is None
+        if len(checked_protocol) > 1:
+            raise RuntimeError('ошибка пакетной записи')
+        committed.append((checked_protocol[0]['name_point'], len(to_add_runner)))
+
+    monkeypatch.setattr(udf.db, 'db_connect', lambda credential: None)
+    monkeypatch.setattr(udf.db, 'mark_protocols_checked', lambda engine, protocols: None)
+    monkeypatch.setattr(udf, 'get_now_protocols', lambda credential, keys: (None, None))
+    monkeypatch.setattr(udf, 'update_data_protocols', fake_update)
+
+    pages = [FakePage(), FakePage()]
+    items = [
+        ({'name_point': name_point, 'date_event': '2025-01-04', 'protocol_hash': None},
+         page, site_protocol(name_point, '2025-01-04'))
+        for name_point, page in zip(['park_a', 'park_b'], pages)
+    ]
+
+    results = udf.compare_and_update_protocols_batch('credential', items)
+
+    assert sorted(committed) == [('park_a', 1), ('park_b', 1)]
+    assert {result['name_point']: result['status'] for result in results} == {
+        'park_a': 'updated', 'park_b': 'updated'
+    }
+    assert all(page.processed for page in pages)
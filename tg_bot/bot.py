@@ -31,7 +31,7 @@ from db import (
     get_s95_by_barcode, is_5v_profile_bound, is_parkrun_profile_bound, is_s95_profile_bound,
     get_last_5v_run, get_last_parkrun_run, get_last_s95_run, get_news_subscribed_tg_ids,
     set_january_notification, get_january_subscribed_tg_ids,
-    get_bot_stats, get_last_started_users,
+    get_bot_stats, get_last_started_users, dispose_engine, get_profile_summary,
 )
 
 # --- Telegram token ---
@@ -54,17 +54,17 @@ if ADMINS_RAW:
 else:
     ADMIN_IDS = []
 
-def get_broadcast_targets() -> list[int]:
+async def get_broadcast_targets() -> list[int]:
     """
     На первой итерации рассылаем только администраторам — для теста.
 
     Когда решишь отправлять всем подписчикам из БД,
     ЗАМЕНИ одну строку внутри функции на:
-        return get_news_subscribed_tg_ids()
+        return await get_news_subscribed_tg_ids()
     и больше ничего трогать не нужно.
     """
     #return ADMIN_IDS
-    return get_news_subscribed_tg_ids()
+    return await get_news_subscribed_tg_ids()
 
 bot = Bot(TOKEN)
 dp = Dispatcher()
@@ -109,21 +109,21 @@ def url_5v_club_dashboard(club: str) -> str:
         f"?var-Club5={encoded}"
     )
 
-def consent_flag(tg_id: int) -> bool:
-    row = get_profile(tg_id)
+async def consent_flag(tg_id: int) -> bool:
+    row = await get_profile(tg_id)
     return bool(row and row.get('consent_accepted'))
 
-def mk_menu(tg_id: int):
+async def mk_menu(tg_id: int):
     # всегда вернёт корректное меню с/без кнопки "📝 Согласие"
-    return main_menu(consent_accepted=consent_flag(tg_id))
+    return main_menu(consent_accepted=await consent_flag(tg_id))
 
 # ===== Helpers =====
 async def must_consent(message: Message) -> bool:
-    row = get_profile(message.from_user.id)
+    row = await get_profile(message.from_user.id)
     if not row or not row.get('consent_accepted'):
         await message.answer(
             "Сначала примите оферту в разделе «⚙️ Настройки» → «Согласие».",
-            reply_markup=mk_menu(message.from_user.id),
+            reply_markup=await mk_menu(message.from_user.id),
             disable_web_page_preview=True
         )
         return False
@@ -145,11 +145,11 @@ async def enforce_change_limit(
     ctx         — Message или CallbackQuery
     text_prefix — текст перед датой «Следующая попытка после ...»
     """
-    can, nt = can_change(field, tg_id)
+    can, nt = await can_change(field, tg_id)
     if can:
         return True
 
-    log_action(tg_id, action_code, False, {"next_time": nt.isoformat()})
+    await log_action(tg_id, action_code, False, {"next_time": nt.isoformat()})
 
     text = (
         f"{text_prefix}\n"
@@ -169,18 +169,18 @@ async def suggest_parkrun_from_s95(cb: CallbackQuery, s95_id: str):
     После успешной привязки С95 пытаемся найти связанный профиль parkrun
     по s95_barcode и предложить привязку.
     """
-    s95_row = get_s95_runner(s95_id) or {}
+    s95_row = await get_s95_runner(s95_id) or {}
     barcode = s95_row.get("s95_barcode")
     if not barcode:
         return
 
-    profile = get_profile(cb.from_user.id) or {}
+    profile = await get_profile(cb.from_user.id) or {}
     if profile.get("parkrun_user_id"):
         # parkrun уже привязан — ничего не предлагаем
         return
 
-    pr_row = get_parkrun_user(barcode)
-    runs_pr = get_parkrun_runs_count(barcode)
+    pr_row = await get_parkrun_user(barcode)
+    runs_pr = await get_parkrun_runs_count(barcode)
     runs_pr_text = pluralize_ru(runs_pr, ("пробежка", "пробежки", "пробежек"))
     url = f"https://www.parkrun.org.uk/parkrunner/{barcode}/all/"
 
@@ -191,7 +191,7 @@ async def suggest_parkrun_from_s95(cb: CallbackQuery, s95_id: str):
     ) if pr_row else f"ID {barcode}"
 
     # Последняя пробежка parkrun
-    last_run = get_last_parkrun_run(barcode)
+    last_run = await get_last_parkrun_run(barcode)
     last_part = ""
     if last_run:
         dt = last_run["date_event"]
@@ -221,11 +221,11 @@ async def suggest_s95_from_parkrun(cb: CallbackQuery, parkrun_id: str):
     После привязки parkrun пытаемся найти связанный профиль С95
     по s95_barcode и предложить привязку.
     """
-    s95_row = get_s95_by_barcode(parkrun_id)
+    s95_row = await get_s95_by_barcode(parkrun_id)
     if not s95_row:
         return
 
-    profile = get_profile(cb.from_user.id) or {}
+    profile = await get_profile(cb.from_user.id) or {}
     if profile.get("s95_user_id"):
         # С95 уже привязан — не трогаем
         return
@@ -234,14 +234,14 @@ async def suggest_s95_from_parkrun(cb: CallbackQuery, parkrun_id: str):
     if not s95_id:
         return
 
-    runs_s95 = get_s95_runs_count(s95_id)
+    runs_s95 = await get_s95_runs_count(s95_id)
     runs_s95_text = pluralize_ru(runs_s95, ("пробежка", "пробежки", "пробежек"))
 
     url = f"https://s95.ru/athletes/{s95_id}"
     name_s95 = s95_row.get("name_runner") or f"ID {s95_id}"
 
     # Последняя пробежка С95
-    last_run = get_last_s95_run(s95_id)
+    last_run = await get_last_s95_run(s95_id)
     last_part = ""
     if last_run:
         dt = last_run["date_event"]
@@ -269,9 +269,9 @@ async def suggest_s95_from_parkrun(cb: CallbackQuery, parkrun_id: str):
 # ===== Handlers =====
 @dp.message(CommandStart())
 async def on_start(message: Message):
-    ensure_user_row(message.from_user.id, message.from_user.username, message.chat.id)
-    mark_first_start(message.from_user.id)
-    row = get_profile(message.from_user.id)
+    await ensure_user_row(message.from_user.id, message.from_user.username, message.chat.id)
+    await mark_first_start(message.from_user.id)
+    row = await get_profile(message.from_user.id)
 
     has_consent = bool(row and row.get("consent_accepted"))
 
@@ -312,7 +312,7 @@ async def on_start(message: Message):
 
     # 3. Согласие есть и хотя бы один профиль привязан — показываем сводную статистику
     else:
-        summary = build_profile_summary(row or {})
+        summary = await build_profile_summary(row or {})
         tail = "\n\n" + summary
 
         # Подсказка о подписке на новости — только если ещё не подписан
@@ -352,7 +352,7 @@ async def admin_stats_cmd(message: Message):
         await message.answer("Эта команда доступна только администратору бота.")
         return
 
-    stats = get_bot_stats()
+    stats = await get_bot_stats()
 
     lines = [
         "<b>Статистика по боту</b>",
@@ -382,7 +382,7 @@ async def admin_stats_cmd(message: Message):
     )
 
     # Отдельным сообщением — последние 5 пользователей
-    last_users = get_last_started_users(5)
+    last_users = await get_last_started_users(5)
     if not last_users:
         return
 
@@ -509,7 +509,7 @@ async def admin_broadcast_cb(cb: CallbackQuery, state: FSMContext):
         await state.clear()
         return
 
-    targets = get_broadcast_targets()
+    targets = await get_broadcast_targets()
     total_targets = len(targets)
 
     sent = 0
@@ -546,7 +546,7 @@ async def admin_broadcast_cb(cb: CallbackQuery, state: FSMContext):
     )
     await cb.answer()
 
-def build_profile_summary(row, show_hint: bool = False) -> str:
+async def build_profile_summary(row, show_hint: bool = False) -> str:
     uid_5v = row.get("user_id_5v") if row else None
     pr_id = row.get("parkrun_user_id") if row else None
     s95_id = row.get("s95_user_id") if row else None
@@ -564,16 +564,19 @@ def build_profile_summary(row, show_hint: bool = False) -> str:
             )
         return text
 
+    # имена, счётчики и клуб по всем привязанным системам — одним запросом
+    summary = await get_profile_summary(uid_5v, pr_id, s95_id)
+
     parts = ["<b>Мой профиль</b>\n"]
 
     # --- 5 вёрст ---
     parts.append("\n<i>5 вёрст:</i>")
     if uid_5v:
         # Имя берём из нашей базы 5 вёрст
-        name_5v = find_latest_name_for_user(uid_5v) or f"ID {uid_5v}"
-        runs_5v = get_5v_runs_count(uid_5v)
+        name_5v = summary.get("name_5v") or f"ID {uid_5v}"
+        runs_5v = summary.get("runs_5v") or 0
         runs_5v_text = pluralize_ru(runs_5v, ("пробежка", "пробежки", "пробежек"))
-        club_5v = get_current_club(uid_5v)
+        club_5v = summary.get("club_5v")
         map_url = url_5v_map(uid_5v)
 
         profile_url_5v = f"https://5verst.ru/userstats/{uid_5v}/"
@@ -608,13 +611,12 @@ def build_profile_summary(row, show_hint: bool = False) -> str:
     # --- parkrun ---
     parts.append("\n\n<i>parkrun:</i>")
     if pr_id:
-        pr_user = get_parkrun_user(pr_id) or {}
         name_pr = (
-            pr_user.get("actual_name_runner")
-            or pr_user.get("name_runner")
+            summary.get("pr_actual_name")
+            or summary.get("pr_name")
             or f"ID {pr_id}"
         )
-        runs_pr = get_parkrun_runs_count(pr_id)
+        runs_pr = summary.get("runs_pr") or 0
         runs_pr_text = pluralize_ru(runs_pr, ("пробежка", "пробежки", "пробежек"))
         pr_url = f"https://www.parkrun.org.uk/parkrunner/{pr_id}/all/"
 
@@ -627,9 +629,8 @@ def build_profile_summary(row, show_hint: bool = False) -> str:
     # --- С95 ---
     parts.append("\n\n<i>С95:</i>")
     if s95_id:
-        s95_row = get_s95_runner(s95_id) or {}
-        name_s95 = s95_row.get("name_runner") or f"ID {s95_id}"
-        runs_s95 = get_s95_runs_count(s95_id)
+        name_s95 = summary.get("name_s95") or f"ID {s95_id}"
+        runs_s95 = summary.get("runs_s95") or 0
         runs_s95_text = pluralize_ru(runs_s95, ("пробежка", "пробежки", "пробежек"))
         s95_url = f"https://s95.ru/athletes/{s95_id}"
 
@@ -650,8 +651,8 @@ def build_profile_summary(row, show_hint: bool = False) -> str:
 @dp.callback_query(F.data == "profile:back")
 async def profile_back(cb: CallbackQuery):
     # Возвращаемся в "Мой профиль" как при нажатии кнопки в меню
-    row = get_profile(cb.from_user.id)
-    text = build_profile_summary(row or {}, show_hint=True)
+    row = await get_profile(cb.from_user.id)
+    text = await build_profile_summary(row or {}, show_hint=True)
 
     await cb.message.answer(
         text,
@@ -667,8 +668,8 @@ async def my_profile(message: Message):
     if not await must_consent(message):
         return
 
-    row = get_profile(message.from_user.id)
-    text = build_profile_summary(row or {}, show_hint=True)
+    row = await get_profile(message.from_user.id)
+    text = await build_profile_summary(row or {}, show_hint=True)
 
     await message.answer(
         text,
@@ -679,8 +680,8 @@ async def my_profile(message: Message):
 
 @dp.message(F.text == "⚙️ Настройки")
 async def settings(message: Message):
-    ensure_user_row(message.from_user.id, message.from_user.username, message.chat.id)
-    row = get_profile(message.from_user.id)
+    await ensure_user_row(message.from_user.id, message.from_user.username, message.chat.id)
+    row = await get_profile(message.from_user.id)
     consent = bool(row and row.get('consent_accepted'))
     news = bool(row and row.get('news_subscribed'))
     january = bool(row and row.get('january_notification'))
@@ -698,13 +699,13 @@ async def settings(message: Message):
 
 @dp.message(F.text == "📝 Согласие")
 async def consent(message: Message):
-    ensure_user_row(message.from_user.id, message.from_user.username, message.chat.id)
-    row = get_profile(message.from_user.id)
+    await ensure_user_row(message.from_user.id, message.from_user.username, message.chat.id)
+    row = await get_profile(message.from_user.id)
 
     if row and row.get('consent_accepted'):
         await message.answer(
             "Согласие уже принято ✅",
-            reply_markup=mk_menu(message.from_user.id),
+            reply_markup=await mk_menu(message.from_user.id),
             disable_web_page_preview=True
         )
         return
@@ -719,17 +720,17 @@ async def consent(message: Message):
 @dp.callback_query(F.data.startswith("consent:"))
 async def consent_cb(cb: CallbackQuery):
     action = cb.data.split(":")[1]
-    row = get_profile(cb.from_user.id) or {}
+    row = await get_profile(cb.from_user.id) or {}
     news = bool(row.get("news_subscribed"))
     january = bool(row.get("january_notification"))
 
 
     # 1. Принятие согласия
     if action == "accept":
-        set_consent(cb.from_user.id, True)
-        log_action(cb.from_user.id, "CONSENT_ACCEPTED", True, {})
+        await set_consent(cb.from_user.id, True)
+        await log_action(cb.from_user.id, "CONSENT_ACCEPTED", True, {})
 
-        row = get_profile(cb.from_user.id) or {}
+        row = await get_profile(cb.from_user.id) or {}
         news = bool(row.get("news_subscribed"))
         january = bool(row.get("january_notification"))
 
@@ -759,8 +760,8 @@ async def consent_cb(cb: CallbackQuery):
 
     # 2. Отклонение согласия
     elif action == "decline":
-        set_consent(cb.from_user.id, False)
-        log_action(cb.from_user.id, "CONSENT_DECLINED", True, {})
+        await set_consent(cb.from_user.id, False)
+        await log_action(cb.from_user.id, "CONSENT_DECLINED", True, {})
 
         await cb.message.answer(
             "Без согласия продолжение невозможно. Вернитесь, когда будете готовы.",
@@ -773,8 +774,8 @@ async def consent_cb(cb: CallbackQuery):
 
     # 3. Отзыв согласия
     elif action == "revoke":
-        set_consent(cb.from_user.id, False)
-        log_action(cb.from_user.id, "CONSENT_REVOKED", True, {})
+        await set_consent(cb.from_user.id, False)
+        await log_action(cb.from_user.id, "CONSENT_REVOKED", True, {})
 
         # 1) Показываем настройки с обновлёнными флагами
         await cb.message.answer(
@@ -816,7 +817,7 @@ async def consent_cb(cb: CallbackQuery):
 
 @dp.callback_query(F.data == "profile:pr")
 async def profile_pr(cb: CallbackQuery):
-    row = get_profile(cb.from_user.id)
+    row = await get_profile(cb.from_user.id)
     pr_id = row.get("parkrun_user_id") if row else None
     has_parkrun = bool(pr_id)
 
@@ -849,10 +850,10 @@ async def news_cb(cb: CallbackQuery):
     action = cb.data.split(":")[1]
 
     if action == "subscribe":
-        set_news_subscribed(cb.from_user.id, True)
-        log_action(cb.from_user.id, "NEWS_SUBSCRIBE", True, {})
+        await set_news_subscribed(cb.from_user.id, True)
+        await log_action(cb.from_user.id, "NEWS_SUBSCRIBE", True, {})
 
-        row = get_profile(cb.from_user.id) or {}
+        row = await get_profile(cb.from_user.id) or {}
         consent = bool(row.get("consent_accepted"))
         january = bool(row.get("january_notification"))
 
@@ -866,10 +867,10 @@ async def news_cb(cb: CallbackQuery):
         return
 
     elif action == "unsubscribe":
-        set_news_subscribed(cb.from_user.id, False)
-        log_action(cb.from_user.id, "NEWS_UNSUBSCRIBE", True, {})
+        await set_news_subscribed(cb.from_user.id, False)
+        await log_action(cb.from_user.id, "NEWS_UNSUBSCRIBE", True, {})
 
-        row = get_profile(cb.from_user.id) or {}
+        row = await get_profile(cb.from_user.id) or {}
         consent = bool(row.get("consent_accepted"))
         january = bool(row.get("january_notification"))
 
@@ -883,7 +884,7 @@ async def news_cb(cb: CallbackQuery):
     elif action == "cancel":
         await cb.message.answer(
             "Действие с рассылкой отменено.",
-            reply_markup=mk_menu(cb.from_user.id),
+            reply_markup=await mk_menu(cb.from_user.id),
             disable_web_page_preview=True,
         )
 
@@ -892,10 +893,10 @@ async def news_cb(cb: CallbackQuery):
 @dp.callback_query(F.data.startswith("january:"))
 async def january_cb(cb: CallbackQuery):
     action = cb.data.split(":")[1]
-    row = get_profile(cb.from_user.id)
+    row = await get_profile(cb.from_user.id)
 
     if action == "subscribe":
-        set_january_notification(cb.from_user.id, True)
+        await set_january_notification(cb.from_user.id, True)
         await cb.message.answer(
             "Вы подписались на уведомления о стартах 1 января.",
             reply_markup=settings_kb(
@@ -905,7 +906,7 @@ async def january_cb(cb: CallbackQuery):
             )
         )
     elif action == "unsubscribe":
-        set_january_notification(cb.from_user.id, False)
+        await set_january_notification(cb.from_user.id, False)
         await cb.message.answer(
             "Вы отписались от уведомлений 1 января.",
             reply_markup=settings_kb(
@@ -917,7 +918,7 @@ async def january_cb(cb: CallbackQuery):
     else:
         await cb.message.answer(
             "Действие отменено.",
-            reply_markup=mk_menu(cb.from_user.id),
+            reply_markup=await mk_menu(cb.from_user.id),
         )
 
     await cb.answer()
@@ -925,7 +926,7 @@ async def january_cb(cb: CallbackQuery):
 @dp.callback_query(F.data.startswith("settings:"))
 async def settings_cb(cb: CallbackQuery):
     action = cb.data.split(":")[1]
-    row = get_profile(cb.from_user.id)
+    row = await get_profile(cb.from_user.id)
     consent = bool(row and row.get('consent_accepted'))
     news = bool(row and row.get('news_subscribed'))
     january = bool(row and row.get('january_notification'))
@@ -1045,7 +1046,7 @@ async def s95_receive_input(message: Message, state: FSMContext):
         is_link = False
 
     # 3. Ищем в локальной базе по s95_id и s95_barcode (всегда только цифры)
-    row = get_s95_runner(s95_id)
+    row = await get_s95_runner(s95_id)
 
     if row:
         # Если нашли — используем canon s95_id из БД (то, что и будем писать в tg_user_profile)
@@ -1053,9 +1054,9 @@ async def s95_receive_input(message: Message, state: FSMContext):
         name = row.get("name_runner") or f"ID {canonical_id}"
         url = f"https://s95.ru/athletes/{canonical_id}"
 
-        runs_s95 = get_s95_runs_count(canonical_id)
+        runs_s95 = await get_s95_runs_count(canonical_id)
         runs_s95_text = pluralize_ru(runs_s95, ("пробежка", "пробежки", "пробежек"))
-        last_run = get_last_s95_run(canonical_id)
+        last_run = await get_last_s95_run(canonical_id)
         last_part = ""
         if last_run:
             dt = last_run["date_event"]
@@ -1129,7 +1130,7 @@ async def s95_receive_link(message: Message, state: FSMContext):
         return
 
     s95_id = link_match.group(1)
-    runs_s95 = get_s95_runs_count(s95_id)
+    runs_s95 = await get_s95_runs_count(s95_id)
     runs_s95_text = pluralize_ru(runs_s95, ("пробежка", "пробежки", "пробежек"))
 
     url = f"https://s95.ru/athletes/{s95_id}"
@@ -1170,10 +1171,10 @@ async def pr_receive_id(message: Message, state: FSMContext):
     user_id = m.group(1)
     url = f"https://www.parkrun.org.uk/parkrunner/{user_id}/all/"
 
-    runs_pr = get_parkrun_runs_count(user_id)
+    runs_pr = await get_parkrun_runs_count(user_id)
     runs_pr_text = pluralize_ru(runs_pr, ("пробежка", "пробежки", "пробежек"))
 
-    last_run = get_last_parkrun_run(user_id)
+    last_run = await get_last_parkrun_run(user_id)
     last_part = ""
     if last_run:
         dt = last_run["date_event"]
@@ -1183,7 +1184,7 @@ async def pr_receive_id(message: Message, state: FSMContext):
             dt_str = str(dt)
         last_part = f'\nПоследняя пробежка: {dt_str} в {last_run["name_point"]}'
 
-    row = get_parkrun_user(user_id)
+    row = await get_parkrun_user(user_id)
 
     if row:
         display_name = row.get("actual_name_runner") or row.get("name_runner") or f"ID {user_id}"
@@ -1223,7 +1224,7 @@ async def c95_bind_cb(cb: CallbackQuery):
     if action == "cancel":
         await cb.message.answer(
             "Привязка учетной записи С95 отменена.",
-            reply_markup=mk_menu(cb.from_user.id),
+            reply_markup=await mk_menu(cb.from_user.id),
             disable_web_page_preview=True,
         )
         await cb.answer()
@@ -1236,22 +1237,22 @@ async def c95_bind_cb(cb: CallbackQuery):
 
         s95_id = re.sub(r"\D", "", parts[2])  # на всякий случай ещё раз только цифры
 
-        runs_s95 = get_s95_runs_count(s95_id)
+        runs_s95 = await get_s95_runs_count(s95_id)
         runs_s95_text = pluralize_ru(runs_s95, ("пробежка", "пробежки", "пробежек"))
 
-        s95_row = get_s95_runner(s95_id) or {}
+        s95_row = await get_s95_runner(s95_id) or {}
         name_s95 = s95_row.get("name_runner") or f"ID {s95_id}"
 
         # Гарантируем строку в s95_runners по s95_id
-        ensure_s95_runner_row(s95_id)
+        await ensure_s95_runner_row(s95_id)
 
-        ok, msg = bind_s95_profile(cb.from_user.id, s95_id)
+        ok, msg = await bind_s95_profile(cb.from_user.id, s95_id)
         if not ok:
             await cb.message.answer(f"Ошибка: {msg}")
             await cb.answer()
             return
 
-        log_action(cb.from_user.id, "S95_PROFILE_BOUND", True, {"s95_user_id": s95_id})
+        await log_action(cb.from_user.id, "S95_PROFILE_BOUND", True, {"s95_user_id": s95_id})
 
         url = f"https://s95.ru/athletes/{s95_id}"
         await cb.message.answer(
@@ -1278,7 +1279,7 @@ async def parkrun_bind_cb(cb: CallbackQuery):
     if action == "cancel":
         await cb.message.answer(
             "Привязка учетной записи parkrun отменена.",
-            reply_markup=mk_menu(cb.from_user.id),
+            reply_markup=await mk_menu(cb.from_user.id),
             disable_web_page_preview=True,
         )
         await cb.answer()
@@ -1296,7 +1297,7 @@ async def parkrun_bind_cb(cb: CallbackQuery):
             return
 
             # Проверка: профиль parkrun уже привязан к другой УЗ TG?
-            if is_parkrun_profile_bound(user_id, cb.from_user.id):
+            if await is_parkrun_profile_bound(user_id, cb.from_user.id):
                 url = f"https://www.parkrun.org.uk/parkrunner/{user_id}/all/"
                 await cb.message.answer(
                     "Этот профиль parkrun уже привязан к другой учетной записи Telegram.\n\n"
@@ -1309,18 +1310,18 @@ async def parkrun_bind_cb(cb: CallbackQuery):
                 await cb.answer()
                 return
 
-        runs_pr = get_parkrun_runs_count(user_id)
+        runs_pr = await get_parkrun_runs_count(user_id)
         runs_pr_text = pluralize_ru(runs_pr, ("пробежка", "пробежки", "пробежек"))
 
         # Смотрим, есть ли участник в локальной базе
-        pr_user = get_parkrun_user(user_id)
+        pr_user = await get_parkrun_user(user_id)
 
         # Убедимся, что строка в parkrun_users есть (создаём-заглушку при необходимости)
-        ensure_parkrun_user_row(user_id)
+        await ensure_parkrun_user_row(user_id)
 
         # Привязываем к профилю
-        bind_parkrun_profile(cb.from_user.id, user_id)
-        log_action(cb.from_user.id, "PARKRUN_PROFILE_BOUND", True, {"parkrun_user_id": user_id})
+        await bind_parkrun_profile(cb.from_user.id, user_id)
+        await log_action(cb.from_user.id, "PARKRUN_PROFILE_BOUND", True, {"parkrun_user_id": user_id})
 
         url = f"https://www.parkrun.org.uk/parkrunner/{user_id}/all/"
 
@@ -1350,7 +1351,7 @@ async def parkrun_bind_cb(cb: CallbackQuery):
         await cb.message.answer(
             text,
             parse_mode="HTML",
-            reply_markup=mk_menu(cb.from_user.id),
+            reply_markup=await mk_menu(cb.from_user.id),
             disable_web_page_preview=True,
         )
 
@@ -1395,19 +1396,19 @@ async def bind_receive(message: Message, state: FSMContext):
         )
         return
 
-    if not user_exists(uid):
-        log_action(message.from_user.id, "PROFILE_NOT_FOUND", False, {"user_id_5v": uid})
+    if not await user_exists(uid):
+        await log_action(message.from_user.id, "PROFILE_NOT_FOUND", False, {"user_id_5v": uid})
         await message.answer(
             "Такой пользователь не найден в базе финишей/волонтёрств. Проверьте ID.",
             disable_web_page_preview=True,
         )
         return
 
-    name = find_latest_name_for_user(uid) or "имя не найдено"
-    runs_5v = get_5v_runs_count(uid)
+    name = await find_latest_name_for_user(uid) or "имя не найдено"
+    runs_5v = await get_5v_runs_count(uid)
     runs_5v_text = pluralize_ru(runs_5v, ("пробежка", "пробежки", "пробежек"))
 
-    last_run = get_last_5v_run(uid)
+    last_run = await get_last_5v_run(uid)
     last_part = ""
     if last_run:
         dt = last_run["date_event"]
@@ -1435,7 +1436,7 @@ async def bind_confirm(cb: CallbackQuery):
     if action == "cancel":
         await cb.message.answer(
             "Привязка отменена.",
-            reply_markup=mk_menu(cb.from_user.id),
+            reply_markup=await mk_menu(cb.from_user.id),
             disable_web_page_preview=True
         )
         await cb.answer()
@@ -1450,7 +1451,7 @@ async def bind_confirm(cb: CallbackQuery):
         uid = parts[2]
 
         # Проверка: профиль 5 вёрст уже привязан к другой УЗ TG?
-        if is_5v_profile_bound(uid, cb.from_user.id):
+        if await is_5v_profile_bound(uid, cb.from_user.id):
             profile_url = url_5v_profile(uid)
             await cb.message.answer(
                 "Этот профиль 5 вёрст уже привязан к другой учетной записи Telegram.\n\n"
@@ -1464,20 +1465,20 @@ async def bind_confirm(cb: CallbackQuery):
             return
 
         profile_url = url_5v_profile(uid)
-        ok, msg = bind_profile(cb.from_user.id, uid, profile_url)
+        ok, msg = await bind_profile(cb.from_user.id, uid, profile_url)
         if not ok:
             ...
             return
 
-        log_action(cb.from_user.id, "PROFILE_BOUND", True, {"user_id_5v": uid})
+        await log_action(cb.from_user.id, "PROFILE_BOUND", True, {"user_id_5v": uid})
 
         # Загружаем данные после привязки
-        row = get_profile(cb.from_user.id)
-        name_txt = find_latest_name_for_user(uid) or uid
-        club = get_current_club(uid)
+        row = await get_profile(cb.from_user.id)
+        name_txt = await find_latest_name_for_user(uid) or uid
+        club = await get_current_club(uid)
         has_club = bool(club)
 
-        runs_5v = get_5v_runs_count(uid)
+        runs_5v = await get_5v_runs_count(uid)
         runs_5v_text = pluralize_ru(runs_5v, ("пробежка", "пробежки", "пробежек"))
 
         challenge_url = url_5v_challenges(uid)
@@ -1527,7 +1528,7 @@ async def clubs_action(cb: CallbackQuery):
 
     # Отмена
     if action == "cancel":
-        await cb.message.answer("Действие отменено.", reply_markup=mk_menu(cb.from_user.id))
+        await cb.message.answer("Действие отменено.", reply_markup=await mk_menu(cb.from_user.id))
         await cb.answer()
         return
 
@@ -1543,7 +1544,7 @@ async def clubs_action(cb: CallbackQuery):
         if not ok:
             return
 
-        clubs = list_clubs_distinct()
+        clubs = await list_clubs_distinct()
         if not clubs:
             await cb.message.answer("Список клубов пуст. Напишите автору @Popov_Dmitry.")
             await cb.answer()
@@ -1561,10 +1562,10 @@ async def clubs_action(cb: CallbackQuery):
 
     # Отвязать клуб — спрашиваем подтверждение
     if action == "unlink":
-        uid = get_profile(cb.from_user.id).get('user_id_5v')
-        current = get_current_club(uid)
+        uid = (await get_profile(cb.from_user.id)).get('user_id_5v')
+        current = await get_current_club(uid)
         if not current:
-            await cb.message.answer("У вас сейчас не выбран клуб.", reply_markup=mk_menu(cb.from_user.id))
+            await cb.message.answer("У вас сейчас не выбран клуб.", reply_markup=await mk_menu(cb.from_user.id))
             await cb.answer()
             return
         await cb.message.answer(
@@ -1576,36 +1577,36 @@ async def clubs_action(cb: CallbackQuery):
 
 @dp.callback_query(F.data == "club:confirm_unlink")
 async def club_confirm_unlink(cb: CallbackQuery):
-    can, nt = can_change('last_club_change_at', cb.from_user.id)
+    can, nt = await can_change('last_club_change_at', cb.from_user.id)
     if not can:
-        log_action(cb.from_user.id, "CLUB_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
+        await log_action(cb.from_user.id, "CLUB_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
         await cb.answer("Лимит 24 часа.", show_alert=True)
         return
 
-    uid = get_profile(cb.from_user.id).get('user_id_5v')
-    ok = delete_user_club(cb.from_user.id, uid)
+    uid = (await get_profile(cb.from_user.id)).get('user_id_5v')
+    ok = await delete_user_club(cb.from_user.id, uid)
     if ok:
-        log_action(cb.from_user.id, "CLUB_UNLINKED", True, {"user_id_5v": uid})
-        await cb.message.answer("Клуб отвязан.", reply_markup=mk_menu(cb.from_user.id))
+        await log_action(cb.from_user.id, "CLUB_UNLINKED", True, {"user_id_5v": uid})
+        await cb.message.answer("Клуб отвязан.", reply_markup=await mk_menu(cb.from_user.id))
     else:
-        log_action(cb.from_user.id, "CLUB_UNLINK_NOOP", False, {"user_id_5v": uid})
-        await cb.message.answer("Клуб не был привязан.", reply_markup=mk_menu(cb.from_user.id))
+        await log_action(cb.from_user.id, "CLUB_UNLINK_NOOP", False, {"user_id_5v": uid})
+        await cb.message.answer("Клуб не был привязан.", reply_markup=await mk_menu(cb.from_user.id))
     await cb.answer()
 
 
 @dp.callback_query(F.data == "club:cancel_unlink")
 async def club_cancel_unlink(cb: CallbackQuery):
-    await cb.message.answer("Отмена отвязки клуба.", reply_markup=mk_menu(cb.from_user.id))
+    await cb.message.answer("Отмена отвязки клуба.", reply_markup=await mk_menu(cb.from_user.id))
     await cb.answer()
 
 @dp.callback_query(F.data == "profile:5v")
 async def p5v_root_cb(cb: CallbackQuery):
     # проверяем согласие по tg_user_id
-    row = get_profile(cb.from_user.id)
+    row = await get_profile(cb.from_user.id)
     if not row or not row.get("consent_accepted"):
         await cb.message.answer(
             "Сначала примите оферту в разделе «⚙️ Настройки» → «Согласие».",
-            reply_markup=mk_menu(cb.from_user.id),
+            reply_markup=await mk_menu(cb.from_user.id),
             disable_web_page_preview=True,
         )
         await cb.answer()
@@ -1613,7 +1614,7 @@ async def p5v_root_cb(cb: CallbackQuery):
 
     uid = row.get("user_id_5v") if row else None
     has_profile = bool(uid)
-    club = get_current_club(uid) if uid else None
+    club = await get_current_club(uid) if uid else None
     has_club = bool(club)
 
     text = "<b>Профиль 5 вёрст</b>\n\n"
@@ -1621,7 +1622,7 @@ async def p5v_root_cb(cb: CallbackQuery):
     if has_profile:
         profile_url = url_5v_profile(uid)
         challenge_url = url_5v_challenges(uid)
-        name_txt = find_latest_name_for_user(uid) or f"ID {uid}"
+        name_txt = await find_latest_name_for_user(uid) or f"ID {uid}"
         map_url = url_5v_map(uid)
 
         text += f"<b>Профиль:</b> <a href=\"{profile_url}\">{name_txt}</a>\n"
@@ -1686,25 +1687,25 @@ async def p5v_action(cb: CallbackQuery, state: FSMContext):
 
     # Отвязать профиль 5 вёрст
     if action == "unbind":
-        can, nt = can_change('last_profile_change_at', cb.from_user.id)
+        can, nt = await can_change('last_profile_change_at', cb.from_user.id)
         if not can:
-            log_action(cb.from_user.id, "PROFILE_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
+            await log_action(cb.from_user.id, "PROFILE_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
             await cb.answer("Лимит 24 часа.", show_alert=True)
             return
 
-        ok = unlink_profile(cb.from_user.id)
+        ok = await unlink_profile(cb.from_user.id)
         if ok:
-            log_action(cb.from_user.id, "PROFILE_UNBOUND", True, {})
+            await log_action(cb.from_user.id, "PROFILE_UNBOUND", True, {})
             await cb.message.answer(
                 "Профиль отвязан.",
-                reply_markup=main_menu(consent_accepted=consent_flag(cb.from_user.id)),
+                reply_markup=main_menu(consent_accepted=await consent_flag(cb.from_user.id)),
                 disable_web_page_preview=True,
             )
         else:
-            log_action(cb.from_user.id, "PROFILE_UNBOUND_NOOP", False, {})
+            await log_action(cb.from_user.id, "PROFILE_UNBOUND_NOOP", False, {})
             await cb.message.answer(
                 "У вас и так не привязан профиль.",
-                reply_markup=main_menu(consent_accepted=consent_flag(cb.from_user.id)),
+                reply_markup=main_menu(consent_accepted=await consent_flag(cb.from_user.id)),
                 disable_web_page_preview=True,
             )
         await cb.answer()
@@ -1739,25 +1740,25 @@ async def pr_action(cb: CallbackQuery, state: FSMContext):
 
     # Отвязать профиль
     if action == "unbind":
-        can, nt = can_change("last_parkrun_change_at", cb.from_user.id)
+        can, nt = await can_change("last_parkrun_change_at", cb.from_user.id)
         if not can:
-            log_action(cb.from_user.id, "PARKRUN_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
+            await log_action(cb.from_user.id, "PARKRUN_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
             await cb.answer("Менять привязку можно раз в 24 часа.", show_alert=True)
             return
 
-        ok = unlink_parkrun_profile(cb.from_user.id)
+        ok = await unlink_parkrun_profile(cb.from_user.id)
         if ok:
-            log_action(cb.from_user.id, "PARKRUN_PROFILE_UNBOUND", True, {})
+            await log_action(cb.from_user.id, "PARKRUN_PROFILE_UNBOUND", True, {})
             await cb.message.answer(
                 "Профиль parkrun отвязан.",
-                reply_markup=mk_menu(cb.from_user.id),
+                reply_markup=await mk_menu(cb.from_user.id),
                 disable_web_page_preview=True,
             )
         else:
-            log_action(cb.from_user.id, "PARKRUN_PROFILE_UNBOUND_NOOP", False, {})
+            await log_action(cb.from_user.id, "PARKRUN_PROFILE_UNBOUND_NOOP", False, {})
             await cb.message.answer(
                 "У вас не был привязан профиль parkrun.",
-                reply_markup=mk_menu(cb.from_user.id),
+                reply_markup=await mk_menu(cb.from_user.id),
                 disable_web_page_preview=True,
             )
         await cb.answer()
@@ -1769,9 +1770,9 @@ async def c95_action(cb: CallbackQuery, state: FSMContext):
 
     # Привязать / изменить профиль
     if action == "bind":
-        can, nt = can_change("last_s95_change_at", cb.from_user.id)
+        can, nt = await can_change("last_s95_change_at", cb.from_user.id)
         if not can:
-            log_action(cb.from_user.id, "S95_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
+            await log_action(cb.from_user.id, "S95_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
             await cb.message.answer(
                 "Менять привязку учетной записи С95 можно раз в 24 часа.\n"
                 f"Следующая попытка после: {nt.astimezone(TZ):%Y-%m-%d %H:%M}.",
@@ -1796,25 +1797,25 @@ async def c95_action(cb: CallbackQuery, state: FSMContext):
 
     # Отвязать профиль
     if action == "unbind":
-        can, nt = can_change("last_s95_change_at", cb.from_user.id)
+        can, nt = await can_change("last_s95_change_at", cb.from_user.id)
         if not can:
-            log_action(cb.from_user.id, "S95_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
+            await log_action(cb.from_user.id, "S95_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
             await cb.answer("Менять привязку можно раз в 24 часа.", show_alert=True)
             return
 
-        ok = unlink_s95_profile(cb.from_user.id)
+        ok = await unlink_s95_profile(cb.from_user.id)
         if ok:
-            log_action(cb.from_user.id, "S95_PROFILE_UNBOUND", True, {})
+            await log_action(cb.from_user.id, "S95_PROFILE_UNBOUND", True, {})
             await cb.message.answer(
                 "Профиль С95 отвязан.",
-                reply_markup=mk_menu(cb.from_user.id),
+                reply_markup=await mk_menu(cb.from_user.id),
                 disable_web_page_preview=True,
             )
         else:
-            log_action(cb.from_user.id, "S95_PROFILE_UNBOUND_NOOP", False, {})
+            await log_action(cb.from_user.id, "S95_PROFILE_UNBOUND_NOOP", False, {})
             await cb.message.answer(
                 "У вас не был привязан профиль С95.",
-                reply_markup=mk_menu(cb.from_user.id),
+                reply_markup=await mk_menu(cb.from_user.id),
                 disable_web_page_preview=True,
             )
         await cb.answer()
@@ -1823,24 +1824,24 @@ async def c95_action(cb: CallbackQuery, state: FSMContext):
 @dp.callback_query(F.data.startswith("clubs:page:"))
 async def clubs_page(cb: CallbackQuery):
     page = int(cb.data.split(":")[2])
-    clubs = list_clubs_distinct()
+    clubs = await list_clubs_distinct()
     await cb.message.edit_reply_markup(reply_markup=clubs_kb(clubs, page=page))
     await cb.answer()
 
 @dp.callback_query(F.data.startswith("club:set:"))
 async def club_set(cb: CallbackQuery):
     club = cb.data.split(":", 2)[2]
-    row = get_profile(cb.from_user.id)
+    row = await get_profile(cb.from_user.id)
     uid = row.get('user_id_5v')
 
-    can, nt = can_change('last_club_change_at', cb.from_user.id)
+    can, nt = await can_change('last_club_change_at', cb.from_user.id)
     if not can:
-        log_action(cb.from_user.id, "CLUB_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
+        await log_action(cb.from_user.id, "CLUB_CHANGE_DENIED_LIMIT", False, {"next_time": nt.isoformat()})
         await cb.answer("Лимит 24 часа.", show_alert=True)
         return
 
-    set_user_club(cb.from_user.id, uid, club)
-    log_action(cb.from_user.id, "CLUB_SET", True, {"club": club, "user_id_5v": uid})
+    await set_user_club(cb.from_user.id, uid, club)
+    await log_action(cb.from_user.id, "CLUB_SET", True, {"club": club, "user_id_5v": uid})
 
     club_url = url_5v_club_dashboard(club)
 
@@ -1848,14 +1849,14 @@ async def club_set(cb: CallbackQuery):
         f"Готово! Вы в клубе «{club}».\n"
         f"<a href=\"{club_url}\">Посмотреть статистику по клубу</a>",
         parse_mode="HTML",
-        reply_markup=mk_menu(cb.from_user.id),
+        reply_markup=await mk_menu(cb.from_user.id),
         disable_web_page_preview=True
     )
     await cb.answer()
 
 @dp.callback_query(F.data == "profile:c95")
 async def profile_c95(cb: CallbackQuery):
-    row = get_profile(cb.from_user.id)
+    row = await get_profile(cb.from_user.id)
     s95_id = row.get("s95_user_id") if row else None
     has_c95 = bool(s95_id)
 
@@ -1912,7 +1913,7 @@ async def unknown_slash_command(message: Message):
         "Я не знаю такую команду 🤔\n\n"
         "Функционал бота был обновлён, некоторые команды больше не используются.\n"
         "Пожалуйста, нажмите /start, чтобы открыть актуальное меню.",
-        reply_markup=main_menu(consent_accepted=consent_flag(message.from_user.id)),
+        reply_markup=main_menu(consent_accepted=await consent_flag(message.from_user.id)),
         disable_web_page_preview=True,
     )
 
@@ -1928,10 +1929,15 @@ async def unknown_message(message: Message, state: FSMContext):
         "Я не знаю такую команду 🤔\n\n"
         "Функционал бота был обновлён, некоторые команды больше не используются.\n"
         "Пожалуйста, нажмите /start, чтобы открыть актуальное меню.",
-        reply_markup=main_menu(consent_accepted=consent_flag(message.from_user.id)),
+        reply_markup=main_menu(consent_accepted=await consent_flag(message.from_user.id)),
         disable_web_page_preview=True,
     )
 
+@dp.shutdown()
+async def on_shutdown():
+    # закрываем соединения пула БД при остановке бота
+    await dispose_engine()
+
 if __name__ == "__main__":
     import asyncio
     asyncio.run(dp.start_polling(bot))
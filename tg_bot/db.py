@@ -4,10 +4,9 @@ from datetime import datetime, timedelta
 from typing import Optional, Union
 
 from dateutil.tz import gettz
-from sqlalchemy.engine import Engine
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.pool import NullPool
-from sqlalchemy import create_engine, text, bindparam
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy import text, bindparam
 from sqlalchemy.types import JSON
 from pathlib import Path
 
@@ -27,28 +26,49 @@ db_pass = config['five_verst_stats']['password']
 db_name = config['five_verst_stats']['dbname']
 
 credential = f'postgresql+psycopg://{db_user}:{db_pass}@{db_host}/{db_name}'
-engine: Engine = create_engine(credential, poolclass=NullPool, future=True)
+
+# Асинхронный engine с пулом: хендлеры await-ят запросы и не блокируют цикл событий aiogram,
+# соединения переиспользуются, а не открываются заново на каждый запрос.
+# Всплеск после рассылки упирается в pool_size + max_overflow соединений,
+# остальные запросы ждут свободное соединение не дольше pool_timeout секунд.
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 900
+
+engine: AsyncEngine = create_async_engine(
+    credential,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+
+async def dispose_engine():
+    """Закрывает соединения пула (при остановке бота или в конце скрипта)."""
+    await engine.dispose()
 
 
 # ===== Утилиты =====
 def uid_str(uid: Union[int, str]) -> str:
     return str(uid)
 
-def log_action(tg_user_id: int, action: str, success: bool, details: dict):
+async def log_action(tg_user_id: int, action: str, success: bool, details: dict):
     stmt = text("""
         INSERT INTO change_log (tg_user_id, action, success, details)
         VALUES (:tg, :act, :succ, :det)
     """).bindparams(bindparam("det", type_=JSON))  # пусть SQLAlchemy сам сериализует в JSONB
 
-    with engine.begin() as conn:
-        conn.execute(
+    async with engine.begin() as conn:
+        await conn.execute(
             stmt,
             {"tg": tg_user_id, "act": action, "succ": success, "det": details}
         )
 
-def ensure_user_row(tg_user_id: int, tg_username: Optional[str], tg_chat_id: Optional[int]):
-    with engine.begin() as conn:
-        conn.execute(text("""
+async def ensure_user_row(tg_user_id: int, tg_username: Optional[str], tg_chat_id: Optional[int]):
+    async with engine.begin() as conn:
+        await conn.execute(text("""
             INSERT INTO tg_user_profile (tg_user_id, tg_username, tg_chat_id)
             VALUES (:id, :un, :chat)
             ON CONFLICT (tg_user_id) DO UPDATE SET
@@ -56,63 +76,63 @@ def ensure_user_row(tg_user_id: int, tg_username: Optional[str], tg_chat_id: Opt
                 tg_chat_id  = EXCLUDED.tg_chat_id
         """), {"id": tg_user_id, "un": tg_username, "chat": tg_chat_id})
 
-def get_profile(tg_user_id: int):
-    with engine.begin() as conn:
-        row = conn.execute(text("SELECT * FROM tg_user_profile WHERE tg_user_id=:u"),
-                           {"u": tg_user_id}).mappings().first()
+async def get_profile(tg_user_id: int):
+    async with engine.begin() as conn:
+        row = (await conn.execute(text("SELECT * FROM tg_user_profile WHERE tg_user_id=:u"),
+                           {"u": tg_user_id})).mappings().first()
     return row
 
-def set_consent(tg_user_id: int, accepted: bool):
-    with engine.begin() as conn:
-        conn.execute(text("""
+async def set_consent(tg_user_id: int, accepted: bool):
+    async with engine.begin() as conn:
+        await conn.execute(text("""
             UPDATE tg_user_profile
             SET consent_accepted=:acc, consent_ts=now()
             WHERE tg_user_id=:u
         """), {"acc": accepted, "u": tg_user_id})
 
-def set_news_subscribed(tg_user_id: int, subscribed: bool):
-    with engine.begin() as conn:
-        conn.execute(text("""
+async def set_news_subscribed(tg_user_id: int, subscribed: bool):
+    async with engine.begin() as conn:
+        await conn.execute(text("""
             UPDATE tg_user_profile
             SET news_subscribed = :sub
             WHERE tg_user_id = :u
         """), {"sub": subscribed, "u": tg_user_id})
 
-def get_news_subscribed_tg_ids() -> list[int]:
+async def get_news_subscribed_tg_ids() -> list[int]:
     """
     Возвращает список tg_user_id пользователей,
     у которых news_subscribed = true.
     """
-    with engine.begin() as conn:
-        rows = conn.execute(text("""
+    async with engine.begin() as conn:
+        rows = (await conn.execute(text("""
             SELECT tg_user_id
             FROM tg_user_profile
             WHERE news_subscribed = true
-        """)).fetchall()
+        """))).fetchall()
     return [r[0] for r in rows]
 
-def set_january_notification(tg_user_id: int, subscribed: bool):
+async def set_january_notification(tg_user_id: int, subscribed: bool):
     """
     Включаем / выключаем подписку на уведомления по стартам 1 января.
     """
-    with engine.begin() as conn:
-        conn.execute(text("""
+    async with engine.begin() as conn:
+        await conn.execute(text("""
             UPDATE tg_user_profile
             SET january_notification = :sub
             WHERE tg_user_id = :u
         """), {"sub": subscribed, "u": tg_user_id})
 
 
-def get_january_subscribed_tg_ids() -> list[int]:
+async def get_january_subscribed_tg_ids() -> list[int]:
     """
     ID тех, кто согласился на уведомления по стартам 1 января.
     """
-    with engine.begin() as conn:
-        rows = conn.execute(text("""
+    async with engine.begin() as conn:
+        rows = (await conn.execute(text("""
             SELECT tg_user_id
             FROM tg_user_profile
             WHERE january_notification = true
-        """)).fetchall()
+        """))).fetchall()
     return [r[0] for r in rows]
 
 
@@ -121,8 +141,8 @@ def next_time_after(last_dt) -> Optional[datetime]:
         return None
     return last_dt + timedelta(hours=24)
 
-def can_change(field_name: str, tg_user_id: int):
-    row = get_profile(tg_user_id)
+async def can_change(field_name: str, tg_user_id: int):
+    row = await get_profile(tg_user_id)
     last = row[field_name] if row and field_name in row else None
     if not last:
         return True, None
@@ -146,7 +166,7 @@ def parse_user_id_from_text(s: str) -> Optional[int]:
 
     return None
 
-def find_latest_name_for_user(uid: int) -> Optional[str]:
+async def find_latest_name_for_user(uid: int) -> Optional[str]:
     sql = """
     WITH last_runs AS (
         SELECT name_runner, date_event
@@ -170,30 +190,30 @@ def find_latest_name_for_user(uid: int) -> Optional[str]:
     ORDER BY date_event DESC
     LIMIT 1;
     """
-    with engine.begin() as conn:
-        row = conn.execute(text(sql), {"uid": uid}).first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql), {"uid": uid})).first()
     return row[0] if row else None
 
-def user_exists(uid: int) -> bool:
+async def user_exists(uid: int) -> bool:
     sql = """
     SELECT
         EXISTS (SELECT 1 FROM details_protocol WHERE user_id = CAST(:u AS TEXT))
         OR
         EXISTS (SELECT 1 FROM details_vol      WHERE user_id = CAST(:u AS TEXT))
     """
-    with engine.begin() as conn:
-        val = conn.execute(text(sql), {"u": uid}).scalar()
+    async with engine.begin() as conn:
+        val = (await conn.execute(text(sql), {"u": uid})).scalar()
     return bool(val)
 
-def is_5v_profile_bound(uid: Union[int, str], tg_user_id: int) -> bool:
+async def is_5v_profile_bound(uid: Union[int, str], tg_user_id: int) -> bool:
     """
     Проверяем, что данный user_id_5v уже привязан к другой TG-учётке.
 
     user_id_5v в tg_user_profile хранится как text, поэтому приводим к str.
     """
     u_str = str(uid)
-    with engine.begin() as conn:
-        row = conn.execute(
+    async with engine.begin() as conn:
+        row = (await conn.execute(
             text("""
                 SELECT tg_user_id
                 FROM tg_user_profile
@@ -202,15 +222,15 @@ def is_5v_profile_bound(uid: Union[int, str], tg_user_id: int) -> bool:
                 LIMIT 1
             """),
             {"uid": u_str, "tg": tg_user_id},
-        ).first()
+        )).first()
     return row is not None
 
 
 
-def is_parkrun_profile_bound(parkrun_user_id: Union[int, str], tg_user_id: int) -> bool:
+async def is_parkrun_profile_bound(parkrun_user_id: Union[int, str], tg_user_id: int) -> bool:
     pid = str(parkrun_user_id)
-    with engine.begin() as conn:
-        row = conn.execute(
+    async with engine.begin() as conn:
+        row = (await conn.execute(
             text("""
                 SELECT tg_user_id
                 FROM tg_user_profile
@@ -219,14 +239,14 @@ def is_parkrun_profile_bound(parkrun_user_id: Union[int, str], tg_user_id: int)
                 LIMIT 1
             """),
             {"pid": pid, "tg": tg_user_id},
-        ).first()
+        )).first()
     return row is not None
 
 
-def is_s95_profile_bound(s95_id: str, tg_user_id: int) -> bool:
+async def is_s95_profile_bound(s95_id: str, tg_user_id: int) -> bool:
     sid = str(s95_id)
-    with engine.begin() as conn:
-        row = conn.execute(
+    async with engine.begin() as conn:
+        row = (await conn.execute(
             text("""
                 SELECT tg_user_id
                 FROM tg_user_profile
@@ -235,13 +255,13 @@ def is_s95_profile_bound(s95_id: str, tg_user_id: int) -> bool:
                 LIMIT 1
             """),
             {"sid": sid, "tg": tg_user_id},
-        ).first()
+        )).first()
     return row is not None
 
-def bind_profile(tg_user_id: int, uid: int, profile_url: str) -> tuple[bool, str]:
+async def bind_profile(tg_user_id: int, uid: int, profile_url: str) -> tuple[bool, str]:
     try:
-        with engine.begin() as conn:
-            conn.execute(text("""
+        async with engine.begin() as conn:
+            await conn.execute(text("""
                 UPDATE tg_user_profile
                 SET user_id_5v=:uid, profile_url=:url, bound_at=now(), last_profile_change_at=now()
                 WHERE tg_user_id=:tg
@@ -251,59 +271,59 @@ def bind_profile(tg_user_id: int, uid: int, profile_url: str) -> tuple[bool, str
         # нарушена уникальность user_id_5v (он уже привязан к другому TG)
         return False, "Этот профиль уже привязан к другому Telegram-аккаунту."
 
-def list_clubs_distinct() -> list[str]:
-    with engine.begin() as conn:
-        rows = conn.execute(text("SELECT DISTINCT club FROM list_clubs WHERE club IS NOT NULL ORDER BY club")).all()
+async def list_clubs_distinct() -> list[str]:
+    async with engine.begin() as conn:
+        rows = (await conn.execute(text("SELECT DISTINCT club FROM list_clubs WHERE club IS NOT NULL ORDER BY club"))).all()
     return [r[0] for r in rows]
 
-def get_current_club(uid: Union[int, str]) -> Optional[str]:
+async def get_current_club(uid: Union[int, str]) -> Optional[str]:
     u = uid_str(uid)
-    with engine.begin() as conn:
-        row = conn.execute(text("SELECT club FROM list_clubs WHERE user_id = :u"), {"u": u}).first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text("SELECT club FROM list_clubs WHERE user_id = :u"), {"u": u})).first()
     return row[0] if row else None
 
-def set_user_club(tg_user_id: int, uid: Union[int, str], club: str):
+async def set_user_club(tg_user_id: int, uid: Union[int, str], club: str):
     u = uid_str(uid)
-    prev = get_current_club(u)
-    with engine.begin() as conn:
+    prev = await get_current_club(u)
+    async with engine.begin() as conn:
         # user_id в list_clubs текстовый, поэтому передаём строку
-        conn.execute(
+        await conn.execute(
             text("""INSERT INTO list_clubs (user_id, club) VALUES (:u, :c)
                     ON CONFLICT (user_id) DO UPDATE SET club = EXCLUDED.club"""),
             {"u": u, "c": club}
         )
-        conn.execute(
+        await conn.execute(
             text("""INSERT INTO club_change_log (tg_user_id, user_id_5v, from_club, to_club)
                     VALUES (:tg, :u_num, :f, :t)"""),
             # В club_change_log.user_id_5v у вас тип BIGINT? Если да — передаём числом.
             {"tg": tg_user_id, "u_num": int(uid), "f": prev, "t": club}
         )
-        conn.execute(text("UPDATE tg_user_profile SET last_club_change_at=now() WHERE tg_user_id=:tg"),
+        await conn.execute(text("UPDATE tg_user_profile SET last_club_change_at=now() WHERE tg_user_id=:tg"),
                      {"tg": tg_user_id})
 
-def delete_user_club(tg_user_id: int, uid: Union[int, str]) -> bool:
+async def delete_user_club(tg_user_id: int, uid: Union[int, str]) -> bool:
     u = uid_str(uid)
-    prev = get_current_club(u)
-    with engine.begin() as conn:
-        res = conn.execute(text("DELETE FROM list_clubs WHERE user_id = :u"), {"u": u})
+    prev = await get_current_club(u)
+    async with engine.begin() as conn:
+        res = await conn.execute(text("DELETE FROM list_clubs WHERE user_id = :u"), {"u": u})
         if res.rowcount:
-            conn.execute(
+            await conn.execute(
                 text("""INSERT INTO club_change_log (tg_user_id, user_id_5v, from_club, to_club, note)
                         VALUES (:tg, :u_num, :f, NULL, 'delete')"""),
                 {"tg": tg_user_id, "u_num": int(uid), "f": prev}
             )
-            conn.execute(text("UPDATE tg_user_profile SET last_club_change_at=now() WHERE tg_user_id=:tg"),
+            await conn.execute(text("UPDATE tg_user_profile SET last_club_change_at=now() WHERE tg_user_id=:tg"),
                          {"tg": tg_user_id})
             return True
     return False
 
-def unlink_profile(tg_user_id: int) -> bool:
+async def unlink_profile(tg_user_id: int) -> bool:
     """
     Отвязывает профиль 5в от TG-учётки (ставим NULL'ы) и фиксируем время изменения.
     Возвращает True, если что-то реально поменяли.
     """
-    with engine.begin() as conn:
-        res = conn.execute(
+    async with engine.begin() as conn:
+        res = await conn.execute(
             text("""
                 UPDATE tg_user_profile
                 SET user_id_5v = NULL,
@@ -316,13 +336,13 @@ def unlink_profile(tg_user_id: int) -> bool:
         )
     return res.rowcount > 0
 
-def mark_first_start(tg_user_id: int):
+async def mark_first_start(tg_user_id: int):
     """
     Фиксирует время первого /start для пользователя.
     Если значение уже есть, ничего не меняет.
     """
-    with engine.begin() as conn:
-        conn.execute(
+    async with engine.begin() as conn:
+        await conn.execute(
             text("""
                 UPDATE tg_user_profile
                 SET first_start_ts = now()
@@ -331,7 +351,7 @@ def mark_first_start(tg_user_id: int):
             {"u": tg_user_id}
         )
 
-def get_bot_stats() -> dict:
+async def get_bot_stats() -> dict:
     """
     Сводная статистика по пользователям бота из tg_user_profile.
     """
@@ -384,11 +404,11 @@ def get_bot_stats() -> dict:
             ) AS bound_parkrun_s95_only
         FROM tg_user_profile
     """
-    with engine.begin() as conn:
-        row = conn.execute(text(sql)).mappings().first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql))).mappings().first()
     return dict(row) if row else {}
 
-def get_last_started_users(limit: int = 5) -> list[dict]:
+async def get_last_started_users(limit: int = 5) -> list[dict]:
     """
     Последние пользователи, впервые запустившие бота (по first_start_ts).
     """
@@ -399,11 +419,11 @@ def get_last_started_users(limit: int = 5) -> list[dict]:
         ORDER BY first_start_ts DESC
         LIMIT :lim
     """
-    with engine.begin() as conn:
-        rows = conn.execute(text(sql), {"lim": limit}).mappings().all()
+    async with engine.begin() as conn:
+        rows = (await conn.execute(text(sql), {"lim": limit})).mappings().all()
     return [dict(r) for r in rows]
 
-def get_parkrun_user(user_id: int):
+async def get_parkrun_user(user_id: int):
     """
     Ищем пользователя в parkrun_users по user_id.
     """
@@ -412,11 +432,11 @@ def get_parkrun_user(user_id: int):
         FROM parkrun_users
         WHERE user_id = CAST(:uid AS TEXT)
     """
-    with engine.begin() as conn:
-        row = conn.execute(text(sql), {"uid": user_id}).mappings().first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql), {"uid": user_id})).mappings().first()
     return row
 
-def ensure_parkrun_user_row(user_id: str):
+async def ensure_parkrun_user_row(user_id: str):
     """
     Обеспечивает, что в parkrun_users есть строка с этим user_id.
     Если уже есть — ничего не делает.
@@ -428,28 +448,28 @@ def ensure_parkrun_user_row(user_id: str):
             SELECT 1 FROM parkrun_users WHERE user_id = CAST(:uid AS TEXT)
         )
     """
-    with engine.begin() as conn:
-        conn.execute(text(sql), {"uid": user_id})
+    async with engine.begin() as conn:
+        await conn.execute(text(sql), {"uid": user_id})
 
-def bind_parkrun_profile(tg_user_id: int, parkrun_user_id: str):
+async def bind_parkrun_profile(tg_user_id: int, parkrun_user_id: str):
     """
     Привязываем parkrun_user_id к tg_user_profile и фиксируем время изменения.
     """
-    with engine.begin() as conn:
-        conn.execute(text("""
+    async with engine.begin() as conn:
+        await conn.execute(text("""
             UPDATE tg_user_profile
             SET parkrun_user_id = :pid,
                 last_parkrun_change_at = now()
             WHERE tg_user_id = :tg
         """), {"pid": parkrun_user_id, "tg": tg_user_id})
 
-def unlink_parkrun_profile(tg_user_id: int) -> bool:
+async def unlink_parkrun_profile(tg_user_id: int) -> bool:
     """
     Отвязываем parkrun_user_id от tg_user_profile и фиксируем время изменения.
     Возвращаем True, если что-то реально изменилось.
     """
-    with engine.begin() as conn:
-        res = conn.execute(text("""
+    async with engine.begin() as conn:
+        res = await conn.execute(text("""
             UPDATE tg_user_profile
             SET parkrun_user_id = NULL,
                 last_parkrun_change_at = now()
@@ -467,7 +487,7 @@ def _digits_only(value: str) -> str:
     return re.sub(r"\D", "", str(value))
 
 
-def get_s95_runner(value: str):
+async def get_s95_runner(value: str):
     """
     Ищем участника в s95_runners по s95_id ИЛИ по s95_barcode.
     Везде работаем только с цифрами (строкой).
@@ -482,12 +502,12 @@ def get_s95_runner(value: str):
         WHERE s95_id = :val OR s95_barcode = :val
         LIMIT 1
     """
-    with engine.begin() as conn:
-        row = conn.execute(text(sql), {"val": digits}).mappings().first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql), {"val": digits})).mappings().first()
     return row
 
 
-def get_s95_by_barcode(barcode: str):
+async def get_s95_by_barcode(barcode: str):
     """
     Ищем участника в s95_runners по штрихкоду (s95_barcode).
     Всегда работаем только с цифрами.
@@ -502,11 +522,11 @@ def get_s95_by_barcode(barcode: str):
         WHERE s95_barcode = :val
         LIMIT 1
     """
-    with engine.begin() as conn:
-        row = conn.execute(text(sql), {"val": digits}).mappings().first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql), {"val": digits})).mappings().first()
     return row
 
-def ensure_s95_runner_row(s95_id: str):
+async def ensure_s95_runner_row(s95_id: str):
     """
     Обеспечивает наличие строки с данным s95_id в s95_runners.
     Если строки нет — создаём пустую с одним s95_id.
@@ -519,18 +539,18 @@ def ensure_s95_runner_row(s95_id: str):
             WHERE s95_id = :sid
         )
     """
-    with engine.begin() as conn:
-        conn.execute(text(sql), {"sid": s95_id})
+    async with engine.begin() as conn:
+        await conn.execute(text(sql), {"sid": s95_id})
 
 
-def bind_s95_profile(tg_user_id: int, s95_id: str) -> tuple[bool, str]:
+async def bind_s95_profile(tg_user_id: int, s95_id: str) -> tuple[bool, str]:
     """
     Привязываем s95_id к tg_user_profile.s95_user_id.
     Фиксируем last_s95_change_at.
     """
     try:
-        with engine.begin() as conn:
-            conn.execute(text("""
+        async with engine.begin() as conn:
+            await conn.execute(text("""
                 UPDATE tg_user_profile
                 SET s95_user_id = :sid,
                     last_s95_change_at = now()
@@ -542,13 +562,13 @@ def bind_s95_profile(tg_user_id: int, s95_id: str) -> tuple[bool, str]:
         return False, "Этот профиль С95 уже привязан к другому Telegram-аккаунту."
 
 
-def unlink_s95_profile(tg_user_id: int) -> bool:
+async def unlink_s95_profile(tg_user_id: int) -> bool:
     """
     Отвязываем s95_user_id от tg_user_profile и фиксируем время изменения.
     Возвращаем True, если что-то реально изменилось.
     """
-    with engine.begin() as conn:
-        res = conn.execute(text("""
+    async with engine.begin() as conn:
+        res = await conn.execute(text("""
             UPDATE tg_user_profile
             SET s95_user_id = NULL,
                 last_s95_change_at = now()
@@ -556,7 +576,7 @@ def unlink_s95_profile(tg_user_id: int) -> bool:
         """), {"tg": tg_user_id})
     return res.rowcount > 0
 
-def get_5v_runs_count(user_id: Union[int, str]) -> int:
+async def get_5v_runs_count(user_id: Union[int, str]) -> int:
     """
     Количество пробежек 5 вёрст (без тестовых стартов).
     """
@@ -568,12 +588,12 @@ def get_5v_runs_count(user_id: Union[int, str]) -> int:
         WHERE dp.user_id = :uid
           AND e.is_test = false
     """
-    with engine.begin() as conn:
-        row = conn.execute(text(sql), {"uid": u}).first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql), {"uid": u})).first()
     return row[0] if row else 0
 
 
-def get_parkrun_runs_count(user_id: Union[int, str]) -> int:
+async def get_parkrun_runs_count(user_id: Union[int, str]) -> int:
     """
     Количество пробежек parkrun.
     """
@@ -583,12 +603,12 @@ def get_parkrun_runs_count(user_id: Union[int, str]) -> int:
         FROM parkrun_details_protocol pdp
         WHERE pdp.user_id = :uid
     """
-    with engine.begin() as conn:
-        row = conn.execute(text(sql), {"uid": u}).first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql), {"uid": u})).first()
     return row[0] if row else 0
 
 
-def get_s95_runs_count(user_id: Union[int, str]) -> int:
+async def get_s95_runs_count(user_id: Union[int, str]) -> int:
     """
     Количество пробежек в системе С95.
     """
@@ -598,11 +618,11 @@ def get_s95_runs_count(user_id: Union[int, str]) -> int:
         FROM s95_details_protocol sdp
         WHERE sdp.user_id = :uid
     """
-    with engine.begin() as conn:
-        row = conn.execute(text(sql), {"uid": u}).first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql), {"uid": u})).first()
     return row[0] if row else 0
 
-def get_last_5v_run(user_id: Union[int, str]):
+async def get_last_5v_run(user_id: Union[int, str]):
     u = uid_str(user_id)
     sql = """
         SELECT e.date_event, e.name_point
@@ -613,14 +633,14 @@ def get_last_5v_run(user_id: Union[int, str]):
         ORDER BY e.date_event DESC
         LIMIT 1
     """
-    with engine.begin() as conn:
-        row = conn.execute(text(sql), {"uid": u}).first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql), {"uid": u})).first()
     if not row:
         return None
     return {"date_event": row[0], "name_point": row[1]}
 
 
-def get_last_parkrun_run(user_id: Union[int, str]):
+async def get_last_parkrun_run(user_id: Union[int, str]):
     u = uid_str(user_id)
     sql = """
         SELECT date_event, name_point
@@ -629,14 +649,14 @@ def get_last_parkrun_run(user_id: Union[int, str]):
         ORDER BY date_event DESC
         LIMIT 1
     """
-    with engine.begin() as conn:
-        row = conn.execute(text(sql), {"uid": u}).first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql), {"uid": u})).first()
     if not row:
         return None
     return {"date_event": row[0], "name_point": row[1]}
 
 
-def get_last_s95_run(user_id: Union[int, str]):
+async def get_last_s95_run(user_id: Union[int, str]):
     """
     Возвращает дату и локацию последней пробежки в системе С95
     для данного user_id (по таблице s95_details_protocol).
@@ -649,11 +669,79 @@ def get_last_s95_run(user_id: Union[int, str]):
         ORDER BY date_event DESC
         LIMIT 1
     """
-    with engine.begin() as conn:
-        row = conn.execute(text(sql), {"uid": u}).first()
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql), {"uid": u})).first()
     if not row:
         return None
     return {
         "date_event": row[0],
         "name_point": row[1],
     }
+
+async def get_profile_summary(uid_5v: Optional[Union[int, str]],
+                              parkrun_user_id: Optional[Union[int, str]],
+                              s95_id: Optional[str]) -> dict:
+    """
+    Всё для экрана «Мой профиль» одним запросом (один round trip вместо семи):
+    последнее имя и число пробежек 5 вёрст, клуб, имя и число пробежек parkrun и С95.
+    Для непривязанной системы (None) подзапросы ничего не находят: имя NULL, счётчик 0.
+    Значения совпадают с find_latest_name_for_user, get_5v_runs_count, get_current_club,
+    get_parkrun_user, get_parkrun_runs_count, get_s95_runner и get_s95_runs_count.
+    """
+    sql = """
+        WITH last_5v AS (
+            SELECT name_runner, date_event FROM (
+                (SELECT name_runner, date_event
+                 FROM details_protocol
+                 WHERE user_id = CAST(:uid_5v AS TEXT)
+                 ORDER BY date_event DESC
+                 LIMIT 1)
+                UNION ALL
+                (SELECT name_runner, date_event
+                 FROM details_vol
+                 WHERE user_id = CAST(:uid_5v AS TEXT)
+                 ORDER BY date_event DESC
+                 LIMIT 1)
+            ) t
+            ORDER BY date_event DESC
+            LIMIT 1
+        ),
+        pr AS (
+            SELECT actual_name_runner, name_runner
+            FROM parkrun_users
+            WHERE user_id = CAST(:pr_id AS TEXT)
+            LIMIT 1
+        ),
+        s95 AS (
+            SELECT name_runner
+            FROM s95_runners
+            WHERE s95_id = :s95_digits OR s95_barcode = :s95_digits
+            LIMIT 1
+        )
+        SELECT
+            (SELECT name_runner FROM last_5v) AS name_5v,
+            (SELECT count(*)
+             FROM details_protocol dp
+             JOIN list_all_events e USING (name_point, date_event)
+             WHERE dp.user_id = CAST(:uid_5v AS TEXT)
+               AND e.is_test = false) AS runs_5v,
+            (SELECT club FROM list_clubs WHERE user_id = CAST(:uid_5v AS TEXT) LIMIT 1) AS club_5v,
+            (SELECT actual_name_runner FROM pr) AS pr_actual_name,
+            (SELECT name_runner FROM pr) AS pr_name,
+            (SELECT count(*)
+             FROM parkrun_details_protocol
+             WHERE user_id = CAST(:pr_id AS TEXT)) AS runs_pr,
+            (SELECT name_runner FROM s95) AS name_s95,
+            (SELECT count(*)
+             FROM s95_details_protocol
+             WHERE user_id = CAST(:s95_id AS TEXT)) AS runs_s95
+    """
+    params = {
+        "uid_5v": uid_str(uid_5v) if uid_5v else None,
+        "pr_id": uid_str(parkrun_user_id) if parkrun_user_id else None,
+        "s95_id": uid_str(s95_id) if s95_id else None,
+        "s95_digits": _digits_only(s95_id) or None,
+    }
+    async with engine.begin() as conn:
+        row = (await conn.execute(text(sql), params)).mappings().first()
+    return dict(row) if row else {}
@@ -1,3 +1,4 @@
+import asyncio
 import json
 from datetime import datetime
 from pathlib import Path
@@ -11,7 +12,7 @@ from bs4 import BeautifulSoup
 from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 
-from db import get_january_subscribed_tg_ids
+from db import get_january_subscribed_tg_ids, dispose_engine
 
 
 date_start = datetime.now()
@@ -46,6 +47,14 @@ engine = sa.create_engine(credential)
 # --- Служебные функции ---
 
 
+async def load_january_targets() -> list[int]:
+    """Подписчики уведомлений 1 января (асинхронный слой БД бота), пул закрываем сразу после запроса."""
+    try:
+        return await get_january_subscribed_tg_ids()
+    finally:
+        await dispose_engine()
+
+
 def add_update_table(engine_, table_name: str, upd_time: datetime):
     """Логируем время обновления таблицы."""
     Session = sessionmaker(bind=engine_)
@@ -332,7 +341,7 @@ if changes:
     print("Есть изменения, отправляю сообщение в Telegram...")
     print(msg_text)  # на всякий случай выводим в консоль
 
-    targets = get_january_subscribed_tg_ids()
+    targets = asyncio.run(load_january_targets())
 
     for tg_id in targets:
         send_telegram_message(tg_token, tg_id, msg_text)
@@ -346,7 +355,7 @@ if changes and admin_chat_ids:
         "📊 Отчёт по рассылке уведомлений 1 января",
         "",
         f"Изменений в стартах: {len(changes)}",
-        f"Подписчиков (по БД): {len(get_january_subscribed_tg_ids())}",
+        f"Подписчиков (по БД): {len(targets)}",
         f"Сообщений отправлено (попыток): {sent_count}",
     ]
     summary_text = "\n".join(summary_lines)
@@ -3,17 +3,27 @@ import link_handler
 import parse_last_running as plr
 import parse_protocol as pp
 import parse_table_protocols_in_park as ptpp
-from update_protocols import update_data_protocols
+import http_fetch
+from update_protocols import update_data_protocols, DETAILS_PROTOCOL_KEY_TYPES, DETAILS_VOL_KEY_TYPES
+from durations import encode_durations
+from categories import categorize
+from frame_diff import diff_rows
 
 import pandas as pd
+import hashlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 import sys
 import os
-import time
-import random
 from tqdm import tqdm
 
-def check_new_protocols(credential):
-    """Получаем данные протоколов, которые можно внести в БД"""
+def fetch_latest_page():
+    """Страница последних забегов с признаком «не менялась с прошлой успешной обработки»."""
+    return http_fetch.fetch_page(plr.LATEST_URL)
+
+def check_new_protocols(credential, html=None):
+    """Получаем данные протоколов, которые можно внести в БД.
+    html — уже скачанная страница последних забегов (иначе качаем сами)."""
     engine = db.db_connect(credential)
     df = db.get_table(engine, 'list_all_events', 'index_event, name_point, date_event, link_event, is_test')
     df['link_point'] = df['link_event'].apply(link_handler.main_link_event)
@@ -21,7 +31,7 @@ def check_new_protocols(credential):
     db_data = df[['index_event', 'name_point', 'date_event']].copy()
 
     # Парсим последние протоколы
-    last_event = plr.transform_df_last_event(plr.last_event_parse())
+    last_event = plr.transform_df_last_event(plr.last_event_parse(html))
 
     # Формируем таблицу для сравнения
     compare_event = last_event[['index_event', 'name_point', 'date_event']].copy()
@@ -85,22 +95,13 @@ def check_new_protocols(credential):
 
     # сохраняем исходный df с сайта и получаем аналогичный из БД, чтобы их сравнить
     for_find_dif = last_event[column_order]
-    frames = []
-
-    for _, row in for_find_dif.iterrows():
-        condition = [{'name_point': row['name_point']}, {'date_event': row['date_event']}]
-        temp_now_protocol = db.get_inf_with_condition(engine, 'list_all_events', condition)
-
-        if temp_now_protocol is None:
-            continue
 
-        if not temp_now_protocol.empty and not temp_now_protocol.isna().all(axis=None):
-            frames.append(temp_now_protocol)
-
-    # Объединяем один раз — без предупреждений и быстрее
-    if frames:
-        now_db_last_protocols = pd.concat(frames, ignore_index=True)
-    else:
+    # Текущие строки list_all_events по всем паркам со страницы — одним запросом
+    now_db_last_protocols = db.get_by_keys(
+        engine, 'list_all_events', for_find_dif,
+        {'name_point': 'text', 'date_event': 'timestamp'}
+    )
+    if now_db_last_protocols is None or now_db_last_protocols.empty:
         now_db_last_protocols = pd.DataFrame()
 
     # Удаляем служебные колонки, если они есть
@@ -113,7 +114,7 @@ def get_list_protocol(new_data):
     """
     В цикле проходимся по каждой строке df со ссылками на протоколы,
     парсим сами протоколы и собираем это в единую таблицу.
-    После каждой итерации добавляется случайная задержка от 10 до 20 секунд.
+    Частоту запросов к сайту регулирует ограничитель хоста в http_fetch.
     """
     run_columns = [
         'name_point', 'date_event', 'name_runner', 'link_runner', 'user_id',
@@ -143,10 +144,6 @@ def get_list_protocol(new_data):
             f'{row["count_runners"]} участников, {row["count_vol"]} волонтеров'
         )
 
-        delay = random.uniform(10, 20)
-        print(f'Пауза {delay:.1f} сек перед следующим протоколом...')
-        time.sleep(delay)
-
     data_protocols = pd.concat(run_frames, ignore_index=True) if run_frames else pd.DataFrame(columns=run_columns)
     data_protocol_vol = pd.concat(vol_frames, ignore_index=True) if vol_frames else pd.DataFrame(columns=vol_columns)
 
@@ -173,7 +170,7 @@ def add_new_protocols(credential, new_data, data_protocols, data_protocol_vol):
     total_vols = 0
 
     # Пройдёмся по каждому протоколу отдельно
-    for _, row in new_data.iterrows():
+    for index, row in new_data.iterrows():
         name_point = row["name_point"]
         date_event = pd.to_datetime(row["date_event"])
 
@@ -207,7 +204,7 @@ def add_new_protocols(credential, new_data, data_protocols, data_protocol_vol):
             to_add_vol = vol_slice
 
         # Строка для list_all_events — один протокол = одна строка
-        different_list_of_protocols = row.to_frame().T
+        different_list_of_protocols = new_data.loc[[index]]
 
         # 3) Один вызов update_data_protocols → одна транзакция на три таблицы
         update_data_protocols(
@@ -228,7 +225,12 @@ def add_new_protocols(credential, new_data, data_protocols, data_protocol_vol):
     )
 
 def get_list_all_protocol(credential):
-    """Собирает данные со страниц всех протоколов каждого парка + получает из БД аналогичную таблицу."""
+    """
+    Собирает данные со страниц всех протоколов каждого парка + получает из БД аналогичную таблицу.
+    Страницы, не менявшиеся с прошлой успешной сверки, не разбираются и в сравнение не попадают.
+    :return: (таблица с сайта, таблица из БД, {name_point: Page} разобранных страниц) —
+             страницы отмечаются обработанными после записи отличий (mark_pages_processed)
+    """
     engine = db.db_connect(credential)
 
     request = '''
@@ -239,32 +241,47 @@ def get_list_all_protocol(credential):
     '''
     result = db.execute_request(engine, request)
 
-    where_conditions = []
-    for _, row in result.iterrows():
-        value = row['name_point']
-        where_conditions.append(f"name_point ='{value}'")
-    where_clause = " OR ".join(where_conditions)
-
-    request_now = f'''
+    request_now = '''
     SELECT list_all_events.*
     FROM list_all_events
     JOIN general_location gl USING (name_point)
-    WHERE is_pause = false AND {where_clause}
+    WHERE is_pause = false AND name_point = ANY(:name_points)
     '''
 
-    table = db.execute_request(engine, request_now)
+    name_points = result['name_point'].astype(str).unique().tolist()
+    table = db.execute_request(engine, request_now, {"name_points": name_points})
     table = table.drop(columns=['updated_at'])
 
     protocol_frames = []
     skipped = []
+    parsed_pages = {}
+    unchanged = 0
 
     count = len(result)
     show_progress = sys.stdout.isatty() or os.environ.get("PYCHARM_HOSTED") == "1"
 
-    for _, row in tqdm(result.iterrows(), total=count, disable=not show_progress):
-        link = link_handler.link_all_result_event(row['link_point'])
+    # Качаем все страницы /results/all/ пачкой: паузы между запросами
+    # соблюдает бюджет хоста в http_fetch, ожидание ответов перекрывается
+    links = [link_handler.link_all_result_event(link_point) for link_point in result['link_point']]
+    pages = http_fetch.fetch_pages(links, allow_missing=True)
+
+    for (_, row), link, page in tqdm(zip(result.iterrows(), links, pages), total=count, disable=not show_progress):
+        if isinstance(page, Exception):
+            print(f"⚠️ Не удалось получить {link}: {page}")
+            skipped.append(row["name_point"])
+            continue
+
+        if page is None:
+            print(f"⚠️ 404: страница протоколов не найдена, пропускаем: {link}")
+            skipped.append(row["name_point"])
+            continue
+
+        # Страница побайтно совпадает с уже сверенной → строки парка в БД актуальны
+        if page.unchanged:
+            unchanged += 1
+            continue
 
-        raw = ptpp.list_protocols_in_park(link)
+        raw = ptpp.list_protocols_in_park(link, page.html)
         if raw.empty:
             skipped.append(row["name_point"])
             continue
@@ -272,9 +289,7 @@ def get_list_all_protocol(credential):
         all_point_protocol = ptpp.transform_df_list_protocol(raw)
         if all_point_protocol is not None and not all_point_protocol.empty:
             protocol_frames.append(all_point_protocol)
-
-        delay = random.uniform(10, 20)
-        time.sleep(delay)
+            parsed_pages[row["name_point"]] = page
 
     empty_df = pd.concat(protocol_frames, ignore_index=True) if protocol_frames else pd.DataFrame()
 
@@ -282,8 +297,17 @@ def get_list_all_protocol(credential):
         print(f"⚠️ Пропущены парки (не удалось получить список протоколов): {len(skipped)}")
         print(", ".join(skipped))
 
+    if unchanged:
+        print(f'Страниц без изменений с прошлой сверки: {unchanged}')
+
     print('Спарсили списки всех протоколов для сравнения')
-    return empty_df, table
+    return empty_df, table, parsed_pages
+
+def mark_pages_processed(pages, failed_points=()):
+    """Отмечает страницы парков сверенными, кроме парков, где обновление протокола упало."""
+    for name_point, page in pages.items():
+        if name_point not in failed_points:
+            page.mark_processed()
 
 def find_dif_list_protocol(list_site_protocols, now_table):
     """
@@ -330,52 +354,95 @@ def find_dif_list_protocol(list_site_protocols, now_table):
 
     return diff_right.sort_values(by=['date_event', 'name_point'], ascending=True).reset_index(drop=True)
 
+RUN_COLUMNS = [
+    'name_point', 'date_event', 'name_runner', 'link_runner', 'user_id',
+    'position', 'finish_time', 'age_category', 'status_runner'
+]
+VOL_COLUMNS = [
+    'name_point', 'date_event', 'name_runner', 'link_runner', 'user_id', 'vol_role'
+]
+PROTOCOL_KEY_TYPES = {'name_point': 'text', 'date_event': 'timestamp'}
+
 def get_now_protocols(credential, different_list_of_protocols):
-    """Собирает 2 df с текущей информацией из БД по выбранным протоколам."""
+    """
+    Собирает 2 df с текущей информацией из БД по выбранным протоколам.
+    Все протоколы выгружаются двумя запросами (details_protocol и details_vol)
+    с ключами (name_point, date_event) в виде массивов-параметров.
+    """
     engine = db.db_connect(credential)
 
-    run_columns = [
-        'name_point', 'date_event', 'name_runner', 'link_runner', 'user_id',
-        'position', 'finish_time', 'age_category', 'status_runner'
-    ]
-    vol_columns = [
-        'name_point', 'date_event', 'name_runner', 'link_runner', 'user_id', 'vol_role'
-    ]
-
-    result_run = pd.DataFrame(columns=run_columns)
-    result_vol = pd.DataFrame(columns=vol_columns)
+    result_run = db.get_by_keys(
+        engine, 'details_protocol', different_list_of_protocols, PROTOCOL_KEY_TYPES,
+        columns=', '.join(f't.{col}' for col in RUN_COLUMNS)
+    )
+    result_vol = db.get_by_keys(
+        engine, 'details_vol', different_list_of_protocols, PROTOCOL_KEY_TYPES,
+        columns=', '.join(f't.{col}' for col in VOL_COLUMNS)
+    )
 
-    run_frames = []
-    vol_frames = []
+    return _now_frames(result_run, result_vol)
 
-    for _, row in different_list_of_protocols.iterrows():
-        condition = [
-            {'name_point': row['name_point']},
-            {'date_event': row['date_event']}
-        ]
+def get_now_protocol(engine, name_point, date_event):
+    """
+    Текущие данные ОДНОГО протокола из БД для сверки по одному протоколу:
+    подготовленные запросы DB_handler.get_protocol_details вместо JOIN с unnest.
+    """
+    result = db.get_protocol_details(engine, name_point, date_event)
+    if result is None:
+        raise RuntimeError(f'Не удалось прочитать протокол {name_point} / {date_event} из БД')
+    return _now_frames(*result)
+
+def _now_frames(result_run, result_vol):
+    if result_run is None:
+        result_run = pd.DataFrame(columns=RUN_COLUMNS)
+    if result_vol is None:
+        result_vol = pd.DataFrame(columns=VOL_COLUMNS)
+
+    # те же категории (общий словарь), что и у кадров с сайта, — сравнение идёт по кодам
+    return categorize(result_run.reindex(columns=RUN_COLUMNS)), categorize(result_vol.reindex(columns=VOL_COLUMNS))
+
+def split_by_protocol(df):
+    """Раскладывает строки многих протоколов в словарь {(name_point, date_event): df}"""
+    if df is None or df.empty:
+        return {}
+    dates = pd.to_datetime(df['date_event'])
+    return {
+        (name_point, pd.Timestamp(date_event)): group.reset_index(drop=True)
+        for (name_point, date_event), group in df.groupby([df['name_point'], dates], sort=False, observed=True)
+    }
 
-        temp_result_run = db.get_inf_with_condition(engine, 'details_protocol', condition)
-        temp_result_vol = db.get_inf_with_condition(engine, 'details_vol', condition)
+def get_now_protocols_grouped(credential, protocols):
+    """
+    Выгрузка текущих протоколов из БД двумя запросами с раскладкой по протоколам.
 
-        if temp_result_run is not None and not temp_result_run.empty and not temp_result_run.isna().all(axis=None):
-            temp_result_run = temp_result_run.drop(columns=['updated_at'], errors='ignore')
-            temp_result_run = temp_result_run.reindex(columns=run_columns)
-            run_frames.append(temp_result_run)
+    :param protocols: DataFrame с колонками name_point, date_event
+    :return: словарь {(name_point, date_event): (df_run, df_vol)};
+             для протоколов, которых нет в БД, — пустые df с нужными колонками
+    """
+    result_run, result_vol = get_now_protocols(credential, protocols)
 
-        if temp_result_vol is not None and not temp_result_vol.empty and not temp_result_vol.isna().all(axis=None):
-            temp_result_vol = temp_result_vol.drop(columns=['updated_at'], errors='ignore')
-            temp_result_vol = temp_result_vol.reindex(columns=vol_columns)
-            vol_frames.append(temp_result_vol)
+    run_groups = split_by_protocol(result_run)
+    vol_groups = split_by_protocol(result_vol)
 
-        # один concat в конце
-        result_run = pd.concat(run_frames, ignore_index=True) if run_frames else pd.DataFrame(columns=run_columns)
-        result_vol = pd.concat(vol_frames, ignore_index=True) if vol_frames else pd.DataFrame(columns=vol_columns)
+    grouped = {}
+    for name_point, date_event in protocols[['name_point', 'date_event']].itertuples(index=False):
+        key = (name_point, pd.Timestamp(date_event))
+        grouped[key] = (
+            run_groups.get(key, pd.DataFrame(columns=RUN_COLUMNS)),
+            vol_groups.get(key, pd.DataFrame(columns=VOL_COLUMNS)),
+        )
+    return grouped
 
-    return result_run, result_vol
 
+def find_dif_protocol(actual_df, not_actual_df, key_columns=None):
+    """
+    Ищет отличия в двух датафреймах и возвращает df для удаления и добавления.
+    Строки сравниваются по 64-битным хэшам (frame_diff) как мультимножества:
+    повторяющиеся строки учитываются с кратностью.
 
-def find_dif_protocol(actual_df, not_actual_df):
-    """Ищет отличия в двух датафреймах и возвращает df для добавления и удаления."""
+    :param key_columns: ключ удаления в БД; строки сайта с удаляемыми ключами
+                        добавляются заново (см. frame_diff.diff_rows)
+    """
     actual_df = actual_df.copy()
     not_actual_df = not_actual_df.copy()
 
@@ -397,21 +464,108 @@ def find_dif_protocol(actual_df, not_actual_df):
             f"not_actual_df columns={list(not_actual_df.columns)}"
         )
 
-    actual_df = actual_df.reindex(columns=common_cols).copy()
-    not_actual_df = not_actual_df.reindex(columns=common_cols).copy()
+    if key_columns is not None:
+        key_columns = [col for col in key_columns if col in common_cols]
+    return diff_rows(actual_df, not_actual_df, common_cols, key_columns)
+
+def protocol_fingerprint(df_run, df_vol):
+    """
+    Отпечаток протокола: sha256 от нормализованных таблиц бегунов и волонтёров.
+    Порядок строк и пропуски (None/NaN/NA) на результат не влияют.
+    """
+    run_columns = [
+        'name_point', 'date_event', 'name_runner', 'link_runner', 'user_id',
+        'position', 'finish_time', 'age_category', 'status_runner'
+    ]
+    vol_columns = [
+        'name_point', 'date_event', 'name_runner', 'link_runner', 'user_id', 'vol_role'
+    ]
+
+    parts = []
+    for df, columns in ((df_run, run_columns), (df_vol, vol_columns)):
+        if df is None or df.empty:
+            parts.append('')
+            continue
+        # длительности в виде hh:mm:ss — отпечатки совпадают с посчитанными по datetime.time
+        norm = encode_durations(df.reindex(columns=columns))
+        norm = norm.astype(object).where(norm.notna(), '').astype(str)
+        norm = norm.sort_values(columns).reset_index(drop=True)
+        parts.append(norm.to_csv(index=False))
+
+    return hashlib.sha256('\x1e'.join(parts).encode('utf-8')).hexdigest()
 
-    diff_left = not_actual_df.merge(actual_df, on=common_cols, how='left', indicator=True)
-    diff_right = not_actual_df.merge(actual_df, on=common_cols, how='right', indicator=True)
+def parse_protocol_page(link_event, html):
+    """
+    Разбор скачанной страницы протокола и его отпечаток.
+    Функция верхнего уровня — её можно отдавать в пул процессов.
+
+    :return: (actual_run, actual_vol, protocol_hash)
+    """
+    actual_run, actual_vol = pp.main_parse(link_event, html)
+    return actual_run, actual_vol, protocol_fingerprint(actual_run, actual_vol)
 
-    for_delete = diff_left[diff_left['_merge'] != 'both'].drop(columns=['_merge']).reset_index(drop=True)
-    to_add = diff_right[diff_right['_merge'] != 'both'].drop(columns=['_merge']).reset_index(drop=True)
+def diff_details_protocol(actual_run, actual_vol, now_run, now_vol):
+    """
+    Отличия деталей одного протокола (сайт против БД).
+    :return: for_removal_runner, to_add_runner, for_removal_vol, to_add_vol
+    """
+    for_removal_runner, to_add_runner = find_dif_protocol(actual_run, now_run, list(DETAILS_PROTOCOL_KEY_TYPES))
 
-    return for_delete, to_add
+    # учёт случая отсутствия блока волонтёров на сайте
+    if actual_vol is None or actual_vol.empty:
+        actual_vol_for_compare = pd.DataFrame(columns=VOL_COLUMNS)
+    else:
+        actual_vol_for_compare = actual_vol.copy()
+
+    for_removal_vol, to_add_vol = find_dif_protocol(actual_vol_for_compare, now_vol, list(DETAILS_VOL_KEY_TYPES))
+    return for_removal_runner, to_add_runner, for_removal_vol, to_add_vol
+
+def _concat_details(frames, columns):
+    frames = [df.reindex(columns=columns) for df in frames if df is not None and not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+def diff_protocols(site_frames, db_frames):
+    """
+    Отличия деталей сразу многих протоколов (сайт против БД) за один векторный проход.
+    name_point и date_event входят в сравниваемые строки и в ключи удаления,
+    поэтому общий diff по склеенным таблицам совпадает с диффами по каждому протоколу.
+
+    :param site_frames: пары (actual_run, actual_vol) с сайта — по одной на протокол
+                        (actual_vol может быть None, если блока волонтёров нет)
+    :param db_frames: (now_run, now_vol) — текущие детали ТЕХ ЖЕ протоколов из БД,
+                      например из get_now_protocols одним чтением на пачку
+    :return: (changes, plan)
+             changes — {(name_point, date_event): (for_removal_runner, to_add_runner,
+                        for_removal_vol, to_add_vol)} только для изменившихся протоколов;
+             plan — те же четыре таблицы по всей пачке для одной транзакции update_data_protocols
+    """
+    site_frames = list(site_frames)
+    actual_run = _concat_details([run for run, _ in site_frames], RUN_COLUMNS)
+    actual_vol = _concat_details([vol for _, vol in site_frames], VOL_COLUMNS)
+    now_run, now_vol = db_frames
+    now_run = _concat_details([now_run], RUN_COLUMNS)
+    now_vol = _concat_details([now_vol], VOL_COLUMNS)
+
+    for_removal_runner, to_add_runner = diff_rows(actual_run, now_run, RUN_COLUMNS, list(DETAILS_PROTOCOL_KEY_TYPES))
+    for_removal_vol, to_add_vol = diff_rows(actual_vol, now_vol, VOL_COLUMNS, list(DETAILS_VOL_KEY_TYPES))
+    plan = (for_removal_runner, to_add_runner, for_removal_vol, to_add_vol)
+
+    groups = [split_by_protocol(df) for df in plan]
+    changes = {}
+    for key in dict.fromkeys(key for group in groups for key in group):
+        changes[key] = tuple(
+            group.get(key, pd.DataFrame(columns=df.columns))
+            for group, df in zip(groups, plan)
+        )
+    return changes, plan
 
 def compare_and_update_single_protocol(credential, protocol_row, update_summary_row=False):
     """
     Сравнивает ОДИН протокол:
     - парсит сайт
+    - если отпечаток протокола совпал с list_all_events.protocol_hash -> БД не читает
     - получает текущие данные из БД
     - ищет отличия
     - если есть изменения -> записывает их
@@ -434,31 +588,58 @@ def compare_and_update_single_protocol(credential, protocol_row, update_summary_
 
     print(f'Проверяем протокол: {name_point} / {date_event.date()}')
 
-    # 1. Парсим актуальный протокол с сайта
-    actual_run, actual_vol = pp.main_parse(link_event)
+    # 1. Скачиваем страницу протокола (условный запрос по дисковому кэшу)
+    page = http_fetch.fetch_page(link_event)
 
-    # 2. Получаем текущие данные этого же протокола из БД
-    this_proto = pd.DataFrame([{
-        "name_point": name_point,
-        "date_event": date_event
-    }])
-
-    now_run, now_vol = get_now_protocols(credential, this_proto)
-
-    # 3. Сравнение бегунов
-    for_removal_runner, to_add_runner = find_dif_protocol(actual_run, now_run)
+    # Страница побайтно совпадает с уже сверенной ранее → детали не парсим и не сравниваем
+    if page.unchanged and not update_summary_row:
+        db.mark_protocol_checked(engine, name_point, date_event)
+        print(f'Страница не менялась с прошлой сверки: {name_point} / {date_event.date()}')
+        return {
+            "name_point": name_point,
+            "date_event": date_event,
+            "status": "no_changes"
+        }
 
-    # 4. Сравнение волонтёров
-    if actual_vol is None or actual_vol.empty:
-        actual_vol_for_compare = pd.DataFrame(
-            columns=["name_point", "date_event", "name_runner", "link_runner", "user_id", "vol_role"]
-        )
+    protocol_hash = None
+    if page.unchanged:
+        empty_run = pd.DataFrame()
+        for_removal_runner, to_add_runner = empty_run, empty_run
+        for_removal_vol, to_add_vol = empty_run, empty_run
     else:
-        actual_vol_for_compare = actual_vol.copy()
+        # 2. Парсим актуальный протокол с сайта
+        actual_run, actual_vol, protocol_hash = parse_protocol_page(link_event, page.html)
+
+        # Отпечаток совпал с сохранённым при прошлой сверке → БД не читаем и не сравниваем
+        stored_hash = protocol_row.get("protocol_hash")
+        if "protocol_hash" not in protocol_row:
+            stored_hash = db.get_protocol_hash(engine, name_point, date_event)
+        fingerprint_matches = isinstance(stored_hash, str) and stored_hash == protocol_hash
+
+        if fingerprint_matches and not update_summary_row:
+            db.mark_protocol_checked(engine, name_point, date_event)
+            page.mark_processed()
+            print(f'Отпечаток протокола не изменился: {name_point} / {date_event.date()}')
+            return {
+                "name_point": name_point,
+                "date_event": date_event,
+                "status": "no_changes"
+            }
 
-    for_removal_vol, to_add_vol = find_dif_protocol(actual_vol_for_compare, now_vol)
+        if fingerprint_matches:
+            empty_run = pd.DataFrame()
+            for_removal_runner, to_add_runner = empty_run, empty_run
+            for_removal_vol, to_add_vol = empty_run, empty_run
+        else:
+            # 3. Получаем текущие данные этого же протокола из БД (подготовленные запросы, одно соединение)
+            now_run, now_vol = get_now_protocol(engine, name_point, date_event)
+
+            # 4-5. Сравнение бегунов и волонтёров
+            for_removal_runner, to_add_runner, for_removal_vol, to_add_vol = diff_details_protocol(
+                actual_run, actual_vol, now_run, now_vol
+            )
 
-    # 5. Нужно ли обновлять строку list_all_events
+    # 6. Нужно ли обновлять строку list_all_events
     different_list_of_protocols = pd.DataFrame()
 
     if update_summary_row:
@@ -484,7 +665,7 @@ def compare_and_update_single_protocol(credential, protocol_row, update_summary_
             if not site_summary.equals(current_summary):
                 different_list_of_protocols = pd.DataFrame([protocol_row])
 
-    # 6. Если есть изменения — записываем
+    # 7. Если есть изменения — записываем
     has_changes = any([
         not for_removal_runner.empty,
         not to_add_runner.empty,
@@ -503,9 +684,11 @@ def compare_and_update_single_protocol(credential, protocol_row, update_summary_
             different_list_of_protocols,
             checked_protocol={
                 "name_point": name_point,
-                "date_event": date_event
+                "date_event": date_event,
+                "protocol_hash": protocol_hash
             }
         )
+        page.mark_processed()
 
         print(
             f'Обновили протокол {name_point} / {date_event.date()}: '
@@ -519,8 +702,9 @@ def compare_and_update_single_protocol(credential, protocol_row, update_summary_
             "status": "updated"
         }
 
-    # 7. Если изменений нет — просто фиксируем успешную проверку
-    db.mark_protocol_checked(engine, name_point, date_event)
+    # 8. Если изменений нет — просто фиксируем успешную проверку
+    db.mark_protocol_checked(engine, name_point, date_event, protocol_hash)
+    page.mark_processed()
 
     print(f'Нет изменений: {name_point} / {date_event.date()}')
 
@@ -530,6 +714,196 @@ def compare_and_update_single_protocol(credential, protocol_row, update_summary_
         "status": "no_changes"
     }
 
+def iter_fetched_protocols(protocol_rows, max_in_flight=8, parse_workers=None, fetcher=None):
+    """
+    Стадии «скачать» и «разобрать» конвейера сверки протоколов.
+
+    Страницы качаются в потоках через http_fetch (частоту и параллельность запросов
+    к сайту ограничивает бюджет хоста), разбор идёт в пуле процессов.
+    Одновременно в работе не больше max_in_flight протоколов, поэтому
+    память не растёт, даже если БД-стадия отстаёт.
+
+    :param protocol_rows: список словарей (строки list_all_events) с name_point, date_event, link_event
+    :param max_in_flight: сколько протоколов одновременно качается/разбирается
+    :param parse_workers: число процессов для разбора (по умолчанию — по числу CPU)
+    :param fetcher: http_fetch.AsyncFetcher (по умолчанию общий клиент)
+    :return: генератор (row, future) в порядке готовности;
+             future.result() -> (page, parsed), parsed = None для неизменившейся страницы
+    """
+    fetcher = fetcher or http_fetch.get_fetcher()
+    rows = iter(protocol_rows)
+    in_flight = {}
+
+    # пул разбора создаётся до потоков загрузки, а процессы запускает forkserver:
+    # fork многопоточного процесса (пул БД, сессии cloudscraper, блокировки) может подвесить дочерний
+    with ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("forkserver")) as parse_pool, \
+            ThreadPoolExecutor(max_workers=max_in_flight) as fetch_pool:
+
+        def fetch_and_parse(row):
+            page = fetcher.fetch_page_sync(row["link_event"])
+            if page.unchanged:
+                return page, None
+            return page, parse_pool.submit(parse_protocol_page, row["link_event"], page.html).result()
+
+        def start_next():
+            row = next(rows, None)
+            if row is not None:
+                in_flight[fetch_pool.submit(fetch_and_parse, row)] = row
+
+        for _ in range(max_in_flight):
+            start_next()
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                row = in_flight.pop(future)
+                start_next()
+                yield row, future
+
+def compare_and_update_protocols_batch(credential, items):
+    """
+    Стадии «сравнить» и «записать» конвейера для пачки уже скачанных и разобранных протоколов.
+    - сохранённые отпечатки берутся из строк list_all_events (protocol_hash)
+    - текущие детали всех изменившихся протоколов читаются двумя запросами
+      и сравниваются с сайтом одним вызовом diff_protocols
+    - все изменения пачки (план записи diff_protocols) пишутся одной транзакцией update_data_protocols,
+      а при её ошибке — по одному протоколу, чтобы один сбой не ронял всю пачку
+    - last_check_at без изменений отмечается одним executemany
+
+    :param items: список кортежей (row, page, parsed) из iter_fetched_protocols
+    :return: список dict с name_point, date_event, status ("updated" / "no_changes" / "error")
+    """
+    engine = db.db_connect(credential)
+    results = []
+    checked = []      # без изменений: (protocol, page)
+    to_compare = []   # (protocol, page, actual_run, actual_vol)
+
+    for row, page, parsed in items:
+        protocol = {
+            "name_point": row["name_point"],
+            "date_event": pd.to_datetime(row["date_event"]),
+            "protocol_hash": None
+        }
+        if parsed is None:
+            checked.append((protocol, page))
+            continue
+
+        actual_run, actual_vol, protocol_hash = parsed
+        protocol["protocol_hash"] = protocol_hash
+        stored_hash = row.get("protocol_hash")
+        if isinstance(stored_hash, str) and stored_hash == protocol_hash:
+            checked.append((protocol, page))
+            continue
+
+        # строки сайта должны принадлежать тому же протоколу, что и строка БД:
+        # иначе diff удалил бы детали протокола из БД и записал их под другим ключом
+        key = (protocol["name_point"], protocol["date_event"])
+        site_keys = {
+            site_key
+            for df in (actual_run, actual_vol) if df is not None and not df.empty
+            for site_key in split_by_protocol(df)
+        }
+        if site_keys - {key}:
+            print(f'Протокол {key[0]} / {key[1].date()}: на странице другой ключ протокола {sorted(site_keys - {key})}, пропускаем')
+            results.append({"name_point": key[0], "date_event": key[1], "status": "error"})
+            continue
+        to_compare.append((protocol, page, actual_run, actual_vol))
+
+    changed = []  # (protocol, page, diff)
+    plan = None
+    if to_compare:
+        # одно чтение БД и один векторный diff на всю пачку
+        keys = pd.DataFrame([protocol for protocol, *_ in to_compare])[["name_point", "date_event"]]
+        changes, plan = diff_protocols(
+            [(actual_run, actual_vol) for _, _, actual_run, actual_vol in to_compare],
+            get_now_protocols(credential, keys)
+        )
+
+        # изменения раскладываем по ключам самого diff: каждая строка плана должна
+        # относиться к протоколу пачки, иначе её запись не попала бы ни в отчёт, ни в mark_processed
+        compared = {(protocol["name_point"], protocol["date_event"]): (protocol, page) for protocol, page, *_ in to_compare}
+        unknown = [key for key in changes if key not in compared]
+        if unknown:
+            raise RuntimeError(f'В изменениях пачки протоколы не из пачки: {unknown}')
+
+        for key, (protocol, page) in compared.items():
+            if key in changes:
+                changed.append((protocol, page, changes[key]))
+            else:
+                checked.append((protocol, page))
+
+    def write(batch, frames=None):
+        if frames is None:
+            frames = [pd.concat([diff[i] for _, _, diff in batch], ignore_index=True) for i in range(4)]
+        for_removal_runner, to_add_runner, for_removal_vol, to_add_vol = frames
+        update_data_protocols(
+            credential,
+            for_removal_runner,
+            for_removal_vol,
+            to_add_runner,
+            to_add_vol,
+            checked_protocol=[protocol for protocol, _, _ in batch]
+        )
+
+    if changed:
+        batch_error = None
+        try:
+            write(changed, plan)
+        except Exception as e:
+            batch_error = str(e)
+
+        if batch_error is None:
+            written = changed
+        else:
+            # повторы — уже после выхода из except: транзакция пачки к этому моменту откатана
+            print(f'Ошибка пакетной записи ({len(changed)} протоколов), пишем по одному: {batch_error}')
+            written = []
+            for item in changed:
+                protocol = item[0]
+                try:
+                    write([item])
+                    written.append(item)
+                except Exception as e:
+                    print(f'Ошибка записи протокола {protocol["name_point"]} / {protocol["date_event"].date()}: {e}')
+                    results.append({
+                        "name_point": protocol["name_point"],
+                        "date_event": protocol["date_event"],
+                        "status": "error"
+                    })
+
+        for protocol, page, diff in written:
+            page.mark_processed()
+            for_removal_runner, to_add_runner, for_removal_vol, to_add_vol = diff
+            print(
+                f'Обновили протокол {protocol["name_point"]} / {protocol["date_event"].date()}: '
+                f'удалили бегунов {len(for_removal_runner)}, добавили бегунов {len(to_add_runner)}, '
+                f'удалили волонтёров {len(for_removal_vol)}, добавили волонтёров {len(to_add_vol)}'
+            )
+            results.append({
+                "name_point": protocol["name_point"],
+                "date_event": protocol["date_event"],
+                "status": "updated"
+            })
+
+    if checked:
+        try:
+            db.mark_protocols_checked(engine, [protocol for protocol, _ in checked])
+            status = "no_changes"
+        except Exception as e:
+            # записанные выше изменения уже в results со статусом "updated" — их не теряем
+            print(f'Ошибка отметки проверки {len(checked)} протоколов: {e}')
+            status = "error"
+        for protocol, page in checked:
+            if status == "no_changes":
+                page.mark_processed()
+            results.append({
+                "name_point": protocol["name_point"],
+                "date_event": protocol["date_event"],
+                "status": status
+            })
+
+    return results
+
 def get_link_protocols_for_update(
     credential,
     count_last_protocol=0,
@@ -552,49 +926,38 @@ def get_link_protocols_for_update(
     if name_point is None:
         name_point = []
 
-    where_parts = []
-
-    if len(name_point) != 0:
-        result_list = [{'name_point': point} for point in name_point]
-        condition = db.create_condition(result_list, 'OR')
-        where_parts.append(f'({condition})')
+    filters = {'name_point': list(name_point)} if len(name_point) != 0 else {}
+    where_clause, params = db.build_where(filters)
 
     if oldest_first_limit is not None:
-        where_clause = ''
-        if where_parts:
-            where_clause = 'WHERE ' + ' AND '.join(where_parts)
-
         request = f'''
 SELECT *
 FROM list_all_events
-{where_clause}
+WHERE {where_clause}
 ORDER BY last_check_at ASC NULLS FIRST, date_event ASC, name_point ASC
-LIMIT {oldest_first_limit};
+LIMIT :limit;
 '''
+        params['limit'] = int(oldest_first_limit)
     else:
         if count_last_protocol > 0:
-            date_filter = f'''
-date_event IN (
+            where_clause += '''
+AND date_event IN (
     SELECT DISTINCT date_event
     FROM list_all_events
     ORDER BY date_event DESC
-    LIMIT {count_last_protocol}
+    LIMIT :count_last_protocol
 )
 '''
-            where_parts.append(date_filter)
-
-        where_clause = ''
-        if where_parts:
-            where_clause = 'WHERE ' + ' AND '.join(where_parts)
+            params['count_last_protocol'] = int(count_last_protocol)
 
         request = f'''
 SELECT *
 FROM list_all_events
-{where_clause};
+WHERE {where_clause};
 '''
 
     engine = db.db_connect(credential)
-    result = db.execute_request(engine, request)
+    result = db.execute_request(engine, request, params)
 
     return result
 
@@ -666,7 +1029,9 @@ def record_or_update_protocol_by_link(credential: str, link: str):
     this_proto = pd.DataFrame([{"name_point": name_point, "date_event": date_event}])
     now_run, now_vol = get_now_protocols(credential, this_proto)              # выгрузка текущих деталей из БД :contentReference[oaicite:6]{index=6}
 
-    for_removal_runner, to_add_runner = find_dif_protocol(final_df_run, now_run)  # дельты бегунов :contentReference[oaicite:7]{index=7}
+    for_removal_runner, to_add_runner = find_dif_protocol(
+        final_df_run, now_run, list(DETAILS_PROTOCOL_KEY_TYPES)
+    )  # дельты бегунов :contentReference[oaicite:7]{index=7}
     # учёт случая отсутствия блока волонтёров на сайте
     if final_df_vol is None:
         actual_vol = pd.DataFrame(columns=now_vol.columns) if not now_vol.empty else pd.DataFrame(
@@ -674,7 +1039,9 @@ def record_or_update_protocol_by_link(credential: str, link: str):
         )
     else:
         actual_vol = final_df_vol
-    for_removal_vol, to_add_vol = find_dif_protocol(actual_vol, now_vol)          # дельты волонтёров :contentReference[oaicite:8]{index=8}
+    for_removal_vol, to_add_vol = find_dif_protocol(
+        actual_vol, now_vol, list(DETAILS_VOL_KEY_TYPES)
+    )  # дельты волонтёров :contentReference[oaicite:8]{index=8}
 
     # Проверить, отличается ли строка list_all_events (если да — заменим)
     need_replace_list = False
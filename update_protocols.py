@@ -1,9 +1,20 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Time, PrimaryKeyConstraint
-from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import sqlalchemy as sa
 import DB_handler as db
 
+# Столбцы, которые пишем в таблицы (updated_at заполняется в БД по умолчанию)
+LIST_EVENTS_COLUMNS = ['index_event', 'name_point', 'date_event', 'link_event', 'is_test',
+                       'count_runners', 'count_vol', 'mean_time', 'best_time_woman', 'best_time_man']
+DETAILS_PROTOCOL_COLUMNS = ['name_point', 'date_event', 'name_runner', 'link_runner', 'user_id',
+                            'position', 'finish_time', 'age_category', 'status_runner']
+DETAILS_VOL_COLUMNS = ['name_point', 'date_event', 'name_runner', 'link_runner', 'user_id', 'vol_role']
+
+# Ключи, по которым удаляются устаревшие строки (delete_by_keys)
+LIST_EVENTS_KEY_TYPES = {'name_point': 'text', 'date_event': 'timestamp'}
+DETAILS_PROTOCOL_KEY_TYPES = {'name_point': 'text', 'date_event': 'timestamp', 'position': 'integer'}
+DETAILS_VOL_KEY_TYPES = {'name_point': 'text', 'date_event': 'timestamp', 'user_id': 'text', 'vol_role': 'text'}
+DETAILS_VOL_NULLABLE_KEYS = ('user_id', 'vol_role')
+
 def update_data_protocols(
     credential,
     for_removal_runner,
@@ -19,172 +30,56 @@ def update_data_protocols(
         different_list_of_protocols = []
     engine = db.db_connect(credential)
     Session = sessionmaker(bind=engine)
-    session = Session()
-
-    if len(different_list_of_protocols) != 0:
-        #удаление с листа протоколов
-        #count = len(different_list_of_protocols)
-        print('Удаляем неактуальные протоколы')
-        #for _, row in tqdm(different_list_of_protocols.iterrows(), total=count):
-        for _, row in different_list_of_protocols.iterrows():
-            list_сondition = [{'name_point': row['name_point']}, {'date_event': row['date_event']}]
-            сondition = db.create_condition(list_сondition, 'AND')
-            request = sa.text(f"""DELETE FROM list_all_events WHERE {сondition};""")
-            session.execute(request)
-
-    #удаление данных из протоколов пробежек
-    #count = len(for_removal_runner)
-    print('Удаляем неактуальные данные из протоколов пробежек')
-    for _, row in for_removal_runner.iterrows():
-        list_сondition_runner = [{'name_point': row['name_point']}, {'date_event': row['date_event']}, {'position': row['position']}]
-        сondition_runner = db.create_condition(list_сondition_runner, 'AND')
-        request_runner = sa.text(f"""   DELETE FROM details_protocol
-                                        WHERE {сondition_runner};""")
-        session.execute(request_runner)
-
-    #удаление данных о волонтерах из протоколов
-    #count = len(for_removal_vol)
-    print('Удаляем неактуальные данные о волонтёрах')
-    for _, row in for_removal_vol.iterrows():
-        list_сondition_vol = [{'name_point': row['name_point']},
-                          {'date_event': row['date_event']},
-                          {'user_id': row['user_id']},
-                          {'vol_role': row['vol_role']}]
-        сondition_vol = db.create_condition(list_сondition_vol, 'AND')
-        request_vol = sa.text(f"""  DELETE FROM details_vol
-                                    WHERE {сondition_vol};""")
-        session.execute(request_vol)
-
-    # Реализуем запись данных в таблицу базы данных
-    # Модель для таблицы list_all_events
-    Base = declarative_base()
 
-    if len(different_list_of_protocols) != 0:
-        class ListEvents(Base):
-            __tablename__ = 'list_all_events'
-
-            index_event = Column(Integer)
-            name_point = Column(String)
-            date_event = Column(DateTime)
-            link_event = Column(String)
-            is_test = Column(Boolean)
-            count_runners = Column(Integer)
-            count_vol = Column(Integer)
-            mean_time = Column(DateTime)
-            best_time_woman = Column(DateTime)
-            best_time_man = Column(DateTime)
-            updated_at = Column(DateTime)
-
-            __table_args__ = (
-                PrimaryKeyConstraint('index_event', 'name_point', 'date_event'),
-            )
-
-        # Преобразуем строки DataFrame в объекты ORM
-        objects_to_insert_list_event = []
-        for _, row in different_list_of_protocols.iterrows():
-            obj = ListEvents(
-                index_event=row['index_event'],
-                name_point=row['name_point'],
-                date_event=row['date_event'],
-                link_event=row['link_event'],
-                is_test=row['is_test'],
-                count_runners=row['count_runners'],
-                count_vol=row['count_vol'],
-                mean_time=row['mean_time'],
-                best_time_woman=row['best_time_woman'],
-                best_time_man=row['best_time_man']
+    # при любой ошибке транзакция откатывается и соединение сразу возвращается в пул:
+    # иначе висящая сессия держала бы блокировки строк, и повторная запись тех же ключей ждала бы её
+    with Session() as session, session.begin():
+        # Удаления — одним запросом на таблицу (DELETE ... USING unnest по массивам ключей)
+        if len(different_list_of_protocols) != 0:
+            #удаление с листа протоколов
+            print('Удаляем неактуальные протоколы')
+            db.delete_by_keys(session, 'list_all_events', different_list_of_protocols, LIST_EVENTS_KEY_TYPES)
+
+        #удаление данных из протоколов пробежек
+        print('Удаляем неактуальные данные из протоколов пробежек')
+        db.delete_by_keys(session, 'details_protocol', for_removal_runner, DETAILS_PROTOCOL_KEY_TYPES)
+
+        #удаление данных о волонтерах из протоколов
+        print('Удаляем неактуальные данные о волонтёрах')
+        db.delete_by_keys(session, 'details_vol', for_removal_vol, DETAILS_VOL_KEY_TYPES,
+                          nullable_keys=DETAILS_VOL_NULLABLE_KEYS)
+
+        # Запись новых данных — потоком COPY в той же транзакции
+        if len(different_list_of_protocols) != 0:
+            print('Записываем обновлённые протоколы')
+            db.copy_df(session, 'list_all_events', different_list_of_protocols, LIST_EVENTS_COLUMNS)
+
+        print('Записываем данные протоколов пробежек')
+        db.copy_df(session, 'details_protocol', to_add_runner, DETAILS_PROTOCOL_COLUMNS)
+
+        print('Записываем данные о волонтёрах')
+        db.copy_df(session, 'details_vol', to_add_vol, DETAILS_VOL_COLUMNS)
+
+        if checked_protocol is not None:
+            # вместе с last_check_at сохраняем отпечаток сверенного протокола (если посчитан);
+            # можно передать один протокол (dict) или пачку (list of dict)
+            checked = checked_protocol if isinstance(checked_protocol, list) else [checked_protocol]
+            session.execute(
+                sa.text("""
+                    UPDATE list_all_events
+                    SET last_check_at = now(), protocol_hash = COALESCE(:protocol_hash, protocol_hash)
+                    WHERE name_point = :name_point
+                      AND date_event = :date_event
+                """),
+                [
+                    {
+                        "name_point": item["name_point"],
+                        "date_event": item["date_event"],
+                        "protocol_hash": item.get("protocol_hash")
+                    }
+                    for item in checked
+                ]
             )
-            objects_to_insert_list_event.append(obj)
-
-        # Запись в базу данных
-        session.bulk_save_objects(objects_to_insert_list_event)
-
-    # Дальше запись в БД протоколов бегунов
-    class DetailsProtocolRun(Base):
-        __tablename__ = 'details_protocol'
-
-        name_point = Column(String)
-        date_event = Column(DateTime)
-        name_runner = Column(String)
-        link_runner = Column(String)
-        user_id = Column(String)
-        position = Column(Integer)
-        finish_time = Column(Time)
-        age_category = Column(String)
-        status_runner = Column(String)
-        updated_at = Column(DateTime)
-
-        __table_args__ = (
-            PrimaryKeyConstraint('name_point', 'date_event', 'position'),
-        )
-
-    # Преобразуем строки DataFrame в объекты ORM
-    objects_to_insert_run = []
-    for _, row in to_add_runner.iterrows():
-        obj = DetailsProtocolRun(
-            name_point=row['name_point'],
-            date_event=row['date_event'],
-            name_runner=row['name_runner'],
-            link_runner=row['link_runner'],
-            user_id=row['user_id'],
-            position=row['position'],
-            finish_time=row['finish_time'],
-            age_category=row['age_category'],
-            status_runner=row['status_runner']
-        )
-        objects_to_insert_run.append(obj)
-
-    # Массивная запись в базу данных
-    session.bulk_save_objects(objects_to_insert_run)
-
-    #Дальше запись в БД протоколов волонтеров
-    class DetailsProtocolVol(Base):
-        __tablename__ = 'details_vol'
-
-        name_point = Column(String)
-        date_event = Column(DateTime)
-        name_runner = Column(String)
-        link_runner = Column(String)
-        user_id = Column(String)
-        vol_role = Column(String)
-        updated_at = Column(DateTime)
-
-        __table_args__ = (
-            PrimaryKeyConstraint('name_point', 'date_event', 'user_id', 'vol_role'),
-        )
-
-    # Преобразуем строки DataFrame в объекты ORM
-    objects_to_insert_vol = []
-    for _, row in to_add_vol.iterrows():
-        obj = DetailsProtocolVol(
-            name_point=row['name_point'],
-            date_event=row['date_event'],
-            name_runner=row['name_runner'],
-            link_runner=row['link_runner'],
-            user_id=row['user_id'],
-            vol_role=row['vol_role']
-        )
-        objects_to_insert_vol.append(obj)
-
-    # Массивная запись в базу данных
-    session.bulk_save_objects(objects_to_insert_vol)
-
-    if checked_protocol is not None:
-        session.execute(
-            sa.text("""
-                UPDATE list_all_events
-                SET last_check_at = now()
-                WHERE name_point = :name_point
-                  AND date_event = :date_event
-            """),
-            {
-                "name_point": checked_protocol["name_point"],
-                "date_event": checked_protocol["date_event"]
-            }
-        )
-
-    session.commit()
-    session.close()
 
 def refresh_protocol_materialized_views(credential):
     """
@@ -194,6 +89,8 @@ def refresh_protocol_materialized_views(credential):
     engine = db.db_connect(credential)
 
     with engine.connect() as conn:
+        # обновление view может идти дольше обычного statement_timeout
+        conn.execute(sa.text("SET LOCAL statement_timeout = 0"))
         conn.execute(sa.text("REFRESH MATERIALIZED VIEW new_turists"))
         conn.execute(sa.text("REFRESH MATERIALIZED VIEW new_turists_vol"))
         conn.commit()